@@ -1,11 +1,29 @@
 from dataclasses import dataclass, field
 import os
 
+
 @dataclass
 class SystemConfig:
     # Update this path if Wireshark in different location
     TSHARK_PATH = r"C:\Applications\Wireshark\tshark.exe"
 
+
+@dataclass
+class CaptureTuning:
+    REORDER_WINDOW_SECONDS = 0.25                 # max wait for a slower interface when merging timelines
+    REORDER_MAX_PACKETS = 10000                   # reorder buffer bound across interfaces
+    HANDOFF_TIMEOUT_SECONDS = 3.0                 # filter swap: max wait for the new reader's first packet
+    HANDOFF_GRACE_SECONDS = 0.5                   # filter swap: old reader drains its pipe this long
+    STOP_FLUSH_SECONDS = 5.0                      # stop_capture: wait this long for subscriber queues to drain
+    WORKER_IDLE_SECONDS = 120.0                   # keep tshark warm this long after stop_capture
+
+
+@dataclass
+class InterfaceConfig:
+    SAMPLE_SECONDS = 0.25                         # kernel byte-counter sampling window for auto-detect
+    CACHE_SECONDS = 30.0                          # ranking/label reuse between GUI and Capture
+
+
 @dataclass
 class MetricConfig:
     WINDOW_SECONDS = 10.0
@@ -13,4 +31,161 @@ class MetricConfig:
     HIGH_PACKET_RATE_THRESHOLD = 500.0            # packets/sec
     HIGH_THROUGHPUT_BPS = 5 * 1024 * 1024         # 5 Mbps
     HIGH_SYN_RATE_THRESHOLD = 150.0               # syn packets/sec
-    HIGH_RST_RATE_THRESHOLD = 100.0               # rst packets/sec
\ No newline at end of file
+    HIGH_RST_RATE_THRESHOLD = 100.0               # rst packets/sec
+    PACKET_SIZE_BUCKETS = (64, 128, 256, 512, 1024, 1518, 9000)   # bytes, histogram upper bounds
+    LATENCY_BUCKETS_MS = (0.1, 1.0, 10.0, 100.0, 1000.0)          # inter-arrival, histogram upper bounds
+    LAG_SMOOTHING = 0.1                           # EWMA weight for capture lag
+
+
+@dataclass
+class DaemonConfig:
+    FLUSH_INTERVAL_SECONDS = 60.0                 # periodic Storage.materialize
+    OUTPUT_PATH = "packet-watch.json"
+    DEFAULT_PROTOCOL = "ip"
+
+
+@dataclass
+class ExportConfig:
+    HOST = "127.0.0.1"
+    PORT = 9464
+    REFRESH_SECONDS = 1.0                         # min interval between cache re-serializations
+
+
+@dataclass
+class RemoteConfig:
+    COLLECTOR_HOST = "127.0.0.1"
+    COLLECTOR_PORT = 9465
+    SENSOR_INTERVAL_SECONDS = 1.0                 # how often sensors ship a delta
+    RECONNECT_SECONDS = 2.0
+    MAX_FRAME_BYTES = 16 * 1024 * 1024
+    TOP_K_CAPACITY = 64                           # heavy hitters kept per sketch
+    HLL_PRECISION = 10                            # 1024 registers, ~3% error on unique IP counts
+    SENSOR_TIMEOUT_SECONDS = 10.0                 # sensor considered gone after this silence
+
+
+@dataclass
+class SamplingConfig:
+    MAX_RATE = 1024                               # never keep fewer than 1 in MAX_RATE packets
+    LAG_HIGH_MS = 1000.0                          # adaptive: double the rate above this capture lag
+    LAG_LOW_MS = 200.0                            # adaptive: halve the rate below this capture lag
+    ADJUST_INTERVAL_SECONDS = 2.0
+
+
+@dataclass
+class PipelineConfig:
+    QUEUE_CAPACITY = 10000                        # events buffered per capture subscriber
+    DEFAULT_POLICY = "block"                      # block | drop_oldest | drop_newest | sample
+    SAMPLE_HIGH_WATERMARK = 0.5                   # sample: start thinning once the queue is this full
+    SAMPLE_KEEP_EVERY = 4                         # sample: keep 1 in N above the watermark
+    SAMPLE_MAX_LEVEL = 4                          # sample: thin at most 1 in N**4 as the queue fills up
+    STATS_REFRESH_SECONDS = 0.5                   # how often Metrics copies queue counters into the snapshot
+
+
+@dataclass
+class BusConfig:
+    BATCH_INTERVAL_SECONDS = 0.1                  # partial batches are delivered once this old
+    QUEUE_CAPACITY = 10000                        # thread executor queue per subscription
+    PROCESS_WORKERS = 2                           # shared pool for the process executor
+    CLOSE_TIMEOUT_SECONDS = 2.0                   # wait this long for workers to drain on close
+
+
+@dataclass
+class RecordingConfig:
+    DIRECTORY = os.path.join(os.path.expanduser("~"), ".packet-watch", "recordings")  # pcapng ring segments
+    SEGMENT_MAX_MB = 100                          # rotate a segment at this size
+    SEGMENT_MAX_SECONDS = 300                     # ...or after this long
+    MAX_TOTAL_MB = 2048                           # retention: delete oldest segments beyond this - 0; unbounded
+    MAX_AGE_SECONDS = 24 * 3600                   # retention: delete segments older than this - 0; unbounded
+    MAX_FILES = 0                                 # retention: keep at most this many segments - 0; unbounded
+    REFRESH_SECONDS = 5.0                         # how often new segments are indexed and retention applied
+    ALERT_LOOKBACK_SECONDS = 60.0                 # alerts link the segments covering this much history
+
+
+@dataclass
+class SnapshotConfig:
+    DIRECTORY = os.path.join(os.path.expanduser("~"), ".packet-watch", "snapshots")  # one file per alert
+    PRE_TRIGGER_SECONDS = 10.0                    # packets kept in memory ahead of an alert
+    POST_TRIGGER_SECONDS = 5.0                    # keep collecting this long after the alert
+    MAX_BUFFERED_PACKETS = 200000                 # pre-trigger buffer bound regardless of rate
+    COOLDOWN_SECONDS = 30.0                       # alerts this soon after a snapshot share its file
+    FLUSH_WAIT_SECONDS = 1.0                      # wait for tshark to flush the newest frames to the ring
+    IDLE_WAIT_SECONDS = 10.0                      # write anyway if no packet passes the window this long after it ends
+
+
+@dataclass
+class DetailConfig:
+    CACHE_SIZE = 64                               # recently viewed dissections kept in memory
+    TSHARK_TIMEOUT_SECONDS = 10.0                 # single-packet dissection without scapy
+
+
+@dataclass
+class HistoryConfig:
+    MINUTE_RETENTION_SECONDS = 2 * 24 * 3600      # per-minute rollups kept this long
+    HOUR_RETENTION_SECONDS = 30 * 24 * 3600       # per-hour rollups (folded from closed minutes) kept this long
+    MAX_KEYS_PER_BUCKET = 2000                    # per dimension of an hour rollup; the lightest keys are dropped
+    BUCKET_COST = 50                              # planner: merging one rollup bucket ~ examining this many packets
+    TOP_N = 5                                     # default length of "top ..." answers
+
+
+@dataclass
+class QueryConfig:
+    CHUNK_ROWS = 200                              # rows per streamed QueryChunk
+    CHAT_LIMIT = 50                               # rows shown in the chat when a query sets no limit
+    WORKERS = 2                                   # threads answering chat queries off the controller thread
+    TIMEOUT_SECONDS = 30.0                        # a chat query (including time queued) is cancelled after this
+
+
+@dataclass
+class CacheConfig:
+    MAX_ENTRIES = 256                             # cached query results; least recently used go first
+    MAX_ROWS = 200000                             # result rows (or group keys) across all cached entries
+
+
+@dataclass
+class ColdConfig:
+    ENABLED = True                                # compress older stored packets into the cold tier
+    HOT_ROWS = 65536                              # newest packets always kept as plain objects
+    BLOCK_ROWS = 4096                             # packets per compressed columnar block
+    CODEC = "zstd"                                # zstd when the zstandard package is installed, else zlib
+    LEVEL = 3                                     # compression level passed to the codec
+    COMPACT_INTERVAL_SECONDS = 5.0                # compactor also looks for work this often
+    DECODED_BLOCKS = 16                           # decompressed blocks kept for readers (LRU)
+
+
+@dataclass
+class AddressConfig:
+    MAX_ADDRESSES = 2_000_000                     # distinct IPs interned per process (~300 B each); later ones get overflow ids
+
+
+@dataclass
+class TableConfig:
+    BATCH_ROWS = 65536                            # rows per Parquet row group / Arrow record batch written
+    PARQUET_COMPRESSION = "zstd"                  # codec bundled with pyarrow; "snappy", "gzip" or "none" also work
+    TIMEOUT_SECONDS = 600.0                       # a chat "export ..." is cancelled after this, not QueryConfig's
+
+
+@dataclass
+class LoadConfig:
+    BATCH_ROWS = 2048                             # saved packets parsed between publishes to readers
+    PROGRESS_SECONDS = 0.25                       # load progress is reported at most this often
+    CHUNK_BYTES = 1 << 20                         # read size when decoding an indented (older) storage file
+    SNIFF_BYTES = 4096                            # head of the file inspected to pick the reader
+    PENDING_ROWS = 200000                         # packets captured during a load held for after it; newer ones are dropped
+
+
+@dataclass
+class ChartConfig:
+    FPS = 10                                      # GUI chart/table refresh ceiling; unchanged charts are not redrawn
+    SAMPLE_SECONDS = 1.0                          # one chart point per series this often
+    HISTORY_SECONDS = 6 * 3600                    # samples kept per series, all of it zoomable
+    SPANS = {"5 min": 300, "1 h": 3600, "6 h": 6 * 3600}  # visible window choices, first is the default
+    HEIGHT = 130                                  # chart canvas height (pixels)
+
+
+@dataclass
+class PacketListConfig:
+    WHEEL_ROWS = 3                                # rows scrolled per mouse wheel step
+    ROW_PADDING = 6                               # pixels added to the font's line height per table row
+    BATCH_ROWS = 512                              # filter matches handed to the table at a time...
+    BATCH_SECONDS = 0.2                           # ...or sooner, when matches are sparse
+    POLL_SECONDS = 0.1                            # how often a filter checks Storage for appended packets
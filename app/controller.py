@@ -1,15 +1,21 @@
 import queue
 import threading
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Set
 
-from app.modules import Capture, Chatbot, GUI
+from app.config import QueryConfig
+from app.modules import Capture
 from app.utils import QueryMessage, CaptureConfig
+from app.utils.cancel import CancelToken, QueryCancelled
 from app.utils.interfaces import Observer
-from app.utils.events import Event, StartCaptureEvent, StopCaptureEvent, QueryRaised
+from app.utils.events import CancelQueriesEvent, Event, StartCaptureEvent, StopCaptureEvent, QueryRaised
+
+if TYPE_CHECKING:
+    from app.modules import Chatbot, GUI
 
 class Controller(Observer):
-    def __init__(self, capturer:Capture, chatbot: Chatbot, gui: GUI):
+    def __init__(self, capturer:Capture, chatbot: "Chatbot", gui: "GUI"):
         self.capturer = capturer
         self.chatbot = chatbot
         self.gui = gui
@@ -18,6 +24,11 @@ class Controller(Observer):
         self.running = False
         self.thread: Optional[threading.Thread] = None
 
+        # chat queries run here so a long scan never holds up start/stop commands
+        self.query_pool = ThreadPoolExecutor(max_workers=QueryConfig.WORKERS, thread_name_prefix="query")
+        self._tokens: Set[CancelToken] = set()
+        self._tokens_lock = threading.Lock()
+
     def start(self):
         self.running = True
         self.thread = threading.Thread(target=self._run_loop, daemon=True)
@@ -28,6 +39,10 @@ class Controller(Observer):
         self.running = False
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=1.0)
+        self.cancel_queries()
+        self.query_pool.shutdown(wait=False, cancel_futures=True)
+        # stop_capture only pauses; release the warm tshark workers
+        self.capturer.shutdown()
 
     def update(self, event: Event):
         self.event_queue.put(event)
@@ -48,23 +63,50 @@ class Controller(Observer):
                 self.stop_capture()
             elif isinstance(event, QueryRaised):
                 self.process_query(event.payload)
+            elif isinstance(event, CancelQueriesEvent):
+                self.cancel_queries()
         except Exception as e:
-            error_msg = f"Controller Error: {e}"
-            print(error_msg)
-            # Send error to GUI logs
-            from app.utils.models import AlertInfo
-            from datetime import datetime
-            alert = AlertInfo(
-                alert_type="error",
-                message=str(e),
-                severity="ERROR",
-                timestamp=datetime.now()
-            )
-            from app.utils.events import AlertGeneratedEvent
-            self.gui.update(AlertGeneratedEvent(alert))
+            self._report(e)
+
+    def _report(self, e: Exception):
+        error_msg = f"Controller Error: {e}"
+        print(error_msg)
+        # Send error to GUI logs
+        from app.utils.models import AlertInfo
+        from datetime import datetime
+        alert = AlertInfo(
+            alert_type="error",
+            message=str(e),
+            severity="ERROR",
+            timestamp=datetime.now()
+        )
+        from app.utils.events import AlertGeneratedEvent
+        self.gui.update(AlertGeneratedEvent(alert))
 
     def process_query(self, query: QueryMessage):
-        self.chatbot.processQuery(query)
+        """Answer on the query pool; the deadline counts from now, including time spent queued."""
+        token = CancelToken(QueryConfig.TIMEOUT_SECONDS)
+        with self._tokens_lock:
+            self._tokens.add(token)
+        self.query_pool.submit(self._answer, query, token)
+
+    def cancel_queries(self):
+        with self._tokens_lock:
+            tokens = list(self._tokens)
+        for token in tokens:
+            token.cancel()
+
+    def _answer(self, query: QueryMessage, token: CancelToken):
+        try:
+            token.check()
+            self.chatbot.processQuery(query, token)
+        except QueryCancelled as e:
+            self.gui.display_chat_response(f"Query {e}.")
+        except Exception as e:
+            self._report(e)
+        finally:
+            with self._tokens_lock:
+                self._tokens.discard(token)
     
     def start_capture(self, config: CaptureConfig):
         self.capturer.start_capture(config=config)
@@ -0,0 +1,178 @@
+import signal
+import threading
+from datetime import datetime
+from typing import Optional, Tuple
+
+from app.config import DaemonConfig
+from app.modules import Alerts, Capture, Collector, Metrics, MetricsExporter, Sensor, Snapshotter, Storage
+from app.utils.bpf import compile_bpf
+from app.utils.events import Event
+from app.utils.interfaces import Observer
+from app.utils.models import AlertInfo, CaptureConfig, LoadProgress
+
+
+class AlertLogger(Observer):
+    """Headless stand-in for the GUI alert pane: writes alerts to stdout."""
+
+    def update(self, event: Event):
+        if event.name == "alert_generated" and isinstance(event.payload, AlertInfo):
+            alert = event.payload
+            print(f"{alert.timestamp:%Y-%m-%d %H:%M:%S} [{alert.severity}] {alert.alert_type}: {alert.message}", flush=True)
+            if alert.snapshot_path:
+                print(f"    snapshot: {alert.snapshot_path}", flush=True)
+            for path in alert.recordings:
+                print(f"    recorded in {path}", flush=True)
+
+
+class Daemon:
+    """
+    Runs Capture -> Metrics -> Alerts and Capture -> Storage without a GUI.
+
+    As a sensor, local metric deltas are also streamed to a remote Collector. As a
+    collector, Alerts and the exporter follow the merged view of all sensors (local
+    capture included, unless `config` is None).
+
+    SIGINT/SIGTERM request shutdown, SIGHUP (POSIX) forces an immediate flush.
+    Storage is materialized every `flush_interval` seconds and once more on exit.
+    """
+
+    def __init__(
+        self,
+        config: Optional[CaptureConfig],
+        output_path: Optional[str] = DaemonConfig.OUTPUT_PATH,
+        flush_interval: float = DaemonConfig.FLUSH_INTERVAL_SECONDS,
+        capacity: Optional[int] = None,
+        export_port: Optional[int] = None,
+        sensor_target: Optional[Tuple[str, int]] = None,
+        collector_port: Optional[int] = None,
+        load_path: Optional[str] = None,
+    ):
+        """
+        :param config: capture configuration, interface auto-detected if not set - None disables local capture
+        :param output_path: where Storage is flushed - None disables flushing
+        :param flush_interval: seconds between periodic flushes
+        :param capacity: Storage capacity - default; unbounded
+        :param export_port: serve metrics over HTTP on this port - default; disabled
+        :param sensor_target: (host, port) of a collector to stream deltas to
+        :param collector_port: accept sensor streams on this port and publish the merged view
+        :param load_path: saved session to load into Storage in the background before new packets
+        """
+        if flush_interval <= 0:
+            raise ValueError("flush_interval must be greater than 0")
+
+        self.config = config
+        self.output_path = output_path
+        self.flush_interval = flush_interval
+        self.load_path = load_path
+
+        self.capturer = Capture()
+        self.metrics = Metrics()
+        self.storage = Storage(capacity=capacity)
+        self.alerts = Alerts()
+        self.alert_logger = AlertLogger()
+
+        self.capturer.subscribe(self.metrics, policy="sample")
+        self.capturer.subscribe(self.storage, policy="drop_newest")
+        self.snapshots = Snapshotter()
+        self.capturer.subscribe(self.snapshots, policy="drop_oldest")
+        self.metrics.watch_pipeline(self.capturer.pipeline_stats)
+        self.alerts.subscribe(self.alert_logger)
+        self.alerts.link_recordings(self.capturer.recordings)
+        self.alerts.link_snapshots(self.snapshots.trigger)
+
+        self.sensors: list[Sensor] = []
+        if sensor_target is not None:
+            self.sensors.append(Sensor(self.metrics, *sensor_target))
+
+        self.collector: Optional[Collector] = None
+        if collector_port is not None:
+            self.collector = Collector(port=collector_port)
+            self.sensors.append(Sensor(self.metrics, "127.0.0.1", collector_port))
+        source = self.collector or self.metrics
+        source.subscribe(self.alerts)
+
+        self.exporter: Optional[MetricsExporter] = None
+        if export_port is not None:
+            self.exporter = MetricsExporter(port=export_port)
+            source.subscribe(self.exporter)
+
+        # set to wake the run loop early; `_stopping` decides between flush and exit
+        self._wake = threading.Event()
+        self._stopping = False
+
+    def install_signal_handlers(self) -> None:
+        """Must be called from the main thread."""
+        signal.signal(signal.SIGINT, self._on_shutdown_signal)
+        signal.signal(signal.SIGTERM, self._on_shutdown_signal)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._on_flush_signal)
+
+    def _on_shutdown_signal(self, signum, frame) -> None:
+        self.stop()
+
+    def _on_flush_signal(self, signum, frame) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        """Request shutdown; safe to call from signal handlers and other threads."""
+        self._stopping = True
+        self._wake.set()
+
+    def run(self) -> None:
+        """Start capture and block until shutdown is requested."""
+        if self.exporter is not None:
+            self.exporter.start()
+            print(f"packet-watch: serving metrics on http://{self.exporter.host}:{self.exporter.port}/metrics", flush=True)
+        if self.collector is not None:
+            self.collector.start()
+            print(f"packet-watch: collecting sensor deltas on port {self.collector.port}", flush=True)
+        for sensor in self.sensors:
+            sensor.start()
+        if self.load_path is not None:
+            # packets captured meanwhile are kept back and stored after the saved ones
+            self.storage.load(self.load_path, progress=self._report_load)
+            print(f"packet-watch: loading {self.load_path}", flush=True)
+        if self.config is not None:
+            self.capturer.start_capture(config=self.config)
+            print(f"packet-watch: capturing '{compile_bpf(self.config) or 'all'}' @ {', '.join(self.capturer.interfaces())}", flush=True)
+
+        try:
+            while not self._stopping:
+                self._wake.wait(timeout=self.flush_interval)
+                if self._stopping:
+                    break
+                self._wake.clear()
+                self.flush()
+        finally:
+            self.capturer.shutdown()
+            self.snapshots.close()
+            for sensor in self.sensors:
+                sensor.stop()
+            if self.collector is not None:
+                self.collector.stop()
+            if self.exporter is not None:
+                self.exporter.stop()
+            self.flush()
+            self.storage.close()
+            print(f"packet-watch: stopped after {self.metrics.get().total_packets_captured} packets", flush=True)
+
+    @staticmethod
+    def _report_load(progress: LoadProgress) -> None:
+        if not progress.done:
+            return
+        if progress.error:
+            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} [ERROR] loading {progress.path} stopped after "
+                  f"{progress.packets} packets: {progress.error}", flush=True)
+        else:
+            print(f"packet-watch: loaded {progress.packets} packets from {progress.path}", flush=True)
+        if progress.dropped:
+            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} [WARNING] {progress.dropped} packets captured while "
+                  f"loading were dropped", flush=True)
+
+    def flush(self) -> None:
+        if self.output_path is None or self.storage.loading:
+            return  # a half-loaded session must not overwrite a complete file
+        try:
+            self.storage.materialize(self.output_path)
+        except Exception as e:
+            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} [ERROR] flush failed: {e}", flush=True)
@@ -1,6 +1,30 @@
 from app.modules.alert import Alerts
 from app.modules.capture import Capture
-from app.modules.chatbot import Chatbot
-from app.modules.gui import GUI
+from app.modules.exporter import MetricsExporter
 from app.modules.metrics import Metrics
+from app.modules.query import QueryEngine
+from app.modules.remote import Collector, Sensor
+from app.modules.snapshot import Snapshotter
 from app.modules.storage import Storage
+
+# GUI (customtkinter, psutil) and Chatbot (which imports the GUI) are loaded on
+# first access so headless deployments never pay for, or require, the Tk stack.
+_LAZY_MODULES = {
+    "Chatbot": "app.modules.chatbot",
+    "GUI": "app.modules.gui",
+}
+
+
+def __getattr__(name: str):
+    module_path = _LAZY_MODULES.get(name)
+    if module_path is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+
+    value = getattr(importlib.import_module(module_path), name)
+    globals()[name] = value
+    return value
+
+
+__all__ = ["Alerts", "Capture", "Chatbot", "Collector", "GUI", "Metrics", "MetricsExporter", "QueryEngine", "Sensor", "Snapshotter", "Storage"]
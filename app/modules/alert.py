@@ -1,19 +1,38 @@
-from typing import List
 from datetime import datetime
+from typing import Callable, List, Optional
 
-from app.utils.interfaces import Subject, Observer
+from app.config import RecordingConfig
+
+from app.utils.bus import Publisher
+from app.utils.interfaces import Observer
 from app.utils.events import Event, AlertGeneratedEvent
 from app.utils.models import MetricsSnapshot, AlertInfo
 
-class Alerts(Subject, Observer):
+class Alerts(Publisher, Observer):
     def __init__(self):
-        self.observers: List[Observer] = []
+        super().__init__()
         # Define thresholds for alerts
         self.thresholds = {
             'high_latency': 100.0,      # milliseconds
             'high_packet_rate': 1000.0, # packets per second
             'high_error_rate': 50.0     # error packets count
         }
+        self._recordings: Optional[Callable[[float, float], List[str]]] = None
+        self._snapshots: Optional[Callable[[AlertInfo], Optional[str]]] = None
+
+    def link_recordings(self, lookup: Callable[[float, float], List[str]]) -> None:
+        """
+        Attach the raw-packet segments recorded before each alert.
+        :param lookup: (start, end) epoch seconds -> segment paths, e.g. Capture.recordings
+        """
+        self._recordings = lookup
+
+    def link_snapshots(self, trigger: Callable[[AlertInfo], Optional[str]]) -> None:
+        """
+        Preserve the packets around each alert.
+        :param trigger: starts a snapshot and returns its path, e.g. Snapshotter.trigger
+        """
+        self._snapshots = trigger
 
     def update(self, event: Event):
         if event.name == "metrics_updated" and isinstance(event.payload, MetricsSnapshot):
@@ -51,17 +70,10 @@ class Alerts(Subject, Observer):
             severity=severity,
             timestamp=datetime.now()
         )
+        if self._recordings is not None:
+            now = alert_info.timestamp.timestamp()
+            alert_info.recordings = self._recordings(now - RecordingConfig.ALERT_LOOKBACK_SECONDS, now)
+        if self._snapshots is not None:
+            alert_info.snapshot_path = self._snapshots(alert_info)
         event = AlertGeneratedEvent(alert_info)
         self.notify_observers(event)
-
-    def subscribe(self, observer: Observer):
-        if observer not in self.observers:
-            self.observers.append(observer)
-
-    def unsubscribe(self, observer: Observer):
-        if observer in self.observers:
-            self.observers.remove(observer)
-
-    def notify_observers(self, event: Event):
-        for observer in self.observers:
-            observer.update(event)
@@ -1,3 +1,5 @@
+import heapq
+import itertools
 import time
 import pyshark
 import asyncio
@@ -5,112 +7,474 @@ import threading
 
 from app.utils.interfaces import Subject, Observer
 from app.utils.events import Event, PacketCapturedEvent
-from app.utils.models import CaptureConfig
-from app.config import SystemConfig
+from app.utils.models import CaptureConfig, ConsumerStats
+from app.utils.pipeline import BoundedChannel
+from app.utils.bpf import compile_bpf, vlan_post_filter
+from app.utils.sampling import Sampler, make_sampler
+from app.utils.netif import busiest_interface
+from app.utils.ring import RingRecorder
+from app.config import CaptureTuning, InterfaceConfig, PipelineConfig, RecordingConfig, SystemConfig
 
-from pyshark.tshark.tshark import get_tshark_interfaces
 from pyshark.packet.packet import Packet
 
-from typing import Optional
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
 
 
-class Capture(Subject):
-    @staticmethod
-    def _get_active_interface(timeout: int = 3, bpf_filter: str = "ip") -> str:
+def _packet_timestamp(packet: Packet) -> float:
+    try:
+        return float(packet.sniff_timestamp)
+    except (AttributeError, TypeError, ValueError):
+        return time.time()
+
+
+def _vlan_id(packet: Packet) -> Optional[int]:
+    """Id of the packet's outer VLAN tag, as tshark dissected it."""
+    try:
+        return int(packet.vlan.id)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class _InterfaceReader:
+    """Owns one LiveCapture (dumpcap + tshark) on its own thread and event loop."""
+
+    def __init__(self, interface: str, bpf: str, on_packet: Callable[["_InterfaceReader", Packet], bool],
+                 on_exit: Callable[["_InterfaceReader"], None], spool: Optional[str] = None):
+        """
+        :param on_packet: called per packet, returns False to end this reader
+        :param on_exit: called once the reader thread is done
+        :param spool: ring series tshark also records every packet to - default; no recording
+        """
+        self.interface = interface
+        self.bpf = bpf
+        self.spool = spool
+        self._on_packet = on_packet
+        self._on_exit = on_exit
+
+        self._capture: Optional[pyshark.LiveCapture] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"capture-{self.interface}")
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        return self._running
+
+    def stop(self) -> None:
+        """
+        End the reader from any thread. pyshark can only close a capture on its own
+        event loop, so the wait for the next packet is cancelled there and the reader
+        thread closes the capture (and tshark) itself on the way out.
+        """
+        self._running = False
+        loop = self._loop
+        if loop is None or threading.current_thread() is self._thread:
+            return  # not started yet, finished, or the reader stopping itself
         try:
-            pyshark_ifaces = get_tshark_interfaces(tshark_path=SystemConfig.TSHARK_PATH)
-        except Exception:
-            pyshark_ifaces = []
-
-        for iface in pyshark_ifaces:
-            try:
-                capture = pyshark.LiveCapture(interface=iface, bpf_filter=bpf_filter, tshark_path=SystemConfig.TSHARK_PATH)
-                capture.sniff(timeout=timeout)
-                if len(capture) > 0:
-                    return iface
-            except Exception:
-                continue
-
-        raise RuntimeError("No active interface found. Ensure Wireshark is installed and TShark is accessible.")
-
-    def _handle_packet(self, packet: Packet) -> None:
-        self.notify_observers(PacketCapturedEvent(packet))
-        # print(packet)
+            loop.call_soon_threadsafe(self._interrupt)
+        except RuntimeError:
+            pass  # the loop closed meanwhile: the reader is done
 
-    def _sniff(self, timeout: int | None = None, total: int = 0) -> None:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    def _interrupt(self) -> None:
+        """On the reader's loop: cancel the read it is blocked in."""
+        for task in asyncio.all_tasks(self._loop):
+            task.cancel()
 
-        bpf = self.config.protocol
-        if self.config.port and self.config.port > 0:
-            bpf = f"{self.config.protocol} port {self.config.port}"
+    def join(self, timeout: float) -> None:
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
 
-        self._capture = pyshark.LiveCapture(
-            interface=self.config.interface,
-            bpf_filter=bpf,
-            tshark_path=SystemConfig.TSHARK_PATH,
-        )
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
 
-        start_time = time.time()
         try:
-            count = 0
+            self._capture = pyshark.LiveCapture(
+                interface=self.interface,
+                bpf_filter=self.bpf or None,
+                tshark_path=SystemConfig.TSHARK_PATH,
+                eventloop=loop,
+                output_file=self.spool,
+                # with -w tshark only writes; -P keeps the dissected stream coming
+                custom_parameters=["-P"] + RingRecorder.tshark_parameters() if self.spool else None,
+            )
             for packet in self._capture.sniff_continuously():
                 if not self._running:
                     break  # stop requested
-                self._handle_packet(packet)
-                count += 1
-                if total > 0 and count >= total:
-                    break
-                if timeout and (time.time() - start_time) >= timeout:
+                if not self._on_packet(self, packet):
                     break
+        except asyncio.CancelledError:
+            if self._running:
+                raise  # not cancelled by `stop`
         finally:
             if self._capture is not None:
-                self._capture.close()
+                try:
+                    self._capture.close()
+                except Exception:
+                    pass
                 self._capture = None
+            self._loop = None
+            loop.close()
+            self._running = False
+            self._on_exit(self)
+
+
+class _TimelineMerger:
+    """
+    Merges packets from several readers into one timestamp-ordered stream.
+
+    A packet is released once every reader has delivered something at least as new
+    (so nothing older can still arrive), or once it has waited `window` seconds of
+    wall clock, or when more than `max_pending` packets are buffered. A reader that has
+    delivered nothing for `window` seconds counts as having reached `window` seconds
+    before now, so an idle interface does not hold the others back.
+    """
+
+    def __init__(self, interfaces: List[str], emit: Callable[[str, Packet, Optional[str]], None],
+                 window: float = CaptureTuning.REORDER_WINDOW_SECONDS,
+                 max_pending: int = CaptureTuning.REORDER_MAX_PACKETS):
+        self._emit = emit
+        self._window = window
+        self._max_pending = max_pending
+
+        # (timestamp, seq, arrival, interface, packet, spool)
+        self._heap: List[Tuple[float, int, float, str, Packet, Optional[str]]] = []
+        self._newest: Dict[str, float] = {iface: float("-inf") for iface in interfaces}
+        self._arrived: Dict[str, float] = {iface: time.monotonic() for iface in interfaces}  # last push
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
 
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="capture-merge")
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop and release whatever is still buffered, in order."""
+        with self._cond:
             self._running = False
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def push(self, interface: str, packet: Packet, spool: Optional[str] = None) -> None:
+        timestamp = _packet_timestamp(packet)
+        arrival = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._heap, (timestamp, next(self._seq), arrival, interface, packet, spool))
+            if timestamp > self._newest[interface]:
+                self._newest[interface] = timestamp
+            self._arrived[interface] = arrival
+            self._cond.notify()
+
+    def retire(self, interface: str) -> None:
+        """A finished reader no longer holds back the watermark."""
+        with self._cond:
+            self._newest.pop(interface, None)
+            self._arrived.pop(interface, None)
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                ready = self._take_ready()
+                if not ready:
+                    if not self._running:
+                        return  # stopped and fully drained
+                    self._cond.wait(timeout=self._window / 4)
+                    continue
+
+            for _, _, _, interface, packet, spool in ready:
+                self._emit(interface, packet, spool)
+
+    def _take_ready(self) -> List[Tuple[float, int, float, str, Packet, Optional[str]]]:
+        ready = []
+        expired = time.monotonic() - self._window
+        # an idle reader can only deliver packets captured from now on, give or take the window
+        floor = time.time() - self._window
+        watermark = min((max(newest, floor) if self._arrived[iface] <= expired else newest
+                         for iface, newest in self._newest.items()), default=float("inf"))
+        while self._heap:
+            timestamp, _, arrival = self._heap[0][:3]
+            if (not self._running or timestamp <= watermark or arrival <= expired
+                    or len(self._heap) > self._max_pending):
+                ready.append(heapq.heappop(self._heap))
+            else:
+                break
+        return ready
+
+
+class _CaptureWorker:
+    """
+    Keeps one interface's LiveCapture warm across restarts and filter changes.
+
+    Restarting with the same filter while capturing reuses the running dumpcap/tshark pair. A new
+    filter is swapped in make-before-break: the replacement reader starts while the
+    current one keeps delivering; the first packet from the replacement fixes a
+    handoff timestamp, the old reader delivers only what precedes it and is then
+    closed. No packets are lost to the respawn gap.
+    """
+
+    def __init__(self, interface: str, deliver: Callable[[str, Packet, Optional[str]], bool],
+                 on_exit: Callable[["_CaptureWorker"], None]):
+        """
+        :param deliver: forwards a packet to Capture, returns False to pause reading
+        :param on_exit: called when the current reader dies on its own
+        """
+        self.interface = interface
+        self._deliver = deliver
+        self._on_exit = on_exit
+
+        self._current: Optional[_InterfaceReader] = None
+        self._retiring: List[_InterfaceReader] = []
+        self._recorder: Optional[RingRecorder] = None
+        self._handoff_ts: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def bpf(self) -> Optional[str]:
+        current = self._current
+        return current.bpf if current is not None and current.alive else None
+
+    def ensure(self, bpf: str, recorder: Optional[RingRecorder] = None) -> None:
+        """
+        Make sure a reader with `bpf` is running, swapping filters if needed.
+        :param recorder: record raw packets into this ring - default; no recording
+        """
+        with self._lock:
+            current = self._current
+            if current is not None and current.alive and current.bpf == bpf \
+                    and (current.spool is not None) == (recorder is not None):
+                return  # warm
+
+            if self._current is not None and self._current.alive:
+                self._retiring.append(self._current)
+                self._handoff_ts = None
+                # a quiet new filter must not keep the old one delivering forever
+                timer = threading.Timer(CaptureTuning.HANDOFF_TIMEOUT_SECONDS, self._force_handoff, args=(time.time(),))
+                timer.daemon = True
+                timer.start()
+
+            self._recorder = recorder
+            spool = recorder.new_series(self.interface) if recorder is not None else None
+
+            self._current = _InterfaceReader(self.interface, bpf, self._on_reader_packet, self._on_reader_exit, spool)
+            self._current.start()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            readers = self._retiring + ([self._current] if self._current is not None else [])
+            self._current, self._retiring = None, []
+        for reader in readers:
+            reader.stop()
+        for reader in readers:
+            reader.join(timeout=2.0)
+
+    def _on_reader_packet(self, reader: _InterfaceReader, packet: Packet) -> bool:
+        with self._lock:
+            if reader is not self._current:
+                if reader not in self._retiring:
+                    return False
+                if self._handoff_ts is not None and _packet_timestamp(packet) >= self._handoff_ts:
+                    return True  # the replacement covers this; drop the duplicate
+            elif self._retiring and self._handoff_ts is None:
+                self._handoff_ts = _packet_timestamp(packet)
+                self._schedule_retire()
+
+        self._deliver(self.interface, packet, reader.spool)
+        return True
+
+    def _force_handoff(self, requested_at: float) -> None:
+        with self._lock:
+            if self._retiring and self._handoff_ts is None:
+                self._handoff_ts = requested_at + CaptureTuning.HANDOFF_TIMEOUT_SECONDS
+                self._schedule_retire()
+
+    def _schedule_retire(self) -> None:
+        # old readers may still hold packets older than the handoff in their pipes
+        retiring = list(self._retiring)
+        timer = threading.Timer(CaptureTuning.HANDOFF_GRACE_SECONDS, self._retire, args=(retiring,))
+        timer.daemon = True
+        timer.start()
+
+    def _retire(self, readers: List[_InterfaceReader]) -> None:
+        for reader in readers:
+            reader.stop()
+        with self._lock:
+            self._retiring = [r for r in self._retiring if r not in readers]
+            if not self._retiring:
+                self._handoff_ts = None
+
+    def _on_reader_exit(self, reader: _InterfaceReader) -> None:
+        recorder = self._recorder
+        if reader.spool is not None and recorder is not None:
+            recorder.finish(reader.spool)
+        with self._lock:
+            if reader in self._retiring:
+                self._retiring.remove(reader)
+                return
+            unexpected = reader is self._current
+        if unexpected:
+            self._on_exit(self)
+
+
+class Capture(Subject):
+    @staticmethod
+    def _get_active_interface(interval: float = InterfaceConfig.SAMPLE_SECONDS) -> str:
+        # busiest NIC by kernel byte counters, shared (and cached) with the GUI picker
+        iface = busiest_interface(interval)
+        if iface:
+            return iface
+
+        raise RuntimeError("No active interface found. Ensure an interface is up and passing traffic.")
+
+    def _handle_packet(self, interface: str, packet: Packet, spool: Optional[str] = None) -> None:
+        sample_rate = 1
+        if self._sampler is not None:
+            if not self._sampler.accept(packet):
+                return
+            sample_rate = self._sampler.rate
+        self.notify_observers(PacketCapturedEvent(packet, sample_rate=sample_rate, interface=interface, spool=spool))
+        # print(packet)
+
+    def _on_worker_packet(self, interface: str, packet: Packet, spool: Optional[str] = None) -> bool:
+        vlans = self._vlans
+        if vlans and _vlan_id(packet) not in vlans:
+            return True  # tagged, but not with one of the requested ids
+
+        # readers of several interfaces call this concurrently
+        with self._lock:
+            if not self._running:
+                return True  # restarting: keep tshark warm, nothing is delivered
+            if self._total > 0 and self._count >= self._total:
+                return True  # another reader delivered the last one
+            self._count += 1
+            done = ((self._total > 0 and self._count >= self._total)
+                    or bool(self._timeout and (time.time() - self._start_time) >= self._timeout))
+
+        merger = self._merger
+        if merger is not None:
+            merger.push(interface, packet, spool)
+        else:
+            self._handle_packet(interface, packet, spool)
+
+        if done:
+            self._pause()
+        return True
+
+    def _on_worker_exit(self, worker: _CaptureWorker) -> None:
+        merger = self._merger
+        if merger is not None:
+            merger.retire(worker.interface)
+        with self._workers_lock:
+            if self._workers.get(worker.interface) is worker:
+                del self._workers[worker.interface]
+            last = not self._workers
+        if last and self._running:
+            # capture ended on its own (tshark exit)
+            self._pause()
 
     # bonus - provide interface to save time
     def __init__(self, config: Optional[CaptureConfig] = None) -> None:
         self.config: Optional[CaptureConfig] = config
 
-        self._capture: Optional[pyshark.LiveCapture] = None
         self._running: bool = False
-        self._thread: Optional[threading.Thread] = None
+        self._workers: Dict[str, _CaptureWorker] = {}
+        self._workers_lock: threading.Lock = threading.Lock()
+        self._merger: Optional[_TimelineMerger] = None
+        self._idle_timer: Optional[threading.Timer] = None
+        self._bpf: str = ""
+        self._vlans: FrozenSet[int] = frozenset()  # outer VLAN ids checked per packet (several ids)
+        self._sampler: Optional[Sampler] = None
+        self._recorder: Optional[RingRecorder] = None
+
+        self._count: int = 0
+        self._total: int = 0
+        self._timeout: Optional[int] = None
+        self._start_time: float = 0.0
+        self._lock: threading.Lock = threading.Lock()  # the count and limits above, and the idle timer
 
         self.observers: list[Observer] = []
+        self._channels: List[BoundedChannel] = []  # replaced, never mutated, so readers need no lock
         self._obs_lock: threading.Lock = threading.Lock()
 
     def start_capture(self, config: Optional[CaptureConfig] = None, timeout: Optional[int] = None, total: int = 0) -> None:
         """
-        :param config: Capture configuration (protocol, port, interface)
+        Start delivering packets. Workers still running (capturing, or left warm by a
+        recent `stop_capture()`) are reused; a changed filter is swapped in without a gap.
+
+        :param config: Capture configuration (protocols, ports, hosts, vlans, interfaces)
         :param timeout: run capture for given amount of seconds - default; run until `stop_capture()` is called
-        :param total: number of packets to capture - default; infinite
+        :param total: number of packets to capture across all interfaces - default; infinite
         """
-        if self._running:
-            return
-
         if config:
             self.config = config
-        
+
         if not self.config:
             raise ValueError("No configuration provided for capture.")
 
         if self.config.port not in range(0, 65536):
             raise AttributeError("Capture: invalid port")
 
-        if not self.config.interface:
+        # compiled up front so an invalid filter is reported before tshark is spawned
+        bpf = compile_bpf(self.config)
+        vlans = vlan_post_filter(self.config)
+        sampler = make_sampler(self.config)
+
+        interfaces = self.interfaces()
+        if not interfaces:
             self.config.interface = self._get_active_interface()
+            interfaces = [self.config.interface]
 
+        if self._running:
+            self._pause()
+
+        self._bpf, self._vlans, self._sampler = bpf, vlans, sampler
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            self._count, self._total, self._timeout = 0, total, timeout
+            self._start_time = time.time()
+
+        # a single interface is already in order; several go through the reorder buffer
+        self._merger = _TimelineMerger(interfaces, self._handle_packet) if len(interfaces) > 1 else None
+        if self._merger is not None:
+            self._merger.start()
+
+        with self._workers_lock:
+            stale = [w for name, w in self._workers.items() if name not in interfaces]
+            for worker in stale:
+                del self._workers[worker.interface]
+            for iface in interfaces:
+                if iface not in self._workers:
+                    self._workers[iface] = _CaptureWorker(iface, self._on_worker_packet, self._on_worker_exit)
+            workers = list(self._workers.values())
+
+        for worker in stale:
+            worker.shutdown()
+
+        recorder = None
+        if self.config.spool:
+            recorder = self._recorder = RingRecorder.open(RecordingConfig.DIRECTORY)
+            recorder.start()
         self._running = True
-        self._thread = threading.Thread(
-            target=self._sniff, args=(timeout, total), daemon=True
-        )
-        self._thread.start()
+        for worker in workers:
+            worker.ensure(bpf, recorder)
 
     def stop_capture(self, timeout: int = 0) -> None:
         """
-        Docstring for stop_capture
+        Stop delivering packets. tshark is kept warm for `CaptureTuning.WORKER_IDLE_SECONDS`
+        so a following `start_capture()` is near-instant; `shutdown()` releases it at once.
 
         :param timeout: stop capture after given amount of seconds - default; stop immediately
         :type timeout: int
@@ -121,32 +485,115 @@ class Capture(Subject):
 
         time.sleep(timeout)
 
+        self._pause()
+        self.flush(timeout=CaptureTuning.STOP_FLUSH_SECONDS)
+
+    def shutdown(self) -> None:
+        """Stop capture and terminate every tshark process, warm or not."""
+        self._pause()
+        self._release_workers()
+        self.flush(timeout=CaptureTuning.STOP_FLUSH_SECONDS)
+        if self._recorder is not None:
+            self._recorder.stop()
+
+    def recordings(self, start: float, end: float) -> List[str]:
+        """
+        Ring segments holding raw packets captured between `start` and `end` (epoch seconds).
+        :return: pcapng paths, oldest first; empty when recording is off
+        """
+        if self._recorder is None:
+            return []
+        return [segment.path for segment in self._recorder.segments(start, end)]
+
+    def _pause(self) -> None:
+        """Stop delivering packets; the workers stay warm until the idle timer releases them."""
         self._running = False
 
-        if self._capture:
-            try:
-                self._capture.close()
-            except Exception:
-                pass
+        # release whatever the reorder buffer still holds, in order
+        merger = self._merger
+        if merger is not None:
+            merger.stop()
+            self._merger = None
+
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+            timer = self._idle_timer = threading.Timer(CaptureTuning.WORKER_IDLE_SECONDS, self._reap_idle)
+            timer.daemon = True
+        timer.start()
+
+    def _reap_idle(self) -> None:
+        with self._lock:
+            if self._running or self._idle_timer is not threading.current_thread():
+                return  # restarted, or replaced by a newer stop
+            self._idle_timer = None
+            with self._workers_lock:
+                workers = list(self._workers.values())
+                self._workers.clear()
+        for worker in workers:
+            worker.shutdown()
+
+    def _release_workers(self) -> None:
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+        with self._workers_lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            worker.shutdown()
+
+    def interfaces(self) -> List[str]:
+        """Interfaces the current configuration captures on (empty = auto-detect)."""
+        if not self.config:
+            return []
+        if self.config.interfaces:
+            return list(dict.fromkeys(self.config.interfaces))
+        return [self.config.interface] if self.config.interface else []
 
-        if self._thread is not None:
-            self._thread.join(timeout=2.0)
-            self._thread = None
+    def subscribe(self, observer: Observer, policy: str = PipelineConfig.DEFAULT_POLICY,
+                  capacity: int = PipelineConfig.QUEUE_CAPACITY, name: Optional[str] = None):
+        """
+        Deliver packets to `observer` through its own bounded queue and thread, so a
+        slow consumer cannot stall packet reading or the other consumers.
 
-    def subscribe(self, observer: Observer):
+        :param policy: what to do when the queue is full - block, drop_oldest, drop_newest or sample
+        :param capacity: queue length
+        :param name: label in `pipeline_stats()` - default; lowercase class name
+        """
         if not isinstance(observer, Observer):
             raise TypeError("expected Observer, got", type(observer))
 
+        channel = BoundedChannel(observer, name=name, capacity=capacity, policy=policy)
+        channel.start()
         with self._obs_lock:
             self.observers.append(observer)
+            self._channels = self._channels + [channel]
 
     def unsubscribe(self, observer: Observer):
         with self._obs_lock:
             self.observers.remove(observer)
+            removed = [c for c in self._channels if c.observer is observer]
+            self._channels = [c for c in self._channels if c.observer is not observer]
+        for channel in removed:
+            channel.stop()
 
     def notify_observers(self, event: Event):
         with self._obs_lock:
-            observer_copy = self.observers
+            channels = self._channels
 
-        for observer in observer_copy:
-            observer.update(event)
+        for channel in channels:
+            channel.update(event)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every subscriber has processed the packets delivered so far."""
+        with self._obs_lock:
+            channels = self._channels
+        return all([channel.join(timeout) for channel in channels])
+
+    def pipeline_stats(self) -> Dict[str, ConsumerStats]:
+        """Queue depth and drop counters per subscriber."""
+        with self._obs_lock:
+            channels = self._channels
+        return {channel.name: channel.stats() for channel in channels}
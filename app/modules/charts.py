@@ -0,0 +1,114 @@
+import math
+import tkinter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import customtkinter as ctk
+
+from app.utils.series import TimeSeries
+
+
+class LineChart:
+    """
+    A live time-series chart on a Tk Canvas.
+
+    Each pixel column is drawn as a vertical stroke from the lowest to the highest
+    sample it covers (TimeSeries.decimate), all in one polyline, so an hour of history
+    costs as much to draw as a minute and short spikes stay visible. The canvas items
+    are created once and only re-pointed (`coords`, `itemconfigure`), and `render`
+    does nothing unless the series, the span or the canvas size changed, so Tk only
+    repaints what actually moved.
+    """
+
+    def __init__(self, parent, title: str, series: TimeSeries, interval: float,
+                 format_value: Callable[[float], str], color: str, height: int, font: Tuple):
+        """
+        :param interval: seconds between samples of `series`
+        :param format_value: label text for a value, e.g. "12.3 Mbps"
+        """
+        self.series = series
+        self.interval = interval
+        self.format_value = format_value
+        self.span = 300.0  # seconds shown, ending at the newest sample
+
+        self.canvas = tkinter.Canvas(parent, height=height, bg="#111827", highlightthickness=0)
+        self._line = self.canvas.create_line(0, 0, 0, 0, fill=color, width=1)
+        self._title = self.canvas.create_text(8, 6, anchor="nw", text=title, fill="gray", font=font)
+        self._scale = self.canvas.create_text(0, 6, anchor="ne", text="", fill="gray", font=font)
+        self._value = self.canvas.create_text(0, 0, anchor="se", text="", fill=color, font=font)
+        self._texts: Dict[int, str] = {}
+        self._drawn: Optional[Tuple] = None  # what the canvas shows: (version, span, width, height)
+
+    def set_span(self, seconds: float) -> None:
+        self.span = seconds
+
+    def render(self) -> bool:
+        """Redraw if anything changed since the last call; True when it did."""
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        state = (self.series.version, self.span, width, height)
+        last = self.series.last
+        if state == self._drawn or last is None or width < 2 or height < 2:
+            return False
+        end, current = last
+        columns = self.series.decimate(end - self.span, end, width, self.interval)
+        top = _ceiling(max((high for _, _, high in columns), default=0.0))
+        plot_top, plot_bottom = 22, height - 4  # leave the title row clear
+        scale = (plot_bottom - plot_top) / top
+
+        points: List[float] = []
+        for x, low, high in columns:
+            points += (x, plot_bottom - high * scale, x, plot_bottom - low * scale)
+        if len(points) < 4:
+            points = [0, plot_bottom, 0, plot_bottom]
+        self.canvas.coords(self._line, *points)
+
+        if self._drawn is None or self._drawn[2:] != (width, height):
+            self.canvas.coords(self._scale, width - 8, 6)
+            self.canvas.coords(self._value, width - 8, height - 6)
+        self._set_text(self._scale, f"max {self.format_value(top)}")
+        self._set_text(self._value, self.format_value(current))
+        self._drawn = state
+        return True
+
+    def _set_text(self, item: int, text: str) -> None:
+        if self._texts.get(item) != text:
+            self._texts[item] = text
+            self.canvas.itemconfigure(item, text=text)
+
+
+class TopTable:
+    """
+    A fixed number of (name, value) rows. Labels are created once; `show` only
+    reconfigures the cells whose text changed.
+    """
+
+    def __init__(self, parent, rows: int, font: Tuple):
+        self.frame = ctk.CTkFrame(parent, fg_color="transparent")
+        self.frame.grid_columnconfigure(0, weight=1)
+        self._cells: List[Tuple[ctk.CTkLabel, ctk.CTkLabel]] = []
+        self._shown: List[Tuple[str, str]] = []
+        for row in range(rows):
+            name = ctk.CTkLabel(self.frame, text="", font=font, anchor="w")
+            value = ctk.CTkLabel(self.frame, text="", font=font, anchor="e")
+            name.grid(row=row, column=0, sticky="ew", padx=(4, 8))
+            value.grid(row=row, column=1, sticky="e", padx=(8, 4))
+            self._cells.append((name, value))
+            self._shown.append(("", ""))
+
+    def show(self, rows: List[Tuple[str, str]]) -> None:
+        for i, (cells, shown) in enumerate(zip(self._cells, self._shown)):
+            text = rows[i] if i < len(rows) else ("", "")
+            if text == shown:
+                continue
+            self._shown[i] = text
+            if text[0] != shown[0]:
+                cells[0].configure(text=text[0])
+            if text[1] != shown[1]:
+                cells[1].configure(text=text[1])
+
+
+def _ceiling(value: float) -> float:
+    """A round axis maximum at or above `value`: 1, 2 or 5 times a power of ten."""
+    if value <= 0:
+        return 1.0
+    magnitude = 10.0 ** math.floor(math.log10(value))
+    return next(step * magnitude for step in (1, 2, 5, 10) if step * magnitude >= value)
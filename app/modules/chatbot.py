@@ -1,22 +1,68 @@
+import itertools
+import re
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+
+from app.config import QueryConfig, TableConfig
 from app.utils import QueryMessage
+from app.utils.events import QueryResultEvent
 from app.modules.metrics import Metrics
 from app.modules.alert import Alerts
-from app.modules.gui import GUI
+from app.modules.history import History, HistoryAnswer, HistoryQuery
+from app.modules.query import QueryEngine
 from app.modules.storage import Storage
-import re
+from app.utils.addresses import pack_address
+from app.utils.cache import QueryCache
+from app.utils.cancel import CancelToken
+from app.utils.query import QuerySyntaxError, looks_like_query, parse_query
+from app.utils.record import protocol_names
+from app.utils.rollup import Rollups
+from app.utils.tabular import export_packets, export_rollups, export_rows, require_pyarrow, table_format
+from app.utils.timerange import parse_time_range
+
+_EXPORT = re.compile(r"^\s*export\s+(.+?)\s+to\s+(\S+)\s*$", re.IGNORECASE)
+_IP = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3}|[0-9a-f]{0,4}(?::[0-9a-f]{0,4}){2,7})\b")
+
+if TYPE_CHECKING:
+    from app.modules.gui import GUI
 
 class Chatbot:
-    def __init__(self, metrics: Metrics, alerts: Alerts, gui: GUI, storage: Storage):
+    def __init__(self, metrics: Metrics, alerts: Alerts, gui: "GUI", storage: Storage,
+                 rollups: Optional[Rollups] = None):
+        """
+        :param rollups: history for time-scoped questions - default; `metrics.rollups` when it has them
+        """
         self.metrics = metrics
         self.alerts = alerts
         self.gui = gui
         self.storage = storage
+        self.cache = QueryCache()
+        self.history = History(storage, rollups if rollups is not None else getattr(metrics, "rollups", None),
+                               cache=self.cache)
+        self.queries = QueryEngine(storage, cache=self.cache)
+
+    def processQuery(self, query: QueryMessage, token: Optional[CancelToken] = None):
+        """
+        :param token: lets the caller cancel or time out a long history or query-language scan
+        """
+        export = _EXPORT.match(query.message)
+        if export:
+            self._export(export.group(1), export.group(2), token)
+            return
+        if looks_like_query(query.message):
+            self._run_query(query.message, token)
+            return
 
-    def processQuery(self, query: QueryMessage):
         text = query.message.lower()
         response = "I'm not sure how to answer that."
 
-        if "latency" in text:
+        history_query = self._history_query(text)
+        if history_query is not None:
+            try:
+                response = self._describe(self.history.answer(history_query, token))
+            except LookupError:
+                response = "No captured history covers that time range yet."
+        elif "latency" in text:
             snapshot = self.metrics.get()
             response = f"The average latency is {snapshot.average_latency:.2f} ms."
         elif "alert" in text:
@@ -48,6 +94,12 @@ class Chatbot:
                                     f"Src: {pkt.src_ip}:{pkt.src_port} -> Dst: {pkt.dst_ip}:{pkt.dst_port}\n"
                                     f"Proto: {pkt.highest_layer} | Len: {pkt.captured_length}\n"
                                     f"Summary: {pkt.summary}")
+                        try:
+                            detail = self.storage.packet_detail(idx)
+                        except Exception as e:
+                            detail = f"Full detail unavailable: {e}"
+                        if detail:
+                            response += f"\n\n{detail}"
                     else:
                         response = f"Packet #{idx} not found. Storage has {len(self.storage)} packets."
                 except Exception as e:
@@ -56,3 +108,124 @@ class Chatbot:
                 response = "Please specify a packet number, e.g., 'show packet 5'."
         
         self.gui.display_chat_response(response)
+
+    def _run_query(self, text: str, token: Optional[CancelToken] = None):
+        """Stream a query-language result ("flows where dst_port = 443 limit 10") to the GUI."""
+        try:
+            query = parse_query(text)
+            if query.limit is None:
+                query.limit = QueryConfig.CHAT_LIMIT
+            for chunk in self.queries.stream(query, token):
+                self.gui.update(QueryResultEvent(chunk))
+        except QuerySyntaxError as e:
+            self.gui.display_chat_response(f"Query error: {e}")
+
+    def _export(self, what: str, path: str, token: Optional[CancelToken] = None):
+        """
+        Write "packets", "rollups", "hourly rollups" or any query-language result
+        ("export flows where dst_port = 53 to dns.parquet") to a .parquet or .arrow file.
+        """
+        if token is not None:
+            token.extend(TableConfig.TIMEOUT_SECONDS)
+        what = what.strip()
+        try:
+            if what.lower() == "packets":
+                rows = export_packets(self.storage.snapshot().column_blocks(), path, token)
+            elif what.lower() in ("rollups", "hourly rollups"):
+                if self.history.rollups is None:
+                    self.gui.display_chat_response("No rollups are being kept.")
+                    return
+                rows = export_rollups(self.history.rollups.buckets(hours=what.lower() != "rollups"), path)
+            else:
+                require_pyarrow()
+                table_format(path)
+                stream = iter(self.queries.stream(parse_query(what), token))
+                first = next(stream)
+                rows = export_rows(first.columns, itertools.chain([first.rows], (chunk.rows for chunk in stream)),
+                                   path, token)
+        except (ImportError, ValueError, OSError) as e:
+            self.gui.display_chat_response(f"Export failed: {e}")
+            return
+        self.gui.display_chat_response(f"Exported {rows} rows to {path}.")
+
+    @staticmethod
+    def _history_query(text: str) -> Optional[HistoryQuery]:
+        """A time-scoped aggregate question ("top talkers in the last 15 minutes"), or None."""
+        window = parse_time_range(text)
+        if window is None:
+            return None
+        start, end, _ = window
+
+        if "talker" in text or "top source" in text:
+            measure = "top_sources"
+        elif "top destination" in text:
+            measure = "top_destinations"
+        elif "port" in text and "top" in text:
+            measure = "top_ports"
+        elif "protocol" in text:
+            measure = "protocols"
+        elif "throughput" in text or "bandwidth" in text:
+            measure = "throughput"
+        elif "bytes" in text or "traffic" in text or "data" in text:
+            measure = "bytes"
+        elif "packet" in text:
+            # "how many" alone is not enough: "how many alerts today" is not about traffic
+            measure = "packets"
+        else:
+            return None
+
+        query = HistoryQuery(measure, start, end)
+        words = set(re.findall(r"[a-z0-9]+", text))
+        for name in protocol_names():
+            if name.lower() in words and name != "DATA":
+                query.protocol = name
+                break
+        for match in _IP.finditer(text):
+            address = match.group(1)
+            if pack_address(address) is None:
+                continue  # "09:30:00" and friends
+            preceding = text[:match.start()].rstrip()
+            if preceding.endswith("from"):
+                query.src = address
+            elif preceding.endswith("to"):
+                query.dst = address
+            else:
+                query.host = address
+        port = re.search(r"\bport\s+(\d{1,5})\b", text)
+        if port and measure != "top_ports":
+            query.port = int(port.group(1))
+        return query
+
+    @staticmethod
+    def _describe(answer: HistoryAnswer) -> str:
+        query = answer.query
+        start, end = datetime.fromtimestamp(query.start), datetime.fromtimestamp(query.end)
+        span = f"{start:%Y-%m-%d %H:%M} - {end:%H:%M}" if start.date() == end.date() \
+            else f"{start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}"
+        filters = ", ".join(
+            f"{name}={getattr(query, name)}" for name in ("protocol", "src", "dst", "host", "port")
+            if getattr(query, name) is not None
+        )
+        scope = f"{span}{' | ' + filters if filters else ''}"
+
+        value = answer.value
+        if isinstance(value, list):
+            if not value:
+                body = "No matching traffic."
+            else:
+                unit = " bytes" if query.measure in ("top_sources", "top_destinations") else " packets"
+                body = "\n".join(f"{i}. {key}: {amount:,.0f}{unit}" for i, (key, amount) in enumerate(value, 1))
+        elif query.measure == "throughput":
+            body = f"Throughput: {value / 1_000_000:.2f} Mbps"
+        elif query.measure == "bytes":
+            body = f"Bytes: {value:,.0f}"
+        else:
+            body = f"Packets: {value:,.0f}"
+
+        notes = [f"{answer.source}, {answer.examined} examined, {answer.elapsed_ms:.1f} ms"]
+        if answer.estimated:
+            notes.append("minute resolution")
+        if not answer.complete:
+            notes.append("partial: history starts later")
+        return f"{query.measure.replace('_', ' ').capitalize()} ({scope}):\n{body}\n[{'; '.join(notes)}]"
+
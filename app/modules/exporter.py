@@ -0,0 +1,229 @@
+import json
+import threading
+import time
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import ExportConfig
+from app.utils.events import Event
+from app.utils.interfaces import Observer
+from app.utils.models import MetricsSnapshot
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+JSON_CONTENT_TYPE = "application/json"
+
+
+class MetricsExporter(Observer):
+    """
+    Serves the latest MetricsSnapshot over HTTP.
+
+    - `/metrics` Prometheus text exposition format
+    - `/metrics.json` JSON
+
+    Snapshots are serialized on the publishing thread at most once every
+    `refresh_interval` seconds; scrapes only copy the cached bytes, so the number
+    of scrapers never adds work to the capture path. A snapshot that arrives inside
+    the interval is kept and serialized by a timer when the interval ends, so the
+    last one before metrics go quiet is still served.
+    """
+
+    def __init__(self, host: str = ExportConfig.HOST, port: int = ExportConfig.PORT,
+                 refresh_interval: float = ExportConfig.REFRESH_SECONDS):
+        """
+        :param host: address to bind, loopback by default
+        :param port: TCP port to bind, 0 picks a free port
+        :param refresh_interval: minimum seconds between cache refreshes
+        """
+        self.host = host
+        self.port = port
+        self.refresh_interval = refresh_interval
+
+        self._last_refresh: float = 0.0
+        self._latest: Optional[MetricsSnapshot] = None  # held back by the throttle
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._refreshes: int = 0
+        self._scrapes: int = 0
+        # (prometheus body, json body), swapped atomically by the publisher
+        self._cache: Tuple[bytes, bytes] = self._serialize(MetricsSnapshot(), time.time())
+
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def update(self, event: Event):
+        if event.name != "metrics_updated" or not isinstance(event.payload, MetricsSnapshot):
+            return
+
+        now = time.time()
+        with self._lock:
+            wait = self._last_refresh + self.refresh_interval - now
+            if wait > 0:
+                self._latest = event.payload
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self._refresh_latest)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self._latest = None
+            self._refresh(event.payload, now)
+
+    def _refresh_latest(self) -> None:
+        with self._lock:
+            self._timer = None
+            snapshot, self._latest = self._latest, None
+            if snapshot is not None:
+                self._refresh(snapshot, time.time())
+
+    def _refresh(self, snapshot: MetricsSnapshot, now: float) -> None:
+        self._last_refresh = now
+        self._refreshes += 1
+        self._cache = self._serialize(snapshot, now)
+
+    def start(self) -> None:
+        if self._server is not None:
+            return
+
+        exporter = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                exporter._handle(self)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of stdout
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if self._server is None:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        prometheus_body, json_body = self._cache
+        path = request.path.split("?", 1)[0]
+
+        if path == "/metrics":
+            body, content_type = prometheus_body, PROMETHEUS_CONTENT_TYPE
+        elif path == "/metrics.json":
+            body, content_type = json_body, JSON_CONTENT_TYPE
+        else:
+            request.send_error(404, "use /metrics or /metrics.json")
+            return
+
+        with self._lock:  # request threads run concurrently
+            self._scrapes += 1
+        request.send_response(200)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _serialize(self, snapshot: MetricsSnapshot, generated_at: float) -> Tuple[bytes, bytes]:
+        document = asdict(snapshot)
+        document["exporter"] = {
+            "generated_at": generated_at,
+            "refreshes": self._refreshes,
+            "scrapes": self._scrapes,
+        }
+        json_body = json.dumps(document).encode("utf-8")
+        prometheus_body = "".join(self._prometheus_lines(snapshot, generated_at)).encode("utf-8")
+        return prometheus_body, json_body
+
+    def _prometheus_lines(self, m: MetricsSnapshot, generated_at: float) -> Iterable[str]:
+        yield from _metric("packetwatch_packets_total", "counter", "Packets captured.", m.total_packets_captured)
+        yield from _metric("packetwatch_bytes_total", "counter", "Bytes captured.", m.total_data_transfered)
+        yield from _metric("packetwatch_error_packets_total", "counter", "Malformed or expert-flagged packets.", m.error_packets)
+        yield from _metric("packetwatch_packet_rate", "gauge", "Packets/sec over the sliding window.", m.packet_rate)
+        yield from _metric("packetwatch_peak_packet_rate", "gauge", "Highest observed packets/sec.", m.peak_packet_rate)
+        yield from _metric("packetwatch_throughput_bytes_per_second", "gauge", "Bytes/sec over the sliding window.", m.throughput)
+        yield from _metric("packetwatch_average_packet_size_bytes", "gauge", "Running average packet size.", m.average_packet_size)
+        yield from _metric("packetwatch_average_latency_ms", "gauge", "Average packet inter-arrival time.", m.average_latency)
+        yield from _metric("packetwatch_syn_rate", "gauge", "SYN packets/sec over the sliding window.", m.syn_rate)
+        yield from _metric("packetwatch_rst_rate", "gauge", "RST packets/sec over the sliding window.", m.rst_rate)
+        yield from _metric("packetwatch_unique_source_ips", "gauge", "Distinct source addresses.", m.unique_source_ips)
+        yield from _metric("packetwatch_unique_destination_ips", "gauge", "Distinct destination addresses.", m.unique_destination_ips)
+
+        yield from _labelled("packetwatch_protocol_packets_total", "counter", "Packets per highest layer.",
+                             [({"protocol": k}, v) for k, v in m.protocol_breakdown.items()])
+        yield from _labelled("packetwatch_tcp_flag_packets_total", "counter", "Packets per TCP flag.",
+                             [({"flag": k}, v) for k, v in m.tcp_flag_counts.items()])
+        yield from _labelled("packetwatch_top_source_bytes", "gauge", "Top talkers by bytes sent.",
+                             [({"rank": str(i), "ip": str(ip)}, v) for i, (ip, v) in enumerate(m.top_source_ips, 1)])
+        yield from _labelled("packetwatch_top_destination_bytes", "gauge", "Top talkers by bytes received.",
+                             [({"rank": str(i), "ip": str(ip)}, v) for i, (ip, v) in enumerate(m.top_destination_ips, 1)])
+        yield from _labelled("packetwatch_top_destination_port_packets", "gauge", "Busiest destination ports.",
+                             [({"rank": str(i), "port": str(port)}, v) for i, (port, v) in enumerate(m.top_destination_ports, 1)])
+        yield from _labelled("packetwatch_anomaly", "gauge", "Anomaly indicators (1 = active).",
+                             [({"indicator": k}, int(v)) for k, v in m.anomaly_indicators.items()])
+
+        yield from _labelled("packetwatch_interface_packets_total", "counter", "Packets per capture interface.",
+                             [({"interface": k}, v.packets) for k, v in m.interface_breakdown.items()])
+        yield from _labelled("packetwatch_interface_bytes_total", "counter", "Bytes per capture interface.",
+                             [({"interface": k}, v.bytes) for k, v in m.interface_breakdown.items()])
+        yield from _labelled("packetwatch_interface_packet_rate", "gauge", "Packets/sec per capture interface.",
+                             [({"interface": k}, v.packet_rate) for k, v in m.interface_breakdown.items()])
+
+        yield from _labelled("packetwatch_consumer_backlog", "gauge", "Events queued per capture subscriber.",
+                             [({"consumer": k}, v.backlog) for k, v in m.consumer_stats.items()])
+        yield from _labelled("packetwatch_consumer_dropped_total", "counter", "Events a full subscriber queue discarded.",
+                             [({"consumer": k, "policy": v.policy}, v.dropped) for k, v in m.consumer_stats.items()])
+        yield from _labelled("packetwatch_consumer_sampled_out_total", "counter", "Events thinned by the sample queue policy.",
+                             [({"consumer": k}, v.sampled_out) for k, v in m.consumer_stats.items()])
+
+        yield from _histogram("packetwatch_packet_size_bytes", "Captured packet sizes.",
+                              m.packet_size_histogram, m.total_data_transfered)
+        yield from _histogram("packetwatch_latency_ms", "Packet inter-arrival times.",
+                              m.latency_histogram, m.average_latency * m.latency_count)
+
+        yield from _metric("packetwatch_capture_lag_ms", "gauge", "Smoothed delay between sniff and processing.", m.capture_lag)
+        yield from _metric("packetwatch_sample_rate", "gauge", "1-in-N packet sampling currently applied.", m.sample_rate)
+        yield from _metric("packetwatch_ingest_time_avg_us", "gauge", "Average Metrics.update cost per packet.", m.ingest_time_avg_us)
+        yield from _metric("packetwatch_exporter_refreshes_total", "counter", "Snapshot cache refreshes.", self._refreshes)
+        yield from _metric("packetwatch_exporter_scrapes_total", "counter", "Scrapes served.", self._scrapes)
+        yield from _metric("packetwatch_exporter_generated_timestamp_seconds", "gauge", "When this snapshot was serialized.", generated_at)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def _metric(name: str, kind: str, help_text: str, value) -> Iterable[str]:
+    yield f"# HELP {name} {help_text}\n"
+    yield f"# TYPE {name} {kind}\n"
+    yield f"{name} {value}\n"
+
+
+def _labelled(name: str, kind: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> Iterable[str]:
+    yield f"# HELP {name} {help_text}\n"
+    yield f"# TYPE {name} {kind}\n"
+    for labels, value in samples:
+        yield f"{name}{{{_format_labels(labels)}}} {value}\n"
+
+
+def _histogram(name: str, help_text: str, cumulative: Dict[str, int], total: float) -> Iterable[str]:
+    yield f"# HELP {name} {help_text}\n"
+    yield f"# TYPE {name} histogram\n"
+    for bound, count in cumulative.items():
+        yield f'{name}_bucket{{le="{bound}"}} {count}\n'
+    yield f"{name}_sum {total}\n"
+    yield f"{name}_count {cumulative.get('+Inf', 0)}\n"
@@ -1,17 +1,30 @@
 import queue
-from typing import List, Optional, Dict
+import time
+from typing import Dict, List, Optional
 
 import customtkinter as ctk
-import psutil
 
-from app.utils.events import Event, QueryRaised, StartCaptureEvent, StopCaptureEvent
-from app.utils.interfaces import Observer, Subject
-from app.utils.models import AlertInfo, CaptureConfig, MetricsSnapshot, QueryMessage
-
-class GUI(Observer, Subject):
-    def __init__(self):
+from app.config import ChartConfig, MetricConfig
+from app.modules.charts import LineChart, TopTable
+from app.modules.packetlist import PacketList, PacketListModel
+from app.modules.storage import Storage
+from app.utils.events import CancelQueriesEvent, ChatResponseEvent, Event, QueryRaised, StartCaptureEvent, StopCaptureEvent
+from app.utils.bus import Publisher
+from app.utils.interfaces import Observer
+from app.utils.bpf import parse_ports
+from app.utils.netif import interface_labels, rank_interfaces
+from app.utils.models import AlertInfo, CaptureConfig, LoadProgress, MetricsSnapshot, ProtocolFilter, QueryChunk, QueryMessage
+from app.utils.query import format_row
+from app.utils.series import TimeSeries
+
+class GUI(Observer, Publisher):
+    def __init__(self, storage: Optional[Storage] = None):
+        """
+        :param storage: browse it in a Packets tab - default; no packet list
+        """
+        super().__init__()
+        self.storage = storage
         self.event_queue = queue.Queue()
-        self.observers: List[Observer] = []
         self.window: Optional[ctk.CTk] = None
 
         # Fonts
@@ -35,8 +48,23 @@ class GUI(Observer, Subject):
         self.lbl_packet_rate: Optional[ctk.CTkLabel] = None
         self.lbl_total_packets: Optional[ctk.CTkLabel] = None
         self.txt_alerts: Optional[ctk.CTkTextbox] = None
+        self.lbl_status: Optional[ctk.CTkLabel] = None
         self.txt_chat_history: Optional[ctk.CTkTextbox] = None
         self.entry_chat: Optional[ctk.CTkEntry] = None
+        self._query_rows: Dict[int, int] = {}  # rows shown so far per query being streamed
+
+        # Live charts: metrics arrive per packet, but are drawn at most ChartConfig.FPS times a second
+        history = int(ChartConfig.HISTORY_SECONDS / ChartConfig.SAMPLE_SECONDS)
+        self.series: Dict[str, TimeSeries] = {"throughput": TimeSeries(history), "packet_rate": TimeSeries(history)}
+        self.charts: List[LineChart] = []
+        self.tables: Dict[str, TopTable] = {}
+        self._latest_metrics: Optional[MetricsSnapshot] = None
+        self._metrics_changed = False
+        self._sampled_total: Optional[int] = None  # packet count at the previous chart sample
+        self._next_sample = 0.0
+
+        # Packet list: only the rows on screen are read from Storage
+        self.packet_list: Optional[PacketList] = None
         
         # Capture Controls
         self.option_protocol: Optional[ctk.CTkOptionMenu] = None
@@ -49,45 +77,11 @@ class GUI(Observer, Subject):
         self.interface_map: Dict[str, str] = self._probe_interfaces()
 
     def _probe_interfaces(self) -> Dict[str, str]:
-        """Return mapping: human label -> real interface name (active only)."""
-        labels: Dict[str, str] = {}
-        try:
-            stats = psutil.net_if_stats()
-            addrs = psutil.net_if_addrs()
-        except Exception:
-            return labels
-
-        for name, st in stats.items():
-            if not st.isup:
-                continue
-
-            ip_list = [a.address for a in addrs.get(name, []) if a.family.name == "AF_INET"] if addrs else []
-            ip_part = f" ({', '.join(ip_list)})" if ip_list else ""
-
-            if "wi-fi" in name.lower() or "wlan" in name.lower():
-                pretty = f"Wi-Fi{name.replace('Wi-Fi', '').replace('wi-fi', '')}{ip_part}"
-            elif "ethernet" in name.lower() or "eth" in name.lower():
-                pretty = f"Ethernet{name.replace('Ethernet', '').replace('ethernet', '')}{ip_part}"
-            elif "loopback" in name.lower():
-                pretty = f"Loopback{ip_part}"
-            else:
-                pretty = f"{name}{ip_part}"
-
-            labels[pretty] = name
-
-        return labels
-
-    def subscribe(self, observer: Observer):
-        if observer not in self.observers:
-            self.observers.append(observer)
-
-    def unsubscribe(self, observer: Observer):
-        if observer in self.observers:
-            self.observers.remove(observer)
-
-    def notify_observers(self, event: Event):
-        for observer in self.observers:
-            observer.update(event)
+        """Return mapping: human label -> real interface name (active only), busiest first."""
+        labels = interface_labels()
+        ranked = rank_interfaces()
+        order = {name: i for i, name in enumerate(ranked)}
+        return dict(sorted(labels.items(), key=lambda item: order.get(item[1], len(order))))
 
     def update(self, event: Event):
         # Thread-safe: Put event in queue
@@ -108,9 +102,17 @@ class GUI(Observer, Subject):
 
     def handle_event(self, event: Event):
         if event.name == "metrics_updated" and isinstance(event.payload, MetricsSnapshot):
-            self.update_metrics(event.payload)
+            # one per packet; only the latest matters by the next frame
+            self._latest_metrics = event.payload
+            self._metrics_changed = True
         elif event.name == "alert_generated" and isinstance(event.payload, AlertInfo):
             self.add_alert(event.payload)
+        elif event.name == "query_result" and isinstance(event.payload, QueryChunk):
+            self.add_query_chunk(event.payload)
+        elif event.name == "chat_response":
+            self.add_chat_message(f"Bot: {event.payload}")
+        elif event.name == "storage_load" and isinstance(event.payload, LoadProgress):
+            self.show_load_progress(event.payload)
 
     def update_metrics(self, metrics: MetricsSnapshot):
         if self.lbl_latency:
@@ -120,9 +122,80 @@ class GUI(Observer, Subject):
         if self.lbl_total_packets:
             self.lbl_total_packets.configure(text=f"{metrics.total_packets_captured}")
 
+    def render_frame(self):
+        """Sample the series, refresh labels and tables, and redraw charts that changed."""
+        now = time.time()
+        if now >= self._next_sample:
+            self._sample(now)
+            self._next_sample = now + ChartConfig.SAMPLE_SECONDS
+        if self._metrics_changed and self._latest_metrics is not None:
+            self._metrics_changed = False
+            self.update_metrics(self._latest_metrics)
+            self.update_tables(self._latest_metrics)
+        for chart in self.charts:
+            chart.render()
+        if self.packet_list is not None:
+            self.packet_list.render()
+
+        if self.window and self.window.winfo_exists():
+            self.window.after(int(1000 / ChartConfig.FPS), self.render_frame)
+
+    def _sample(self, now: float):
+        metrics = self._latest_metrics
+        total = metrics.total_packets_captured if metrics is not None else None
+        if metrics is None or total == self._sampled_total:
+            # no packet since the last sample: the windowed rates in the snapshot are stale
+            self.series["throughput"].append(now, 0.0)
+            self.series["packet_rate"].append(now, 0.0)
+        else:
+            self.series["throughput"].append(now, metrics.throughput_bps)
+            self.series["packet_rate"].append(now, metrics.packet_rate)
+        self._sampled_total = total
+
+    def update_tables(self, metrics: MetricsSnapshot):
+        if not self.tables:
+            return
+        self.tables["Sources"].show([(ip, f"{count:,}") for ip, count in metrics.top_source_ips])
+        self.tables["Destinations"].show([(ip, f"{count:,}") for ip, count in metrics.top_destination_ips])
+        self.tables["Ports"].show([(port, f"{count:,}") for port, count in metrics.top_destination_ports])
+        total = sum(metrics.protocol_breakdown.values()) or 1
+        protocols = sorted(metrics.protocol_breakdown.items(), key=lambda item: item[1], reverse=True)
+        self.tables["Protocols"].show([(name, f"{count:,}  {count / total:6.1%}") for name, count in protocols])
+        flags = sorted(metrics.tcp_flag_counts.items(), key=lambda item: item[1], reverse=True)
+        self.tables["TCP flags"].show([(name, f"{count:,}") for name, count in flags])
+
+    def on_chart_span(self, label: str):
+        for chart in self.charts:
+            chart.set_span(ChartConfig.SPANS[label])
+
+    def on_open_packet(self, position: int):
+        """Ask the chatbot for the full detail of a packet picked in the list."""
+        query_text = f"show packet {position}"
+        self.add_chat_message(f"You: {query_text}")
+        self.notify_observers(QueryRaised(QueryMessage(message=query_text)))
+
+    def show_load_progress(self, progress: LoadProgress):
+        """Saved-session loading runs in the background; its progress sits in the controls bar."""
+        if not progress.done:
+            if self.lbl_status:
+                self.lbl_status.configure(text=f"Loading {progress.fraction:.0%} ({progress.packets:,} packets)")
+            return
+        if self.lbl_status:
+            self.lbl_status.configure(text="")
+        if progress.error:
+            self.add_log(f"Loading {progress.path} stopped after {progress.packets:,} packets: {progress.error}")
+        else:
+            self.add_log(f"Loaded {progress.packets:,} packets from {progress.path}")
+        if progress.dropped:
+            self.add_log(f"{progress.dropped:,} packets captured while loading were dropped")
+
     def add_alert(self, alert: AlertInfo):
         if self.txt_alerts:
             log_msg = f"[{alert.severity}] {alert.message}\n"
+            if alert.snapshot_path:
+                log_msg += f"    snapshot: {alert.snapshot_path}\n"
+            if alert.recordings:
+                log_msg += f"    recorded in {', '.join(alert.recordings)}\n"
             self.txt_alerts.insert("end", log_msg)
             self.txt_alerts.see("end")
 
@@ -130,14 +203,18 @@ class GUI(Observer, Subject):
         proto = self.option_protocol.get().lower()  # BPF filters require lowercase
         port_str = self.entry_port.get()
         try:
-            port = int(port_str)
+            # accepts a single port or a list/ranges, e.g. "53, 443, 8000-8080"
+            ports = parse_ports(port_str)
 
             display_iface = self.option_interface.get() if self.option_interface else None
             interface = self.interface_map.get(display_iface, None)
 
-            config = CaptureConfig(protocol=proto, port=port, interface=interface)
+            if len(ports) <= 1 and all(isinstance(p, int) for p in ports):
+                config = CaptureConfig(protocol=proto, port=ports[0] if ports else 0, interface=interface)
+            else:
+                config = CaptureConfig(protocol=proto, interface=interface, filters=[ProtocolFilter(proto, ports)])
             self.notify_observers(StartCaptureEvent(config))
-            self.add_log(f"Requested capture on {proto}:{port} @ {display_iface or interface or 'auto'}")
+            self.add_log(f"Requested capture on {proto}:{port_str or 0} @ {display_iface or interface or 'auto'}")
         except ValueError:
             self.add_log("Invalid port number")
 
@@ -150,12 +227,28 @@ class GUI(Observer, Subject):
             query_text = self.entry_chat.get()
             if query_text:
                 self.add_chat_message(f"You: {query_text}")
-                query = QueryMessage(message=query_text)
-                self.notify_observers(QueryRaised(query))
+                if query_text.strip().lower() == "cancel":
+                    self.notify_observers(CancelQueriesEvent())
+                else:
+                    query = QueryMessage(message=query_text)
+                    self.notify_observers(QueryRaised(query))
                 self.entry_chat.delete(0, "end")
 
     def display_chat_response(self, response: str):
-        self.add_chat_message(f"Bot: {response}")
+        # answers come from query worker threads; Tk widgets are only touched from process_queue
+        self.update(ChatResponseEvent(response))
+
+    def add_query_chunk(self, chunk: QueryChunk):
+        """Append streamed query rows to the chat; the header goes out with the first chunk."""
+        if chunk.stream not in self._query_rows:
+            self.add_chat_message("Bot: " + "  ".join(chunk.columns))
+            self._query_rows[chunk.stream] = 0
+        for row in chunk.rows:
+            self.add_chat_message(format_row(chunk.columns, row))
+        self._query_rows[chunk.stream] += len(chunk.rows)
+        if chunk.done:
+            rows = self._query_rows.pop(chunk.stream)
+            self.add_chat_message(f"[{rows} rows; {chunk.plan}; {chunk.elapsed_ms:.1f} ms]")
 
     def add_chat_message(self, message: str):
         if self.txt_chat_history:
@@ -174,7 +267,7 @@ class GUI(Observer, Subject):
         
         self.window = ctk.CTk()
         self.window.title("Packet Watch - Network Traffic Monitor")
-        self.window.geometry("1400x800")
+        self.window.geometry("1400x960")
 
         # Grid Layout - 3 columns
         self.window.grid_columnconfigure(0, weight=2)  # Left: Metrics
@@ -182,6 +275,7 @@ class GUI(Observer, Subject):
         self.window.grid_columnconfigure(2, weight=2)  # Right: Chat
         self.window.grid_rowconfigure(0, weight=0)     # Controls bar
         self.window.grid_rowconfigure(1, weight=1)     # Main content
+        self.window.grid_rowconfigure(2, weight=1)     # Traffic charts
 
         # --- 1. Controls Frame (Top Bar) ---
         frame_controls = ctk.CTkFrame(self.window, corner_radius=10)
@@ -197,7 +291,7 @@ class GUI(Observer, Subject):
         self.option_protocol.grid(row=0, column=1, padx=5, pady=12)
         
         ctk.CTkLabel(frame_controls, text="Port:", font=self.font_label).grid(row=0, column=2, padx=(15, 5), pady=12, sticky="w")
-        self.entry_port = ctk.CTkEntry(frame_controls, width=80, placeholder_text="0 = all")
+        self.entry_port = ctk.CTkEntry(frame_controls, width=120, placeholder_text="0 = all, 53,8000-8080")
         self.entry_port.insert(0, "0")
         self.entry_port.grid(row=0, column=3, padx=5, pady=12)
 
@@ -207,8 +301,9 @@ class GUI(Observer, Subject):
         self.option_interface.set(interface_values[0])
         self.option_interface.grid(row=0, column=5, padx=5, pady=12)
         
-        # Spacer
-        ctk.CTkLabel(frame_controls, text="").grid(row=0, column=6, padx=5)
+        # Spacer, also showing background work such as loading a saved session
+        self.lbl_status = ctk.CTkLabel(frame_controls, text="", font=self.font_label, text_color="gray")
+        self.lbl_status.grid(row=0, column=6, padx=5)
         
         self.btn_start = ctk.CTkButton(frame_controls, text="Start", command=self.on_start_capture, 
                            fg_color="#22c55e", hover_color="#16a34a", width=110, height=32, font=self.font_button)
@@ -257,24 +352,30 @@ class GUI(Observer, Subject):
         self.lbl_latency = ctk.CTkLabel(metric_card_latency, text="0.00 ms", font=self.font_value)
         self.lbl_latency.pack(pady=(0, 12))
 
-        # --- 3. Alerts Frame (Middle Column) ---
+        # --- 3. Alerts and Packets Frame (Middle Column) ---
         frame_alerts = ctk.CTkFrame(self.window, corner_radius=10)
         frame_alerts.grid(row=1, column=1, padx=7, pady=(0, 15), sticky="nsew")
-        frame_alerts.grid_rowconfigure(1, weight=1)
+        frame_alerts.grid_rowconfigure(0, weight=1)
         frame_alerts.grid_columnconfigure(0, weight=1)
+
+        # Tabs stand in for the header
+        tabs_middle = ctk.CTkTabview(frame_alerts)
+        tabs_middle.grid(row=0, column=0, sticky="nsew", padx=12, pady=(4, 12))
+        tab_alerts = tabs_middle.add("Alerts & Logs")
+        tab_alerts.grid_rowconfigure(0, weight=1)
+        tab_alerts.grid_columnconfigure(0, weight=1)
         
-        # Header
-        header_alerts = ctk.CTkFrame(frame_alerts, fg_color="#111827", corner_radius=8)
-        header_alerts.grid(row=0, column=0, sticky="ew", padx=12, pady=(12, 8))
-        ctk.CTkLabel(header_alerts, text="Alerts & Logs", font=self.font_title, 
-                text_color="white").pack(pady=10)
-        
-        self.txt_alerts = ctk.CTkTextbox(frame_alerts, font=self.font_log, wrap="word")
-        self.txt_alerts.grid(row=1, column=0, sticky="nsew", padx=12, pady=(0, 12))
+        self.txt_alerts = ctk.CTkTextbox(tab_alerts, font=self.font_log, wrap="word")
+        self.txt_alerts.grid(row=0, column=0, sticky="nsew")
+
+        if self.storage is not None:
+            self.packet_list = PacketList(tabs_middle.add("Packets"), PacketListModel(self.storage),
+                                          self.font_label_mono, self.on_open_packet)
+            self.packet_list.frame.pack(fill="both", expand=True)
 
         # --- 4. Chatbot Frame (Right Column) ---
         frame_chat = ctk.CTkFrame(self.window, corner_radius=10)
-        frame_chat.grid(row=1, column=2, padx=(7, 15), pady=(0, 15), sticky="nsew")
+        frame_chat.grid(row=1, column=2, rowspan=2, padx=(7, 15), pady=(0, 15), sticky="nsew")
         frame_chat.grid_rowconfigure(1, weight=1)
         frame_chat.grid_columnconfigure(0, weight=1)
         
@@ -305,8 +406,58 @@ class GUI(Observer, Subject):
                     font=self.font_button, command=self.on_send_query)
         btn_send.grid(row=0, column=1)
 
-        # Start Queue Processing
+        # --- 5. Traffic Frame (below Metrics and Alerts) ---
+        frame_traffic = ctk.CTkFrame(self.window, corner_radius=10)
+        frame_traffic.grid(row=2, column=0, columnspan=2, padx=(15, 7), pady=(0, 15), sticky="nsew")
+        frame_traffic.grid_columnconfigure(0, weight=3)
+        frame_traffic.grid_columnconfigure(1, weight=2)
+        frame_traffic.grid_rowconfigure(1, weight=1)
+        frame_traffic.grid_rowconfigure(2, weight=1)
+
+        # Header, with the visible time span
+        header_traffic = ctk.CTkFrame(frame_traffic, fg_color="#111827", corner_radius=8)
+        header_traffic.grid(row=0, column=0, columnspan=2, sticky="ew", padx=12, pady=(12, 8))
+        ctk.CTkLabel(header_traffic, text="Traffic", font=self.font_title,
+                text_color="white").pack(side="left", padx=12, pady=10)
+        span_default = next(iter(ChartConfig.SPANS))
+        span_buttons = ctk.CTkSegmentedButton(header_traffic, values=list(ChartConfig.SPANS),
+                                              command=self.on_chart_span)
+        span_buttons.set(span_default)
+        span_buttons.pack(side="right", padx=12)
+
+        # Charts
+        charts = [
+            ("Throughput", "throughput", _format_bps, "#38bdf8"),
+            ("Packet Rate", "packet_rate", lambda value: f"{value:,.0f} pkts/s", "#a3e635"),
+        ]
+        for row, (title, key, format_value, color) in enumerate(charts, 1):
+            chart = LineChart(frame_traffic, title, self.series[key], ChartConfig.SAMPLE_SECONDS, format_value,
+                              color, ChartConfig.HEIGHT, self.font_label)
+            chart.set_span(ChartConfig.SPANS[span_default])
+            chart.canvas.grid(row=row, column=0, sticky="nsew", padx=(12, 6), pady=(0, 12 if row == len(charts) else 6))
+            self.charts.append(chart)
+
+        # Top-N tables
+        tabs_top = ctk.CTkTabview(frame_traffic, height=ChartConfig.HEIGHT * 2)
+        tabs_top.grid(row=1, column=1, rowspan=2, sticky="nsew", padx=(6, 12), pady=(0, 12))
+        rows = max(MetricConfig.TOP_N_TALKERS, 6)
+        for name in ("Sources", "Destinations", "Ports", "Protocols", "TCP flags"):
+            table = TopTable(tabs_top.add(name), rows, self.font_label_mono)
+            table.frame.pack(fill="both", expand=True)
+            self.tables[name] = table
+
+        # Start Queue Processing and chart rendering
         self.process_queue()
+        self.render_frame()
         
         # Start Main Loop
         self.window.mainloop()
+        if self.packet_list is not None:
+            self.packet_list.model.close()
+
+
+def _format_bps(bps: float) -> str:
+    for unit, size in (("Gbps", 1e9), ("Mbps", 1e6), ("kbps", 1e3)):
+        if bps >= size:
+            return f"{bps / size:.1f} {unit}"
+    return f"{bps:.0f} bps"
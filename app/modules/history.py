@@ -0,0 +1,330 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from app.config import HistoryConfig
+from app.modules.storage import Storage, StorageSnapshot
+from app.utils.addresses import ADDRESSES
+from app.utils.cache import CacheEntry, QueryCache
+from app.utils.cancel import CancelToken, guarded
+from app.utils.record import PacketRecord, find_protocol, protocol_name
+from app.utils.rollup import RollupBucket, Rollups
+
+# measure -> dimension it groups by (None for scalar measures)
+MEASURES: Dict[str, Optional[str]] = {
+    "packets": None,
+    "bytes": None,
+    "throughput": None,       # bits per second over the range
+    "top_sources": "src",     # by bytes
+    "top_destinations": "dst",
+    "top_ports": "dst_port",  # by packets
+    "protocols": "protocol",  # by packets
+}
+_RANK_BY_BYTES = ("top_sources", "top_destinations")
+
+
+@dataclass
+class HistoryQuery:
+    measure: str
+    start: float
+    end: float
+    protocol: Optional[str] = None
+    src: Optional[str] = None
+    dst: Optional[str] = None
+    host: Optional[str] = None  # either direction
+    port: Optional[int] = None  # destination port
+    limit: int = HistoryConfig.TOP_N
+
+
+@dataclass
+class HistoryAnswer:
+    query: HistoryQuery
+    value: Union[float, List[Tuple[Union[str, int], float]]]
+    source: str             # which plan produced the answer
+    examined: int           # rollup buckets or stored packets touched
+    complete: bool          # the source held the whole time range
+    estimated: bool         # rollups: minute-aligned and weighted by capture sampling
+    elapsed_ms: float
+
+
+@dataclass
+class _Plan:
+    source: str
+    cost: int
+    complete: bool
+    run: Callable[[], Optional[Tuple[Union[float, List], int]]]
+
+
+class History:
+    """
+    Answers time-scoped aggregate questions from the cheapest source that can.
+
+    - Metrics rollups (minute and hour buckets): any unfiltered measure, or a scalar
+      measure filtered on a single field; cost grows with the number of buckets
+    - Storage indexes: any filter combination; cost is the shortest posting list in
+      the time span (or the span itself when unfiltered)
+
+    Among the plans whose source holds the whole time range the cheapest wins;
+    rollups keep days of history, Storage only what it has room for. Storage answers
+    are cached and, when the question is asked again, only new rows are examined.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None, rollups: Optional[Rollups] = None,
+                 cache: Optional[QueryCache] = None):
+        """
+        :param cache: keeps storage answers to update incrementally - default; recompute every time
+        """
+        self.storage = storage
+        self.rollups = rollups
+        self.cache = cache
+
+    def answer(self, query: HistoryQuery, token: Optional[CancelToken] = None) -> HistoryAnswer:
+        """
+        :param token: stops a long Storage scan with QueryCancelled - default; runs to the end
+        """
+        if query.measure not in MEASURES:
+            raise ValueError(f"unknown measure: {query.measure}")
+        started = time.perf_counter()
+
+        filters = self._resolve_filters(query)
+        if filters is None:
+            # a filter value never seen in this process cannot match anything
+            empty = [] if MEASURES[query.measure] else 0.0
+            return HistoryAnswer(query, empty, "no match", 0, True, False, _elapsed(started))
+
+        # one consistent view of Storage for the whole answer, however long capture keeps appending
+        storage = self.storage.snapshot() if self.storage is not None else None
+        if self.cache is not None and storage is not None:
+            cached = self._cached(query, filters, storage, token)
+            if cached is not None:
+                value, source, examined, complete = cached
+                return HistoryAnswer(query, value, source, examined, complete, False, _elapsed(started))
+
+        for plan in self.plan(query, filters, storage, token):
+            result = plan.run()
+            if result is not None:
+                value, examined = result
+                estimated = plan.source.startswith("rollups")
+                return HistoryAnswer(query, value, plan.source, examined, plan.complete, estimated, _elapsed(started))
+        raise LookupError("no history source can answer this query")
+
+    def plan(self, query: HistoryQuery, filters: List[Tuple[str, Tuple[int, ...]]],
+             storage: Optional[StorageSnapshot] = None, token: Optional[CancelToken] = None) -> List[_Plan]:
+        """
+        Candidate plans, best first.
+        :param storage: the snapshot to plan against - default; a fresh one
+        """
+        if storage is None and self.storage is not None:
+            storage = self.storage.snapshot()
+        plans: List[_Plan] = []
+        if self.rollups is not None:
+            plan = self._rollup_plan(query, filters)
+            if plan is not None:
+                plans.append(plan)
+        if storage is not None and len(storage):
+            plans.append(self._storage_plan(query, filters, storage, token))
+        plans.sort(key=lambda plan: (not plan.complete, plan.cost))
+        return plans
+
+    def _resolve_filters(self, query: HistoryQuery) -> Optional[List[Tuple[str, Tuple[int, ...]]]]:
+        """(dimension, accepted ids) per filter; a host filter is src or dst."""
+        filters: List[Tuple[str, Tuple[int, ...]]] = []
+        if query.protocol is not None:
+            pid = find_protocol(query.protocol)
+            if pid is None:
+                return None
+            filters.append(("protocol", (pid,)))
+        for dimension in ("src", "dst", "host"):
+            text = getattr(query, dimension)
+            if text is None:
+                continue
+            aid = ADDRESSES.find(text)
+            if aid is None:
+                return None
+            filters.append((dimension, (aid,)))
+        if query.port is not None:
+            filters.append(("dst_port", (query.port,)))
+        return filters
+
+    # rollups
+
+    def _rollup_plan(self, query: HistoryQuery, filters: List[Tuple[str, Tuple[int, ...]]]) -> Optional[_Plan]:
+        group = MEASURES[query.measure]
+        if len(filters) > 1 or (filters and group is not None):
+            return None  # buckets hold one dimension at a time
+        bounds = self.rollups.bounds()
+        if bounds is None:
+            return None
+        buckets = self.rollups.cover(query.start, query.end)
+        return _Plan(
+            source="rollups",
+            cost=len(buckets) * HistoryConfig.BUCKET_COST,
+            complete=bounds[0] <= query.start,
+            run=lambda: self._run_rollups(query, filters, buckets),
+        )
+
+    def _run_rollups(self, query: HistoryQuery, filters, buckets: List[RollupBucket]):
+        group = MEASURES[query.measure]
+        if group is not None:
+            suffix = "_bytes" if query.measure in _RANK_BY_BYTES else "_packets"
+            totals: Dict[int, int] = defaultdict(int)
+            for bucket in buckets:
+                # items are listed in one step: capture keeps adding keys to open buckets
+                for key, value in list(getattr(bucket, group + suffix).items()):
+                    totals[key] += value
+            return _ranked(group, totals, query.limit), len(buckets)
+
+        measure = "packets" if query.measure == "packets" else "bytes"
+        total = 0
+        if not filters:
+            for bucket in buckets:
+                total += getattr(bucket, measure)
+        else:
+            dimension, (key,) = filters[0]
+            dimensions = ("src", "dst") if dimension == "host" else (dimension,)
+            for bucket in buckets:
+                for name in dimensions:
+                    value = bucket.count(name, key, measure)
+                    if value is None:
+                        return None  # pruned hour bucket; let Storage answer
+                    total += value
+        return _scalar(query, total), len(buckets)
+
+    # storage
+
+    def _storage_plan(self, query: HistoryQuery, filters: List[Tuple[str, Tuple[int, ...]]],
+                      storage: StorageSnapshot, token: Optional[CancelToken]) -> _Plan:
+        index = storage.index()
+        lo, hi = index.span(query.start, query.end)
+
+        rows: Sequence[int] = range(lo, hi)
+        source = "storage scan"
+        for dimension, (key,) in filters:
+            if dimension == "host":
+                candidate = sorted(set(index.within(index.postings("src", key), lo, hi))
+                                   | set(index.within(index.postings("dst", key), lo, hi)))
+            else:
+                candidate = index.within(index.postings(dimension, key), lo, hi)
+            if len(candidate) < len(rows):
+                rows, source = candidate, f"storage index ({dimension})"
+
+        return _Plan(source, len(rows), _storage_complete(query, storage),
+                     lambda: self._run_storage(query, filters, rows, storage, token))
+
+    def _run_storage(self, query: HistoryQuery, filters, rows: Sequence[int], storage: StorageSnapshot,
+                     token: Optional[CancelToken]):
+        tally: Dict[Optional[int], int] = {}
+        _tally(query, filters, guarded(rows, token), storage.record,
+               lambda t: query.start <= t <= query.end, tally, 1)
+        if self.cache is not None:
+            entry = CacheEntry(tally, query.start, query.end, storage.watermark(), len(tally))
+            self.cache.put(_cache_key(query, filters), entry)
+        return _value(query, tally), len(rows)
+
+    def _cached(self, query: HistoryQuery, filters, storage: StorageSnapshot,
+                token: Optional[CancelToken]) -> Optional[Tuple[Any, str, int, bool]]:
+        """
+        Answer from the tally of an earlier storage answer to the same question.
+
+        A range that only moved forward ("last 15 minutes" asked again) is brought up
+        to date from the difference alone: packets that left the window are
+        subtracted, packets that entered it (stored earlier, or appended since) added.
+        """
+        key = _cache_key(query, filters)
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        start, end = query.start, query.end
+        if entry.mark[0] != storage.watermark()[0] or start < entry.start or end < entry.end or start > entry.end:
+            return None
+        if not _storage_complete(query, storage):
+            return None  # rollups may hold the part Storage is missing; let the planner choose
+        if (start, end) == (entry.start, entry.end) and not storage.changed_since(entry.mark, start, end):
+            return _value(query, entry.value), "cache", 0, True
+
+        index = storage.index()
+        old_start, old_end, size = entry.start, entry.end, entry.mark[1]
+        left = range(*index.span(old_start, start)) if start > old_start else range(0)
+        entered = range(*index.span(old_end, end)) if end > old_end else range(0)
+        appended = range(max(size, index.span(start, end)[0]), index.size)
+        examined = len(left) + len(entered) + len(appended)
+        if examined > index.span(start, end)[1] - index.span(start, end)[0]:
+            return None  # the difference is no cheaper than the answer itself
+
+        tally = dict(entry.value)  # the entry may be in use by another query thread
+        record_at = storage.record
+        _tally(query, filters, guarded((p for p in left if p < size), token), record_at,
+               lambda t: old_start <= t < start, tally, -1)
+        _tally(query, filters, guarded((p for p in entered if p < size), token), record_at,
+               lambda t: old_end < t <= end, tally, 1)
+        _tally(query, filters, guarded(appended, token), record_at, lambda t: start <= t <= end, tally, 1)
+        self.cache.put(key, CacheEntry(tally, start, end, storage.watermark(), len(tally)))
+        return _value(query, tally), f"cache + {examined} changed rows", examined, True
+
+
+def _storage_complete(query: HistoryQuery, storage: StorageSnapshot) -> bool:
+    first = storage.index().first_timestamp()
+    capacity = storage.capacity
+    full = capacity is not None and len(storage) >= capacity
+    return first is not None and first <= query.start and not full
+
+
+def _cache_key(query: HistoryQuery, filters: List[Tuple[str, Tuple[int, ...]]]) -> Tuple:
+    # the tally is by bytes or by packets; throughput and the limit are applied on the way out
+    by_bytes = query.measure in _RANK_BY_BYTES or query.measure in ("bytes", "throughput")
+    return "history", MEASURES[query.measure], by_bytes, tuple(filters)
+
+
+def _tally(query: HistoryQuery, filters: List[Tuple[str, Tuple[int, ...]]], rows: Iterable[int],
+           record_at: Callable[[int], PacketRecord], in_range: Callable[[float], bool],
+           tally: Dict[Optional[int], int], sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) the matching rows' packets or bytes, per group key."""
+    checks = []
+    for dimension, (key,) in filters:
+        if dimension == "host":
+            checks.append(lambda record, key=key: record.src == key or record.dst == key)
+        else:
+            checks.append(lambda record, name=dimension, key=key: getattr(record, name) == key)
+    group = MEASURES[query.measure]
+    by_bytes = query.measure in _RANK_BY_BYTES or query.measure in ("bytes", "throughput")
+
+    for position in rows:
+        record = record_at(position)
+        if not in_range(record.timestamp) or not all(check(record) for check in checks):
+            continue
+        key = None if group is None else getattr(record, group)
+        if group is not None and key is None:
+            continue
+        amount = sign * (max(record.length, 0) if by_bytes else 1)
+        total = tally.get(key, 0) + amount
+        if total:
+            tally[key] = total
+        else:
+            tally.pop(key, None)
+
+
+def _value(query: HistoryQuery, tally: Dict[Optional[int], int]) -> Union[float, List[Tuple[Union[str, int], float]]]:
+    group = MEASURES[query.measure]
+    if group is not None:
+        return _ranked(group, tally, query.limit)
+    return _scalar(query, tally.get(None, 0))
+
+
+def _scalar(query: HistoryQuery, total: int) -> float:
+    if query.measure == "throughput":
+        return total * 8 / max(query.end - query.start, 1e-9)
+    return float(total)
+
+
+def _ranked(dimension: str, totals: Dict[int, int], limit: int) -> List[Tuple[Union[str, int], float]]:
+    top = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+    if dimension in ("src", "dst"):
+        return [(ADDRESSES.text(key), float(value)) for key, value in top]
+    if dimension == "protocol":
+        return [(protocol_name(key), float(value)) for key, value in top]
+    return [(key, float(value)) for key, value in top]
+
+
+def _elapsed(started: float) -> float:
+    return (time.perf_counter() - started) * 1000.0
@@ -1,43 +1,38 @@
+import threading
 import time
+from bisect import bisect_left
 from collections import defaultdict, deque
-from dataclasses import dataclass
-from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
 
 from app.utils import MetricsSnapshot
-from app.utils.interfaces import Subject, Observer
+from app.utils.models import ConsumerStats, InterfaceMetrics
+from app.utils.metrics import MetricsDelta, anomaly_indicators, cumulative_histogram
+from app.utils.bus import Publisher
+from app.utils.interfaces import Observer
 from app.utils.events import Event, PacketCapturedEvent, MetricsUpdatedEvent
-from app.utils.models import Packet
+from app.utils.addresses import ADDRESSES
+from app.utils.record import RST, SYN, ERROR, TCP_FLAGS, PacketRecord, protocol_name
+from app.utils.rollup import Rollups
 
-from app.config import MetricConfig
+from app.config import MetricConfig, PipelineConfig
 
 
-@dataclass
 class _WindowEntry:
-    timestamp: float
-    length: int
-    is_syn: bool
-    is_rst: bool
-
-
-@dataclass
-class _PacketFeatures:
-    timestamp: float
-    length: int
-    protocol: str
-    src_ip: Optional[str]
-    dst_ip: Optional[str]
-    src_port: Optional[int]
-    dst_port: Optional[int]
-    is_syn: bool
-    is_rst: bool
-    is_error: bool
-    tcp_flags: Dict[str, bool]
-
-
-class Metrics(Subject, Observer):
+    __slots__ = ("timestamp", "length", "flags", "weight", "interface")
+
+    def __init__(self, timestamp: float, length: int, flags: int, weight: int, interface: Optional[str]):
+        self.timestamp = timestamp
+        self.length = length
+        self.flags = flags
+        self.weight = weight
+        self.interface = interface
+
+
+class Metrics(Publisher, Observer):
     def __init__(self) -> None:
+        super().__init__()
         self._metrics: MetricsSnapshot = MetricsSnapshot()
-        self.observers: List[Observer] = []
+        self._ingested: int = 0  # packets actually processed; totals are weighted by the sample rate
 
         # recent window bookkeeping
         self._recent_packets: Deque[_WindowEntry] = deque()
@@ -45,51 +40,95 @@ class Metrics(Subject, Observer):
         self._window_byte_count: int = 0
         self._window_syn_count: int = 0
         self._window_rst_count: int = 0
+        self._window_interface_packets: Dict[str, int] = defaultdict(int)
+        self._window_interface_bytes: Dict[str, int] = defaultdict(int)
+
+        # per-interface totals when capturing on several interfaces
+        self._interface_packets: Dict[str, int] = defaultdict(int)
+        self._interface_bytes: Dict[str, int] = defaultdict(int)
 
         # distribution maps
-        self._protocol_counts: Dict[str, int] = defaultdict(int)
+        self._protocol_counts: Dict[int, int] = defaultdict(int)  # protocol id -> packets
         self._dst_port_counts: Dict[int, int] = defaultdict(int)
-        self._src_ip_bytes: Dict[str, int] = defaultdict(int)
-        self._dst_ip_bytes: Dict[str, int] = defaultdict(int)
+        self._src_ip_bytes: Dict[int, int] = defaultdict(int)  # address id -> bytes
+        self._dst_ip_bytes: Dict[int, int] = defaultdict(int)
         self._tcp_flag_counts: Dict[str, int] = defaultdict(int)
 
+        # histogram buckets, last slot is the overflow (+Inf) bucket
+        self._size_buckets: List[int] = [0] * (len(MetricConfig.PACKET_SIZE_BUCKETS) + 1)
+        self._latency_buckets: List[int] = [0] * (len(MetricConfig.LATENCY_BUCKETS_MS) + 1)
+
+        # minute/hour history for time-scoped questions (app.modules.history)
+        self.rollups = Rollups()
+
+        # mergeable per-interval accumulator, only populated once a Sensor enables it
+        self._delta: Optional[MetricsDelta] = None
+        self._delta_lock = threading.Lock()
+
+        # capture subscriber queue counters, polled at most every STATS_REFRESH_SECONDS
+        self._pipeline_stats: Optional[Callable[[], Dict[str, ConsumerStats]]] = None
+        self._pipeline_polled: float = 0.0
+
     def update(self, event: Event) -> None:
         if not isinstance(event, PacketCapturedEvent):
             raise TypeError("Metrics only accepts PacketCapturedEvent")
 
-        packet: Packet = event.payload  # type: ignore[assignment]
-        features = self._extract_packet_features(packet)
-        self._ingest_packet(features)
+        started = time.perf_counter()
+        record = event.record
+        # sampled packets stand for `weight` captured ones, so counters stay unbiased estimates
+        weight = max(event.sample_rate, 1)
+        self._ingest_packet(record, weight, event.interface)
         self._refresh_snapshot_views()
+        self._update_instrumentation(record.timestamp, time.perf_counter() - started)
+        self._refresh_pipeline_stats()
 
         self.notify_observers(MetricsUpdatedEvent(self.get()))
         #print(self._metrics)
 
-    def subscribe(self, observer: Observer):
-        self.observers.append(observer)
-
-    def unsubscribe(self, observer: Observer):
-        if observer in self.observers:
-            self.observers.remove(observer)
-
-    def notify_observers(self, event: Event):
-        for observer in list(self.observers):
-            observer.update(event)
-
     def get(self) -> MetricsSnapshot:
         """
         Get Metrics
         """
         return self._metrics
 
-    def _ingest_packet(self, features: _PacketFeatures) -> None:
-        length = max(features.length, 0)
-        self._metrics.total_packets_captured += 1
-        self._metrics.total_data_transfered += length
+    def watch_pipeline(self, stats: Callable[[], Dict[str, ConsumerStats]]) -> None:
+        """
+        Report per-subscriber queue depth and drops in the snapshot
+        :param stats: usually `Capture.pipeline_stats`
+        """
+        self._pipeline_stats = stats
+        self._metrics.consumer_stats = stats()
+
+    def enable_deltas(self, source: str) -> None:
+        """
+        Start accumulating a MetricsDelta alongside the snapshot
+        :param source: name stamped on every delta (sensor name)
+        """
+        with self._delta_lock:
+            if self._delta is None:
+                self._delta = MetricsDelta(source=source)
+
+    def drain_delta(self) -> Optional[MetricsDelta]:
+        """
+        Return everything recorded since the previous call and start a new delta.
+        Safe to call from another thread than the one feeding `update`.
+        """
+        with self._delta_lock:
+            if self._delta is None:
+                return None
+            drained, self._delta = self._delta, MetricsDelta(source=self._delta.source)
+        drained.capture_lag = self._metrics.capture_lag
+        return drained
+
+    def _ingest_packet(self, record: PacketRecord, weight: int = 1, interface: Optional[str] = None) -> None:
+        length = max(record.length, 0)
+        self._metrics.total_packets_captured += weight
+        self._metrics.total_data_transfered += length * weight
+        self._metrics.sample_rate = weight
 
         # running avg packet size
         self._metrics.average_packet_size += (
-            length - self._metrics.average_packet_size
+            (length - self._metrics.average_packet_size) * weight
         ) / max(self._metrics.total_packets_captured, 1)
 
         # min/max packet length
@@ -99,71 +138,113 @@ class Metrics(Subject, Observer):
             length and length < self._metrics.min_packet_size
         ):
             self._metrics.min_packet_size = length
+        size_bucket = bisect_left(MetricConfig.PACKET_SIZE_BUCKETS, length)
+        self._size_buckets[size_bucket] += weight
+
+        if self._delta is not None:
+            with self._delta_lock:
+                self._delta.record_packet(
+                    record.timestamp, length, size_bucket, protocol_name(record.protocol),
+                    ADDRESSES.key(record.src), ADDRESSES.key(record.dst), record.dst_port, record.flags, weight,
+                )
 
         # latency based on sniff timestamp
-        self._update_latency(features.timestamp)
+        self._update_latency(record.timestamp, weight)
+
+        # distributions for alerting/analytics, keyed by ids and rendered in snapshots
+        self._protocol_counts[record.protocol] += weight
+        if record.dst_port is not None:
+            self._dst_port_counts[record.dst_port] += weight
+        if record.src is not None:
+            self._src_ip_bytes[record.src] += length * weight
+        if record.dst is not None:
+            self._dst_ip_bytes[record.dst] += length * weight
 
-        # distributions for alerting/analytics
-        self._protocol_counts[features.protocol] += 1
-        if features.dst_port is not None:
-            self._dst_port_counts[features.dst_port] += 1
-        if features.src_ip:
-            self._src_ip_bytes[features.src_ip] += length
-        if features.dst_ip:
-            self._dst_ip_bytes[features.dst_ip] += length
+        if interface is not None:
+            self._interface_packets[interface] += weight
+            self._interface_bytes[interface] += length * weight
+
+        self.rollups.add(record, weight)
 
         # tcp flags breakdown for anomalies
-        self._update_tcp_flag_counts(features.tcp_flags)
+        if record.flags:
+            self._update_tcp_flag_counts(record.flags, weight)
 
         # sliding window for rates
-        self._update_window(features)
+        self._update_window(record, length, weight, interface)
 
-        if features.is_error:
-            self._metrics.error_packets += 1
+        if record.flags & ERROR:
+            self._metrics.error_packets += weight
 
-    def _update_latency(self, timestamp: float) -> None:
+    def _update_latency(self, timestamp: float, weight: int = 1) -> None:
         if timestamp is None:
             timestamp = time.time()
 
         if self._metrics.last_timestamp is not None:
-            delta_ms = (timestamp - self._metrics.last_timestamp) * 1000.0
+            # the gap between sampled packets spans `weight` real inter-arrivals
+            delta_ms = (timestamp - self._metrics.last_timestamp) * 1000.0 / weight
             self._metrics.latency_count += 1
             self._metrics.average_latency += (
                 delta_ms - self._metrics.average_latency
             ) / max(self._metrics.latency_count, 1)
+            latency_bucket = bisect_left(MetricConfig.LATENCY_BUCKETS_MS, delta_ms)
+            self._latency_buckets[latency_bucket] += 1
+            if self._delta is not None:
+                with self._delta_lock:
+                    self._delta.record_latency(delta_ms, latency_bucket)
 
         self._metrics.last_timestamp = timestamp
 
-    def _update_tcp_flag_counts(self, tcp_flags: Dict[str, bool]) -> None:
-        for flag_name, is_set in tcp_flags.items():
-            if is_set:
-                self._tcp_flag_counts[flag_name] += 1
-
-    def _update_window(self, features: _PacketFeatures) -> None:
-        entry = _WindowEntry(
-            timestamp=features.timestamp,
-            length=features.length,
-            is_syn=features.is_syn,
-            is_rst=features.is_rst,
-        )
+    def _update_instrumentation(self, timestamp: float, elapsed: float) -> None:
+        lag_ms = max((time.time() - timestamp) * 1000.0, 0.0)
+        self._metrics.capture_lag += (
+            lag_ms - self._metrics.capture_lag
+        ) * MetricConfig.LAG_SMOOTHING
+
+        self._ingested += 1
+        self._metrics.ingest_time_avg_us += (
+            elapsed * 1_000_000 - self._metrics.ingest_time_avg_us
+        ) / self._ingested
+
+    def _refresh_pipeline_stats(self) -> None:
+        if self._pipeline_stats is None:
+            return
+        now = time.monotonic()
+        if now - self._pipeline_polled >= PipelineConfig.STATS_REFRESH_SECONDS:
+            self._pipeline_polled = now
+            self._metrics.consumer_stats = self._pipeline_stats()
+
+    def _update_tcp_flag_counts(self, flags: int, weight: int = 1) -> None:
+        for flag_name, bit in TCP_FLAGS:
+            if flags & bit:
+                self._tcp_flag_counts[flag_name] += weight
+
+    def _update_window(self, record: PacketRecord, length: int, weight: int, interface: Optional[str]) -> None:
+        entry = _WindowEntry(record.timestamp, length, record.flags, weight, interface)
 
         self._recent_packets.append(entry)
-        self._window_packet_count += 1
-        self._window_byte_count += features.length
-        if features.is_syn:
-            self._window_syn_count += 1
-        if features.is_rst:
-            self._window_rst_count += 1
-
-        cutoff = features.timestamp - MetricConfig.WINDOW_SECONDS
+        self._window_packet_count += weight
+        self._window_byte_count += length * weight
+        if entry.flags & SYN:
+            self._window_syn_count += weight
+        if entry.flags & RST:
+            self._window_rst_count += weight
+        if interface is not None:
+            self._window_interface_packets[interface] += weight
+            self._window_interface_bytes[interface] += length * weight
+
+        cutoff = record.timestamp - MetricConfig.WINDOW_SECONDS
         while self._recent_packets and self._recent_packets[0].timestamp < cutoff:
             old = self._recent_packets.popleft()
-            self._window_packet_count -= 1
-            self._window_byte_count -= old.length
-            if old.is_syn:
-                self._window_syn_count -= 1
-            if old.is_rst:
-                self._window_rst_count -= 1
+            self._window_packet_count -= old.weight
+            self._window_byte_count -= old.length * old.weight
+            if old.flags & SYN:
+                self._window_syn_count -= old.weight
+            if old.flags & RST:
+                self._window_rst_count -= old.weight
+            if old.interface is not None:
+                self._window_interface_packets[old.interface] -= old.weight
+                self._window_interface_bytes[old.interface] -= old.length * old.weight
 
         window_duration = MetricConfig.WINDOW_SECONDS
         self._metrics.packet_rate = self._window_packet_count / window_duration
@@ -179,17 +260,19 @@ class Metrics(Subject, Observer):
         self._metrics.rst_rate = self._window_rst_count / window_duration
 
     def _refresh_snapshot_views(self) -> None:
-        self._metrics.protocol_breakdown = dict(
-            sorted(
-                self._protocol_counts.items(), key=lambda item: item[1], reverse=True
-            )
-        )
-        self._metrics.top_source_ips = self._top_items(
-            self._src_ip_bytes.items(), MetricConfig.TOP_N_TALKERS
-        )
-        self._metrics.top_destination_ips = self._top_items(
-            self._dst_ip_bytes.items(), MetricConfig.TOP_N_TALKERS
-        )
+        self._metrics.protocol_breakdown = {
+            protocol_name(pid): count
+            for pid, count in sorted(self._protocol_counts.items(), key=lambda item: item[1], reverse=True)
+        }
+        # only the top talkers are rendered back to strings
+        self._metrics.top_source_ips = [
+            (ADDRESSES.text(aid), count)
+            for aid, count in self._top_items(self._src_ip_bytes.items(), MetricConfig.TOP_N_TALKERS)
+        ]
+        self._metrics.top_destination_ips = [
+            (ADDRESSES.text(aid), count)
+            for aid, count in self._top_items(self._dst_ip_bytes.items(), MetricConfig.TOP_N_TALKERS)
+        ]
         self._metrics.top_destination_ports = self._top_items(
             self._dst_port_counts.items(), MetricConfig.TOP_N_TALKERS
         )
@@ -197,151 +280,30 @@ class Metrics(Subject, Observer):
         self._metrics.unique_source_ips = len(self._src_ip_bytes)
         self._metrics.unique_destination_ips = len(self._dst_ip_bytes)
         self._metrics.tcp_flag_counts = dict(self._tcp_flag_counts)
-
-        self._metrics.anomaly_indicators = {
-            "high_packet_rate": self._metrics.packet_rate
-            > MetricConfig.HIGH_PACKET_RATE_THRESHOLD,
-            "high_throughput": self._metrics.throughput_bps
-            > MetricConfig.HIGH_THROUGHPUT_BPS,
-            "syn_flood_suspected": self._metrics.syn_rate
-            > MetricConfig.HIGH_SYN_RATE_THRESHOLD,
-            "rst_spike": self._metrics.rst_rate > MetricConfig.HIGH_RST_RATE_THRESHOLD,
-        }
-
-    @staticmethod
-    def _top_items(items: Iterable[Tuple], top_n: int) -> List[Tuple]:
-        return sorted(items, key=lambda item: item[1], reverse=True)[:top_n]
-
-    def _extract_packet_features(self, packet: Packet) -> _PacketFeatures:
-        timestamp = self._extract_timestamp(packet)
-        length = self._safe_int(
-            getattr(packet, "captured_length", None) or getattr(packet, "length", None)
+        self._metrics.packet_size_histogram = cumulative_histogram(
+            MetricConfig.PACKET_SIZE_BUCKETS, self._size_buckets
         )
-
-        if length is None or length == 0:
-            frame = getattr(packet, "frame_info", None)
-            if frame is not None:
-                length = self._safe_int(getattr(frame, "len", None))
-
-        if length is None:
-            length = 0
-
-        protocol = (
-            getattr(packet, "highest_layer", None)
-            or getattr(packet, "transport_layer", None)
-            or "UNKNOWN"
+        self._metrics.latency_histogram = cumulative_histogram(
+            MetricConfig.LATENCY_BUCKETS_MS, self._latency_buckets
         )
 
-        protocol = protocol.upper()
-
-        src_ip = self._extract_ip(packet, "src")
-        dst_ip = self._extract_ip(packet, "dst")
-        src_port, dst_port = self._extract_ports(packet)
-        tcp_flags = self._extract_tcp_flags(packet)
-        is_syn = tcp_flags.get("SYN", False)
-        is_rst = tcp_flags.get("RST", False)
-        is_error = self._is_error_packet(packet, protocol)
-
-        return _PacketFeatures(
-            timestamp=timestamp,
-            length=length,
-            protocol=protocol,
-            src_ip=src_ip,
-            dst_ip=dst_ip,
-            src_port=src_port,
-            dst_port=dst_port,
-            is_syn=is_syn,
-            is_rst=is_rst,
-            is_error=is_error,
-            tcp_flags=tcp_flags,
-        )
-
-    @staticmethod
-    def _extract_timestamp(packet: Packet) -> float:
-        for attr in ("sniff_timestamp", "sniff_time", "timestamp"):
-            value = getattr(packet, attr, None)
-            if value is None:
-                continue
-            try:
-                return float(value)
-            except (TypeError, ValueError):
-                continue
-        return time.time()
-
-    @staticmethod
-    def _extract_ip(packet: Packet, direction: str) -> Optional[str]:
-        attr = "src" if direction == "src" else "dst"
-        for layer_name in ("ip", "ipv6"):
-            layer = getattr(packet, layer_name, None)
-            if layer is None:
-                continue
-            value = getattr(layer, attr, None)
-            if value:
-                return value
-
-        return None
-
-    def _extract_ports(self, packet: Packet) -> Tuple[Optional[int], Optional[int]]:
-        for layer_name in ("tcp", "udp"):
-            layer = getattr(packet, layer_name, None)
-
-            if layer is None:
-                continue
-
-            src = self._safe_int(
-                getattr(layer, "srcport", None)
-                or getattr(layer, "sport", None)
-                or getattr(layer, "src_port", None),
-                default=None,
-            )
-
-            dst = self._safe_int(
-                getattr(layer, "dstport", None)
-                or getattr(layer, "dport", None)
-                or getattr(layer, "dst_port", None),
-                default=None,
-            )
-
-            return src, dst
-
-        return None, None
-
-    @staticmethod
-    def _extract_tcp_flags(packet: Packet) -> Dict[str, bool]:
-        flags: Dict[str, bool] = {}
-        tcp_layer = getattr(packet, "tcp", None)
+        self._metrics.anomaly_indicators = anomaly_indicators(self._metrics)
 
-        if tcp_layer is None:
-            return flags
-
-        for flag in ("syn", "ack", "fin", "rst", "psh", "urg"):
-            attr = f"flags_{flag}"
-            value = getattr(tcp_layer, attr, None)
-            flags[flag.upper()] = str(value) == "1"
-
-        return flags
+        if self._interface_packets:
+            window = MetricConfig.WINDOW_SECONDS
+            self._metrics.interface_breakdown = {
+                name: InterfaceMetrics(
+                    packets=packets,
+                    bytes=self._interface_bytes[name],
+                    packet_rate=self._window_interface_packets[name] / window,
+                    throughput_bps=self._window_interface_bytes[name] * 8 / window,
+                )
+                for name, packets in self._interface_packets.items()
+            }
 
     @staticmethod
-    def _is_error_packet(packet: Packet, protocol: str) -> bool:
-        if protocol == "MALFORMED":
-            return True
-
-        if getattr(packet, "malformed", None) is not None:
-            return True
-
-        if getattr(packet, "expert_message", None):
-            return True
-
-        return False
-
-    @staticmethod
-    def _safe_int(value, default: Optional[int] = 0) -> Optional[int]:
-        if value is None:
-            return default
-        try:
-            return int(value)
-        except (TypeError, ValueError):
-            return default
+    def _top_items(items: Iterable[Tuple], top_n: int) -> List[Tuple]:
+        return sorted(items, key=lambda item: item[1], reverse=True)[:top_n]
 
     def __str__(self) -> str:
         return (
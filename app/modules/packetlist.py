@@ -0,0 +1,390 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from tkinter import font as tkfont, ttk
+from typing import Callable, Dict, List, Optional, Tuple
+
+import customtkinter as ctk
+
+from app.config import PacketListConfig
+from app.modules.query import QueryEngine
+from app.modules.storage import Storage, StoredPacket
+from app.utils.cancel import CancelToken, QueryCancelled
+from app.utils.query import OPERATORS, Query, QuerySyntaxError, parse_query
+
+# (query field, filter placeholder), in filter bar order
+FILTERS = (("src", "Source"), ("dst", "Destination"), ("protocol", "Protocol"),
+           ("src_port", "Src port"), ("dst_port", "Dst port"), ("length", "Length"))
+
+# (column, heading, width, stretch)
+_COLUMNS = (("no", "No.", 80, False), ("time", "Time", 100, False), ("src", "Source", 150, False),
+            ("dst", "Destination", 150, False), ("protocol", "Protocol", 70, False),
+            ("length", "Length", 60, False), ("info", "Info", 260, True))
+
+_KEYWORD_FILTER = re.compile(r"(in|between)\b", re.IGNORECASE)
+
+
+def filter_query(filters: Dict[str, str]) -> Optional[Query]:
+    """
+    The query `and`-ing column filters. Each text is a value ("443"), a list
+    ("80, 443") or starts with an operator ("> 1000", "!= DNS", "between 1 and 1023").
+    :param filters: query field -> filter text; blank ones are ignored
+    :return: None when every filter is blank
+    """
+    parts = []
+    for name, text in filters.items():
+        text = text.strip()
+        if not text:
+            continue
+        if text.startswith(OPERATORS) or _KEYWORD_FILTER.match(text):
+            parts.append(f"{name} {text}")
+        elif "," in text:
+            parts.append(f"{name} in ({text})")
+        else:
+            parts.append(f"{name} = {text}")
+    return parse_query("packets where " + " and ".join(parts)) if parts else None
+
+
+class PacketListModel:
+    """
+    The rows of a packet table over Storage, by view index: every stored packet, or
+    only those matching a filter.
+
+    Nothing is copied per row: `rows` reads just the packets asked for from a
+    snapshot. A filter's matches are collected by a background thread, through the
+    Storage indexes where the filter allows (QueryEngine.matching), handed over in
+    batches as they are found and then extended as capture appends, so neither a
+    filter over millions of rows nor a capture burst holds up the window. Call
+    `refresh` from the GUI thread to see what was published since.
+    """
+
+    def __init__(self, storage: Storage, engine: Optional[QueryEngine] = None):
+        """
+        :param engine: runs the filters - default; a QueryEngine of its own over `storage`
+        """
+        self.storage = storage
+        self.engine = engine or QueryEngine(storage)
+        self.query: Optional[Query] = None
+        self.generation = 0  # bumped whenever view indexes change meaning: a new filter or a Storage rewrite
+        self.error: Optional[str] = None  # why the current filter stopped, if it failed
+        self.scanned = 0  # rows the current filter has been checked against
+        self._view = storage.snapshot(indexed=False)
+        self._matches: Optional[array] = None  # positions passing the filter, ascending; None = unfiltered
+        self._token: Optional[CancelToken] = None
+        self._lock = threading.Lock()  # a cancelled filter thread must not publish into the next filter's state
+
+    @property
+    def total(self) -> int:
+        """Packets in Storage, filtered or not."""
+        return self._view.size
+
+    @property
+    def filtering(self) -> bool:
+        """Whether the filter has rows it has not checked yet."""
+        return self.query is not None and self.error is None and self.scanned < self._view.size
+
+    def set_filters(self, filters: Dict[str, str]) -> None:
+        """
+        :param filters: see `filter_query`
+        :raises QuerySyntaxError: for text the query language does not accept; the old filter stays
+        """
+        self._restart(filter_query(filters))
+
+    def refresh(self) -> None:
+        """Catch up with Storage (GUI thread)."""
+        mark = self.storage.watermark()
+        if mark == self._view.watermark():
+            return
+        epoch = self._view.watermark()[0]
+        self._view = self.storage.snapshot(indexed=False)
+        if self._view.watermark()[0] != epoch:
+            self._restart(self.query)  # positions from the old epoch mean nothing now
+
+    def position(self, index: int) -> int:
+        """Storage position of the row at view `index`."""
+        return index if self._matches is None else self._matches[index]
+
+    def rows(self, first: int, count: int) -> List[Tuple[int, StoredPacket]]:
+        """(position, packet) for view indexes [first, first + count)."""
+        stop = min(first + count, len(self))
+        view = self._view
+        positions = range(first, stop) if self._matches is None else self._matches[first:stop]
+        return [(position, view[position]) for position in positions]
+
+    def close(self) -> None:
+        """Stop the filter thread."""
+        if self._token is not None:
+            self._token.cancel()
+
+    def _restart(self, query: Optional[Query]) -> None:
+        with self._lock:
+            self.close()
+            self.query, self.error, self.scanned = query, None, 0
+            self.generation += 1
+            self._matches = self._token = None
+            if query is None:
+                return
+            matches, token = array("q"), CancelToken()
+            self._matches, self._token = matches, token
+        threading.Thread(target=self._collect, args=(query, matches, token),
+                         name="packet-list-filter", daemon=True).start()
+
+    def _collect(self, query: Query, matches: array, token: CancelToken) -> None:
+        """Worker: find the matches published so far, then follow appends until cancelled."""
+        epoch, scanned = None, 0
+        try:
+            while True:
+                mark = self.storage.watermark()
+                if mark[1] > scanned and (epoch is None or mark[0] == epoch):
+                    snapshot = self.storage.snapshot()
+                    epoch, size = snapshot.watermark()
+                    if size > scanned:
+                        self._extend(matches, self.engine.matching(query, snapshot, scanned, token), token)
+                        scanned = size
+                        with self._lock:
+                            if not token.cancelled:
+                                self.scanned = scanned
+                # a rewritten Storage is noticed by `refresh`, which starts over
+                if token.wait(PacketListConfig.POLL_SECONDS):
+                    return
+        except QueryCancelled:
+            return
+        except Exception as e:
+            with self._lock:
+                if not token.cancelled:
+                    self.error = str(e)
+
+    @staticmethod
+    def _extend(matches: array, found, token: CancelToken) -> None:
+        batch = array("q")
+        flush_at = time.monotonic() + PacketListConfig.BATCH_SECONDS
+        for position in found:
+            batch.append(position)
+            if len(batch) >= PacketListConfig.BATCH_ROWS or time.monotonic() >= flush_at:
+                matches.extend(batch)
+                batch = array("q")
+                flush_at = time.monotonic() + PacketListConfig.BATCH_SECONDS
+        if not token.cancelled:
+            matches.extend(batch)
+
+    def __len__(self) -> int:
+        if self._matches is None:
+            return self._view.size
+        # the filter thread may be ahead of this view
+        matches = self._matches
+        return bisect_left(matches, self._view.size, 0, len(matches))
+
+
+class PacketList:
+    """
+    A packet table over a PacketListModel that holds only as many Treeview items as
+    fit on screen. The scrollbar, wheel and keys move a window over the model and the
+    items are re-pointed at the rows under it (`render`), so scrolling costs the same
+    over ten packets or ten million. At the bottom the view follows new packets;
+    scrolled up it stays put while capture appends.
+    """
+
+    def __init__(self, parent, model: PacketListModel, font: Tuple, on_open: Callable[[int], None]):
+        """
+        :param on_open: called with a packet's storage position on double-click or Return
+        """
+        self.model = model
+        self.on_open = on_open
+        self.first = 0  # view index of the top row
+        self.follow = True  # keep the newest rows in view
+        self._items: List[str] = []  # one Treeview item per visible row, reused
+        self._shown: Dict[str, Tuple] = {}  # values each item displays
+        self._positions: List[int] = []  # storage position per item, as last rendered
+        self._cursor: Optional[int] = None  # view index of the selected row
+        self._selected: Optional[str] = None  # item selected by `render`, not by the user
+        self._generation = model.generation
+        self._drawn: Optional[Tuple] = None  # what the items show: (generation, rows, first, visible, cursor)
+        self._filter_error: Optional[str] = None
+        self._status = ""
+
+        self.frame = ctk.CTkFrame(parent, fg_color="transparent")
+        self.frame.grid_columnconfigure(0, weight=1)
+        self.frame.grid_rowconfigure(1, weight=1)
+
+        # Filter bar
+        bar = ctk.CTkFrame(self.frame, fg_color="transparent")
+        bar.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 6))
+        bar.grid_columnconfigure(len(FILTERS), weight=1)
+        self.entries: Dict[str, ctk.CTkEntry] = {}
+        for column, (name, label) in enumerate(FILTERS):
+            entry = ctk.CTkEntry(bar, width=90, placeholder_text=label, font=font)
+            entry.grid(row=0, column=column, padx=(0, 4))
+            entry.bind("<Return>", lambda e: self.apply_filters())
+            self.entries[name] = entry
+        self.lbl_status = ctk.CTkLabel(bar, text="", font=font, text_color="gray", anchor="e")
+        self.lbl_status.grid(row=0, column=len(FILTERS), sticky="ew", padx=(4, 0))
+
+        # Table
+        self._row_height = tkfont.Font(font=font).metrics("linespace") + PacketListConfig.ROW_PADDING
+        style = ttk.Style()
+        style.theme_use("clam")  # the default themes ignore Treeview colors on some platforms
+        style.configure("Packets.Treeview", background="#111827", fieldbackground="#111827", foreground="#e5e7eb",
+                        rowheight=self._row_height, font=font, borderwidth=0)
+        style.configure("Packets.Treeview.Heading", background="#1f2933", foreground="white", font=font, relief="flat")
+        style.map("Packets.Treeview", background=[("selected", "#1f6aa5")])
+        self.tree = ttk.Treeview(self.frame, columns=[name for name, _, _, _ in _COLUMNS], show="headings",
+                                 selectmode="browse", style="Packets.Treeview", height=1)
+        for name, heading, width, stretch in _COLUMNS:
+            self.tree.heading(name, text=heading, anchor="w")
+            self.tree.column(name, width=width, minwidth=40, stretch=stretch, anchor="w")
+        self.tree.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self.frame, command=self.on_scroll)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<Double-1>", lambda e: self._open())
+        self.tree.bind("<Return>", lambda e: self._open())
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_wheel)
+        keys = {"<Up>": lambda: self._move(-1), "<Down>": lambda: self._move(1),
+                "<Prior>": lambda: self._move(-len(self._items)), "<Next>": lambda: self._move(len(self._items)),
+                "<Home>": lambda: self._move(-len(self.model)), "<End>": lambda: self._move(len(self.model))}
+        for sequence, action in keys.items():
+            self.tree.bind(sequence, lambda e, action=action: action() or "break")
+
+    def apply_filters(self) -> None:
+        try:
+            self.model.set_filters({name: entry.get() for name, entry in self.entries.items()})
+            self._filter_error = None
+        except QuerySyntaxError as e:
+            self._filter_error = str(e)
+        self.render()
+
+    def render(self) -> bool:
+        """Catch up with the model and redraw if anything changed; True when it did."""
+        if not self.tree.winfo_ismapped():
+            return False
+        model = self.model
+        model.refresh()
+        if model.generation != self._generation:
+            self._generation = model.generation
+            self.first, self.follow, self._cursor = 0, True, None
+        total, visible = len(model), len(self._items)
+        bottom = max(total - visible, 0)
+        self.first = bottom if self.follow else min(self.first, bottom)
+        self._show_status(total)
+
+        state = (model.generation, total, self.first, visible, self._cursor)
+        if state == self._drawn:
+            return False
+        rows = model.rows(self.first, visible)
+        self._positions = [position for position, _ in rows]
+        for i, item in enumerate(self._items):
+            values = _values(*rows[i]) if i < len(rows) else ()
+            if self._shown.get(item) != values:
+                self._shown[item] = values
+                self.tree.item(item, values=values)
+
+        row = None if self._cursor is None else self._cursor - self.first
+        selected = self._items[row] if row is not None and 0 <= row < len(rows) else None
+        if selected != self._selected:
+            self._selected = selected
+            if selected is None:
+                self.tree.selection_remove(*self.tree.selection())
+            else:
+                self.tree.selection_set(selected)
+        self.tree.yview_moveto(0)  # the items are the window; Treeview itself never scrolls
+
+        if total > visible:
+            self.scrollbar.set(self.first / total, (self.first + visible) / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self._drawn = state
+        return True
+
+    def on_scroll(self, action: str, amount, unit: Optional[str] = None) -> None:
+        """Scrollbar command: ("moveto", fraction) or ("scroll", steps, "units"|"pages")."""
+        if action == "moveto":
+            self._scroll_to(int(float(amount) * len(self.model)))
+        else:
+            step = len(self._items) if unit == "pages" else 1
+            self._scroll_to(self.first + int(amount) * step)
+
+    def _scroll_to(self, first: int) -> None:
+        bottom = max(len(self.model) - len(self._items), 0)
+        self.first = min(max(first, 0), bottom)
+        self.follow = self.first >= bottom
+        self.render()
+
+    def _move(self, rows: int) -> None:
+        """Move the selection by `rows`, scrolling it into view."""
+        total = len(self.model)
+        if not total:
+            return
+        cursor = self.first if self._cursor is None else self._cursor
+        self._cursor = min(max(cursor + rows, 0), total - 1)
+        if self._cursor < self.first:
+            self._scroll_to(self._cursor)
+        elif self._cursor >= self.first + len(self._items):
+            self._scroll_to(self._cursor - len(self._items) + 1)
+        else:
+            self.follow = False
+            self.render()
+
+    def _on_resize(self, event) -> None:
+        rows = max(event.height // self._row_height - 1, 1)  # less the heading
+        if rows == len(self._items):
+            return
+        while len(self._items) < rows:
+            self._items.append(self.tree.insert("", "end", values=()))
+        for item in self._items[rows:]:
+            self.tree.delete(item)
+            self._shown.pop(item, None)
+            if item == self._selected:
+                self._selected = None
+        del self._items[rows:]
+        self._drawn = None
+        self.render()
+
+    def _on_select(self, event=None) -> None:
+        selection = self.tree.selection()
+        if not selection or selection[0] == self._selected:
+            return  # cleared, or selected by `render`
+        row = self._items.index(selection[0])
+        if row < len(self._positions):
+            self._selected = selection[0]
+            self._cursor = self.first + row
+            self.follow = False  # keep the picked packet on screen
+
+    def _on_wheel(self, event) -> str:
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self._scroll_to(self.first - PacketListConfig.WHEEL_ROWS)
+        else:
+            self._scroll_to(self.first + PacketListConfig.WHEEL_ROWS)
+        return "break"
+
+    def _open(self) -> None:
+        row = None if self._cursor is None else self._cursor - self.first
+        if row is not None and 0 <= row < len(self._positions):
+            self.on_open(self._positions[row])
+
+    def _show_status(self, rows: int) -> None:
+        model = self.model
+        error = self._filter_error or model.error
+        if error:
+            text = f"Filter: {error}"
+        elif model.query is None:
+            text = f"{rows:,} packets"
+        elif model.filtering:
+            text = f"{rows:,} matches, filtering..."
+        else:
+            text = f"{rows:,} of {model.total:,} packets"
+        if text != self._status:
+            self._status = text
+            self.lbl_status.configure(text=text)
+
+
+def _values(position: int, packet: StoredPacket) -> Tuple:
+    src = packet.src_ip if packet.src_port is None else f"{packet.src_ip}:{packet.src_port}"
+    dst = packet.dst_ip if packet.dst_port is None else f"{packet.dst_ip}:{packet.dst_port}"
+    return (position, datetime.fromtimestamp(packet.timestamp).strftime("%H:%M:%S.%f")[:-3],
+            src or "-", dst or "-", packet.highest_layer, packet.captured_length, packet.summary)
@@ -0,0 +1,423 @@
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from app.config import QueryConfig
+from app.modules.storage import Storage, StorageSnapshot
+from app.utils.addresses import ADDRESSES
+from app.utils.cache import CacheEntry, QueryCache
+from app.utils.cancel import CancelToken, guarded
+from app.utils.index import IndexView
+from app.utils.models import QueryChunk
+from app.utils.query import And, Comparison, Expression, Not, Or, Query, QuerySyntaxError, parse_query
+from app.utils.record import TCP_FLAGS, PacketRecord, find_protocol, protocol_name
+from app.utils.timerange import parse_time_range
+
+_FLOW_KEY = ("protocol", "src", "src_port", "dst", "dst_port")
+_INDEXED_EQUALITY = {"protocol": ("protocol",), "src": ("src",), "dst": ("dst",),
+                     "host": ("src", "dst"), "dst_port": ("dst_port",)}
+_FLAG_BITS = dict((name.lower(), bit) for name, bit in TCP_FLAGS)
+_STREAMS = itertools.count(1)  # QueryChunk.stream ids
+_NO_MATCH = object()  # a value never seen in this process (address, protocol)
+
+
+@dataclass
+class _Access:
+    rows: Sequence[int]
+    description: str
+    reverse: bool = False
+    notes: List[str] = field(default_factory=list)
+    exact: bool = False  # `rows` are exactly the matches; no need to read and test them
+
+
+class QueryEngine:
+    """
+    Runs the query language (app.utils.query) against Storage.
+
+    Planning pushes predicates down onto the Storage indexes: the time window
+    (`during`, or `time` comparisons joined by `and`) becomes a position span, and
+    the most selective `and`-ed equality or `in` on protocol, src, dst, host or
+    dst_port picks a posting list. Only those rows are read; the full `where` is then
+    checked on each.
+
+    Results stream as QueryChunks: rows in storage order (optionally newest first)
+    go out as soon as a chunk fills; grouped, flow and otherwise ordered queries
+    emit once their aggregation is complete. With a cache, a query asked again over
+    the same time range is replayed until a new packet lands in that range.
+    """
+
+    def __init__(self, storage: Storage, chunk_rows: int = QueryConfig.CHUNK_ROWS,
+                 cache: Optional[QueryCache] = None):
+        """
+        :param cache: reuse results until packets land in their time range - default; always run
+        """
+        self.storage = storage
+        self.chunk_rows = chunk_rows
+        self.cache = cache
+
+    def run(self, query: Union[str, Query], token: Optional[CancelToken] = None) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+        """Execute and collect every row: (columns, rows)."""
+        columns: List[str] = []
+        rows: List[Tuple[Any, ...]] = []
+        for chunk in self.stream(query, token):
+            columns = chunk.columns
+            rows.extend(chunk.rows)
+        return columns, rows
+
+    def explain(self, query: Union[str, Query]) -> str:
+        query = parse_query(query) if isinstance(query, str) else query
+        access = self._plan(query, self.storage.snapshot().index())
+        return "; ".join([access.description] + access.notes)
+
+    def stream(self, query: Union[str, Query], token: Optional[CancelToken] = None) -> Iterator[QueryChunk]:
+        """
+        :param token: stops the query with QueryCancelled - default; runs to the end
+        """
+        query = parse_query(query) if isinstance(query, str) else query
+        started = time.perf_counter()
+        stream = next(_STREAMS)
+        storage = self.storage.snapshot()  # rows appended after this are not seen
+        key = start = end = None
+        if self.cache is not None:
+            key = _cache_key(query)
+            start, end = _time_bounds(query)
+            start = float("-inf") if start is None else start
+            end = float("inf") if end is None else end
+            entry = self.cache.get(key)
+            if entry is not None and (entry.start, entry.end) == (start, end) \
+                    and not storage.changed_since(entry.mark, start, end):
+                yield from self._replay(entry.value, started, stream)
+                return
+
+        access = self._plan(query, storage.index())
+        skipped = _skipped_blocks(query, storage)
+        if skipped:
+            access.notes.append(f"{len(skipped)} cold blocks skipped by their stats")
+        matched = _matched(query, storage, access, skipped, token)
+
+        if query.source == "flows":
+            columns, produce = _flows(query, matched)
+        elif query.group_by:
+            columns, produce = _grouped(query, matched)
+        else:
+            columns, produce = _packets(query, matched)
+
+        kept: Optional[List[Tuple[Any, ...]]] = [] if key is not None else None
+        chunk: List[Tuple[Any, ...]] = []
+        for row in produce:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_rows:
+                yield QueryChunk(columns, chunk, False, access.description, len(access.rows), _elapsed(started), stream)
+                kept = _keep(kept, chunk, self.cache)
+                chunk = []
+        kept = _keep(kept, chunk, self.cache)
+        if kept is not None:
+            self.cache.put(key, CacheEntry((columns, kept), start, end, storage.watermark(), max(len(kept), 1)))
+        yield QueryChunk(columns, chunk, True, "; ".join([access.description] + access.notes),
+                         len(access.rows), _elapsed(started), stream)
+
+    def matching(self, query: Union[str, Query], storage: Optional[StorageSnapshot] = None, start: int = 0,
+                 token: Optional[CancelToken] = None) -> Iterator[int]:
+        """
+        Positions of the packets the query's `where` and time window select, in storage
+        order; source, grouping, order and limit are ignored. For views that page through
+        the matches themselves.
+        :param storage: the snapshot to search - default; the packets published now
+        :param start: first position to consider, to extend an earlier result as packets arrive
+        """
+        query = parse_query(query) if isinstance(query, str) else query
+        storage = storage if storage is not None else self.storage.snapshot()
+        access = self._plan(query, storage.index(), start)
+        if access.exact:
+            # a posting list answers the query alone; skip reading the rows
+            yield from guarded(access.rows, token)
+            return
+        for position, _ in _matched(query, storage, access, _skipped_blocks(query, storage), token):
+            yield position
+
+    def _replay(self, result: Tuple[List[str], List[Tuple[Any, ...]]], started: float,
+                stream: int) -> Iterator[QueryChunk]:
+        columns, rows = result
+        for offset in range(0, len(rows), self.chunk_rows):
+            chunk = rows[offset:offset + self.chunk_rows]
+            if offset + self.chunk_rows < len(rows):
+                yield QueryChunk(columns, chunk, False, "cache", 0, _elapsed(started), stream)
+            else:
+                yield QueryChunk(columns, chunk, True, "cache", 0, _elapsed(started), stream)
+                return
+        yield QueryChunk(columns, [], True, "cache", 0, _elapsed(started), stream)
+
+    def _plan(self, query: Query, index: IndexView, first: int = 0) -> _Access:
+        """:param first: leave out positions before this"""
+        start, end = _time_bounds(query)
+        if start is None and end is None:
+            lo, hi = 0, index.size
+        else:
+            lo, hi = index.span(float("-inf") if start is None else start, float("inf") if end is None else end)
+        lo = max(lo, first)
+        access = _Access(range(lo, hi), f"scan {hi - lo} rows" if (lo, hi) != (0, index.size) else f"full scan {hi} rows")
+
+        for comparison in _conjuncts(query.where):
+            dimensions = _INDEXED_EQUALITY.get(comparison.field)
+            if dimensions is None or comparison.op not in ("=", "in"):
+                continue
+            keys = [_resolve(comparison.field, value) for value in comparison.values]
+            parts = [index.within(index.postings(dimension, key), lo, hi)
+                     for key in keys if key is not _NO_MATCH for dimension in dimensions]
+            # one posting list is already in order; several may overlap (host, in)
+            postings = parts[0] if len(parts) == 1 else sorted(set().union(*parts))
+            if len(postings) < len(access.rows):
+                access.rows = postings
+                access.description = f"index {comparison.field} ({len(postings)} rows)"
+                access.exact = query.where is comparison and start is None and end is None
+
+        # plain packet listings in time order can stop at the limit
+        if query.source == "packets" and not query.group_by and query.order_by in ("time", "no") and query.descending:
+            access.reverse = True
+        if query.order_by is not None and query.source == "packets" and not query.group_by \
+                and query.order_by not in ("time", "no"):
+            access.notes.append(f"sort by {query.order_by}")
+        return access
+
+
+def _matched(query: Query, storage: StorageSnapshot, access: _Access, skipped: Set[int],
+             token: Optional[CancelToken]) -> Iterator[Tuple[int, PacketRecord]]:
+    """Read the planned rows and keep those the full `where` and time window accept."""
+    matches = _compile(query.where, query.start, query.end)
+    record_at = storage.record
+    block_rows = storage.block_rows
+    rows = reversed(access.rows) if access.reverse else access.rows
+    if skipped:
+        rows = (position for position in rows if position - position % block_rows not in skipped)
+    for position in guarded(rows, token):
+        record = record_at(position)
+        if matches(record):
+            yield position, record
+
+
+def _cache_key(query: Query) -> Tuple:
+    # parsed, so spelling, case and spacing of the text do not matter; the time range is checked separately
+    return "query", repr((query.source, query.where, query.group_by, query.order_by, query.descending, query.limit))
+
+
+def _keep(kept: Optional[List[Tuple[Any, ...]]], rows: List[Tuple[Any, ...]],
+          cache: Optional[QueryCache]) -> Optional[List[Tuple[Any, ...]]]:
+    """Collect rows for the cache until the result is too large to be worth keeping."""
+    if kept is None or len(kept) + len(rows) > cache.max_rows // 4:
+        return None
+    kept.extend(rows)
+    return kept
+
+
+def _packets(query: Query, matched: Iterator[Tuple[int, PacketRecord]]):
+    columns = ["no", "time", "protocol", "src", "src_port", "dst", "dst_port", "length"]
+    rows = (
+        (position, record.timestamp, record.protocol_name, record.src_ip, record.src_port,
+         record.dst_ip, record.dst_port, record.length)
+        for position, record in matched
+    )
+    if query.order_by not in (None, "time", "no"):
+        rows = _ordered(columns, rows, query.order_by, query.descending, query.limit)
+    elif query.limit is not None:
+        rows = itertools.islice(rows, query.limit)
+    return columns, rows
+
+
+def _grouped(query: Query, matched: Iterator[Tuple[int, PacketRecord]]):
+    getters = [_getter(name) for name in query.group_by]
+    totals: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0])
+    for _, record in matched:
+        total = totals[tuple(get(record) for get in getters)]
+        total[0] += 1
+        total[1] += max(record.length, 0)
+
+    columns = list(query.group_by) + ["packets", "bytes"]
+    rows = (tuple(_render(name, key) for name, key in zip(query.group_by, keys)) + (packets, volume)
+            for keys, (packets, volume) in totals.items())
+    return columns, _ordered(columns, rows, *_order_or_bytes(query))
+
+
+def _flows(query: Query, matched: Iterator[Tuple[int, PacketRecord]]):
+    flows: Dict[Tuple, List[float]] = {}
+    for _, record in matched:
+        key = (record.protocol, record.src, record.src_port, record.dst, record.dst_port)
+        flow = flows.get(key)
+        if flow is None:
+            flows[key] = [1, max(record.length, 0), record.timestamp, record.timestamp]
+        else:
+            flow[0] += 1
+            flow[1] += max(record.length, 0)
+            flow[2] = min(flow[2], record.timestamp)
+            flow[3] = max(flow[3], record.timestamp)
+
+    columns = list(_FLOW_KEY) + ["packets", "bytes", "first", "last"]
+    rows = (tuple(_render(name, value) for name, value in zip(_FLOW_KEY, key)) + tuple(flow)
+            for key, flow in flows.items())
+    return columns, _ordered(columns, rows, *_order_or_bytes(query))
+
+
+def _order_or_bytes(query: Query) -> Tuple[str, bool, Optional[int]]:
+    """Aggregates default to the heaviest first."""
+    if query.order_by is None:
+        return "bytes", True, query.limit
+    return query.order_by, query.descending, query.limit
+
+
+def _ordered(columns: List[str], rows: Iterator[Tuple], order_by: str, descending: bool,
+             limit: Optional[int]) -> List[Tuple]:
+    if order_by not in columns:
+        raise QuerySyntaxError(f"cannot order by {order_by!r}, expected one of {', '.join(columns)}")
+    column = columns.index(order_by)
+
+    def key(row: Tuple) -> Tuple:
+        value = row[column]
+        return (value is not None, value if value is not None else 0)
+
+    if limit is not None:
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        return pick(limit, rows, key=key)
+    return sorted(rows, key=key, reverse=descending)
+
+
+# predicates
+
+def _compile(where: Optional[Expression], start: Optional[float], end: Optional[float]) -> Callable[[PacketRecord], bool]:
+    predicate = _compile_expression(where) if where is not None else None
+    low = start if start is not None else float("-inf")
+    high = end if end is not None else float("inf")
+
+    def matches(record: PacketRecord) -> bool:
+        return low <= record.timestamp <= high and (predicate is None or predicate(record))
+    return matches
+
+
+def _compile_expression(expression: Expression) -> Callable[[PacketRecord], bool]:
+    if isinstance(expression, And):
+        parts = [_compile_expression(operand) for operand in expression.operands]
+        return lambda record: all(part(record) for part in parts)
+    if isinstance(expression, Or):
+        parts = [_compile_expression(operand) for operand in expression.operands]
+        return lambda record: any(part(record) for part in parts)
+    if isinstance(expression, Not):
+        inner = _compile_expression(expression.operand)
+        return lambda record: not inner(record)
+    return _compile_comparison(expression)
+
+
+def _compile_comparison(comparison: Comparison) -> Callable[[PacketRecord], bool]:
+    name, op = comparison.field, comparison.op
+
+    if name == "flags":
+        bits = 0
+        for value in comparison.values:
+            bit = _FLAG_BITS.get(str(value).lower())
+            if bit is None:
+                raise QuerySyntaxError(f"unknown TCP flag {value!r}")
+            bits |= bit
+        if op in ("=", "in"):
+            return lambda record: bool(record.flags & bits)
+        if op == "!=":
+            return lambda record: not record.flags & bits
+        raise QuerySyntaxError("flags only support =, != and in")
+
+    values = [_resolve(name, value) for value in comparison.values]
+    getters = [_getter(part) for part in (("src", "dst") if name == "host" else
+                                           ("src_port", "dst_port") if name == "port" else (name,))]
+
+    if op in ("=", "in"):
+        accepted = {value for value in values if value is not _NO_MATCH}
+        return lambda record: any(get(record) in accepted for get in getters)
+    if op == "!=":
+        rejected = {value for value in values if value is not _NO_MATCH}
+        return lambda record: all(get(record) not in rejected for get in getters)
+
+    if name in ("protocol", "src", "dst", "host"):
+        raise QuerySyntaxError(f"{name} only supports =, != and in")
+    bound = values[0]
+    compare = {
+        "<": lambda value: value < bound, "<=": lambda value: value <= bound,
+        ">": lambda value: value > bound, ">=": lambda value: value >= bound,
+        "between": lambda value: bound <= value <= values[-1],
+    }[op]
+    return lambda record: any((value := get(record)) is not None and compare(value) for get in getters)
+
+
+def _skipped_blocks(query: Query, storage: StorageSnapshot) -> Set[int]:
+    """Start positions of the cold blocks whose stats rule out an `and`-ed comparison."""
+    blocks = storage.blocks()
+    if not blocks:
+        return set()
+    tests = []
+    start, end = _time_bounds(query)
+    if start is not None:
+        tests.append(("time", ">=", (start,)))
+    if end is not None:
+        tests.append(("time", "<=", (end,)))
+    for comparison in _conjuncts(query.where):
+        if comparison.field in ("flags", "time") or comparison.op == "!=":
+            continue
+        values = tuple(_resolve(comparison.field, value) for value in comparison.values)
+        tests.append((comparison.field, comparison.op, tuple(value for value in values if value is not _NO_MATCH)))
+    return {block.start for block in blocks if any(block.excludes(*test) for test in tests)}
+
+
+def _conjuncts(where: Optional[Expression]) -> List[Comparison]:
+    if where is None:
+        return []
+    if isinstance(where, Comparison):
+        return [where]
+    if isinstance(where, And):
+        return [part for operand in where.operands for part in _conjuncts(operand)]
+    return []
+
+
+def _time_bounds(query: Query) -> Tuple[Optional[float], Optional[float]]:
+    start, end = query.start, query.end
+    for comparison in _conjuncts(query.where):
+        if comparison.field != "time" or comparison.op in ("!=", "in"):
+            continue
+        low = _resolve("time", comparison.values[0])
+        high = _resolve("time", comparison.values[-1])
+        if comparison.op in (">", ">=", "=", "between"):
+            start = low if start is None else max(start, low)
+        if comparison.op in ("<", "<=", "=", "between"):
+            end = high if end is None else min(end, high)
+    return start, end
+
+
+def _resolve(name: str, value: Any) -> Any:
+    """Query literal -> the value stored in PacketRecord (ids for addresses and protocols)."""
+    if name in ("src", "dst", "host"):
+        aid = ADDRESSES.find(str(value))
+        return _NO_MATCH if aid is None else aid
+    if name == "protocol":
+        pid = find_protocol(str(value))
+        return _NO_MATCH if pid is None else pid
+    if name == "time" and isinstance(value, str):
+        window = parse_time_range(f"at {value}")
+        if window is None:
+            raise QuerySyntaxError(f"cannot understand time {value!r}")
+        return window[0]
+    if not isinstance(value, (int, float)):
+        raise QuerySyntaxError(f"{name} needs a number, got {value!r}")
+    return value
+
+
+def _getter(name: str) -> Callable[[PacketRecord], Any]:
+    attribute = "timestamp" if name == "time" else name
+    return lambda record: getattr(record, attribute)
+
+
+def _render(name: str, value: Any) -> Any:
+    if name in ("src", "dst"):
+        return ADDRESSES.text(value)
+    if name == "protocol":
+        return protocol_name(value)
+    return value
+
+
+def _elapsed(started: float) -> float:
+    return (time.perf_counter() - started) * 1000.0
@@ -0,0 +1,262 @@
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.config import MetricConfig, RemoteConfig
+from app.modules.metrics import Metrics
+from app.utils.events import MetricsUpdatedEvent
+from app.utils.bus import Publisher
+from app.utils.metrics import MetricsDelta, TopK, anomaly_indicators, cumulative_histogram
+from app.utils.models import MetricsSnapshot
+from app.utils.addresses import format_address
+
+# frame = 4-byte big-endian length + zlib(JSON MetricsDelta)
+_FRAME_HEADER = struct.Struct("!I")
+
+
+def encode_frame(delta: MetricsDelta) -> bytes:
+    body = zlib.compress(json.dumps(delta.to_dict(), separators=(",", ":")).encode("utf-8"))
+    return _FRAME_HEADER.pack(len(body)) + body
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            return None
+        chunks += chunk
+    return bytes(chunks)
+
+
+def read_frame(sock: socket.socket) -> Optional[MetricsDelta]:
+    header = _recv_exact(sock, _FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = _FRAME_HEADER.unpack(header)
+    if size > RemoteConfig.MAX_FRAME_BYTES:
+        raise ValueError(f"frame of {size} bytes exceeds limit")
+    body = _recv_exact(sock, size)
+    if body is None:
+        return None
+    return MetricsDelta.from_dict(json.loads(zlib.decompress(body)))
+
+
+class _CollectorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Sensor:
+    """
+    Ships MetricsDelta frames from a local Metrics to a Collector every `interval` seconds.
+    Deltas that fail to send are merged into the next one, so a collector outage loses
+    resolution but not counts.
+    """
+
+    def __init__(self, metrics: Metrics, host: str = RemoteConfig.COLLECTOR_HOST,
+                 port: int = RemoteConfig.COLLECTOR_PORT, name: Optional[str] = None,
+                 interval: float = RemoteConfig.SENSOR_INTERVAL_SECONDS):
+        """
+        :param metrics: local Metrics fed by Capture
+        :param host: collector address
+        :param port: collector port
+        :param name: sensor name shown by the collector - default; hostname
+        :param interval: seconds between deltas
+        """
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.name = name or socket.gethostname()
+        self.interval = interval
+
+        self._pending: Optional[MetricsDelta] = None
+        self._sock: Optional[socket.socket] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self.metrics.enable_deltas(self.name)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 2.0)
+            self._thread = None
+        self.flush()  # final delta so the collector sees the last interval
+        self._close()
+
+    def flush(self) -> bool:
+        """Send everything accumulated so far; returns False if the collector is unreachable."""
+        delta = self.metrics.drain_delta()
+        if delta is not None:
+            if self._pending is None:
+                self._pending = delta
+            else:
+                self._pending.merge(delta)
+
+        if self._pending is None:
+            return True
+
+        try:
+            if self._sock is None:
+                self._sock = socket.create_connection((self.host, self.port), timeout=RemoteConfig.RECONNECT_SECONDS)
+            self._sock.sendall(encode_frame(self._pending))
+        except OSError:
+            self._close()
+            return False
+
+        self._pending = None
+        return True
+
+    def _run(self) -> None:
+        while self._running:
+            time.sleep(self.interval)
+            if self._running:
+                self.flush()
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+
+class Collector(Publisher):
+    """
+    Accepts MetricsDelta streams from any number of Sensors and publishes one merged
+    MetricsSnapshot. Drop-in replacement for Metrics as a source for GUI, Alerts,
+    Chatbot and the exporter (`get()` + MetricsUpdatedEvent).
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = RemoteConfig.COLLECTOR_PORT):
+        """
+        :param host: address to bind
+        :param port: TCP port to bind, 0 picks a free port
+        """
+        self.host = host
+        self.port = port
+        Publisher.__init__(self)
+
+        self._metrics: MetricsSnapshot = MetricsSnapshot()
+        self._totals: MetricsDelta = MetricsDelta(
+            src_ip_bytes=TopK(RemoteConfig.TOP_K_CAPACITY * 4),
+            dst_ip_bytes=TopK(RemoteConfig.TOP_K_CAPACITY * 4),
+            dst_port_counts=TopK(RemoteConfig.TOP_K_CAPACITY * 4),
+        )
+        # (received_at, packets, bytes, syn, rst) for the sliding-window rates
+        self._window: Deque[Tuple[float, int, int, int, int]] = deque()
+        self._sensor_seen: Dict[str, float] = {}
+        self._sensor_lag: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self._server: Optional[_CollectorServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._server is not None:
+            return
+
+        collector = self
+
+        class _Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        delta = read_frame(self.request)
+                    except (OSError, ValueError, zlib.error, KeyError):
+                        return
+                    if delta is None:
+                        return
+                    collector.merge(delta)
+
+        self._server = _CollectorServer((self.host, self.port), _Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def get(self) -> MetricsSnapshot:
+        return self._metrics
+
+    def sensors(self) -> Dict[str, float]:
+        """Sensor name -> seconds since its last delta, for sensors heard from recently."""
+        now = time.time()
+        with self._lock:
+            return {
+                name: now - seen for name, seen in self._sensor_seen.items()
+                if now - seen <= RemoteConfig.SENSOR_TIMEOUT_SECONDS
+            }
+
+    def merge(self, delta: MetricsDelta) -> None:
+        """Fold one sensor delta into the global view and publish the new snapshot."""
+        now = time.time()
+        with self._lock:
+            self._totals.merge(delta)
+            self._sensor_seen[delta.source] = now
+            self._sensor_lag[delta.source] = delta.capture_lag
+            self._window.append((now, delta.packets, delta.bytes, delta.syn, delta.rst))
+            self._metrics = self._build_snapshot(now)
+            # notify under the lock so observers never see two merges interleaved
+            self.notify_observers(MetricsUpdatedEvent(self._metrics))
+
+    def _build_snapshot(self, now: float) -> MetricsSnapshot:
+        cutoff = now - MetricConfig.WINDOW_SECONDS
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+        window = MetricConfig.WINDOW_SECONDS
+        totals = self._totals
+        snapshot = MetricsSnapshot(
+            total_packets_captured=totals.packets,
+            total_data_transfered=totals.bytes,
+            average_packet_size=totals.bytes / totals.packets if totals.packets else 0.0,
+            max_packet_size=totals.max_size,
+            min_packet_size=totals.min_size,
+            average_latency=totals.latency_sum_ms / totals.latency_count if totals.latency_count else 0.0,
+            latency_count=totals.latency_count,
+            last_timestamp=totals.ended,
+            packet_rate=sum(entry[1] for entry in self._window) / window,
+            throughput=sum(entry[2] for entry in self._window) / window,
+            syn_rate=sum(entry[3] for entry in self._window) / window,
+            rst_rate=sum(entry[4] for entry in self._window) / window,
+            protocol_breakdown=dict(sorted(totals.protocol_counts.items(), key=lambda item: item[1], reverse=True)),
+            top_source_ips=[(format_address(k), v) for k, v in totals.src_ip_bytes.top(MetricConfig.TOP_N_TALKERS)],
+            top_destination_ips=[(format_address(k), v) for k, v in totals.dst_ip_bytes.top(MetricConfig.TOP_N_TALKERS)],
+            top_destination_ports=totals.dst_port_counts.top(MetricConfig.TOP_N_TALKERS),
+            unique_source_ips=totals.src_ips.count(),
+            unique_destination_ips=totals.dst_ips.count(),
+            tcp_flag_counts=dict(totals.tcp_flag_counts),
+            error_packets=totals.errors,
+            packet_size_histogram=cumulative_histogram(MetricConfig.PACKET_SIZE_BUCKETS, totals.size_buckets),
+            latency_histogram=cumulative_histogram(MetricConfig.LATENCY_BUCKETS_MS, totals.latency_buckets),
+            capture_lag=max(self._sensor_lag.values(), default=0.0),
+        )
+        snapshot.throughput_bps = snapshot.throughput * 8
+        snapshot.peak_packet_rate = max(self._metrics.peak_packet_rate, snapshot.packet_rate)
+        snapshot.anomaly_indicators = anomaly_indicators(snapshot)
+        return snapshot
@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.config import SnapshotConfig
+from app.utils.addresses import ADDRESSES
+from app.utils.events import Event, PacketCapturedEvent
+from app.utils.interfaces import Observer
+from app.utils.models import AlertInfo
+from app.utils.pcapng import PcapngIndex, RawFrame, write_pcapng
+from app.utils.record import PacketRecord
+from app.utils.ring import RingRecorder
+
+# (record, ring series, tshark frame number)
+_Entry = Tuple[PacketRecord, Optional[str], Optional[int]]
+
+
+class _PendingSnapshot:
+    __slots__ = ("path", "until", "entries")
+
+    def __init__(self, path: str, until: float, entries: List[_Entry]):
+        self.path = path
+        self.until = until  # capture time end of the post-trigger window
+        self.entries = entries
+
+
+class Snapshotter(Observer):
+    """
+    Preserves the traffic around each alert in its own file.
+
+    The last `pre_seconds` of packets are held in memory as the shared PacketRecords
+    plus their place in the ring recording. `trigger()` names the file straight away and
+    keeps collecting until capture time passes `post_seconds` beyond the newest buffered
+    packet, so a lagging bus does not cut the window short. It then writes the file on its
+    own thread: a pcapng with the raw packets read back from the ring, or, when raw
+    recording is off, a columnar JSON file of the packet fields. Capture is never blocked.
+    """
+
+    def __init__(self, directory: str = SnapshotConfig.DIRECTORY,
+                 pre_seconds: float = SnapshotConfig.PRE_TRIGGER_SECONDS,
+                 post_seconds: float = SnapshotConfig.POST_TRIGGER_SECONDS,
+                 max_packets: int = SnapshotConfig.MAX_BUFFERED_PACKETS,
+                 cooldown: float = SnapshotConfig.COOLDOWN_SECONDS):
+        """
+        :param pre_seconds: packets captured this long before an alert are included
+        :param post_seconds: packets captured this long after an alert are included
+        :param max_packets: bound of the pre-trigger buffer and of each snapshot's packets
+        :param cooldown: alerts this soon after a snapshot was triggered link to it instead of a new file
+        """
+        self.directory = directory
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.cooldown = cooldown
+        self.max_packets = max_packets
+
+        self._buffer: Deque[_Entry] = deque(maxlen=max_packets)
+        self._pending: List[_PendingSnapshot] = []
+        self._last: Optional[Tuple[float, str]] = None  # (triggered at, path)
+        self._raw = True  # whether packets arrive with a ring position
+        self._timers: Dict[str, threading.Timer] = {}
+        self._sequence = 0  # tells apart snapshots named in the same millisecond
+        self._lock = threading.Lock()
+
+    def update(self, event: Event):
+        if not isinstance(event, PacketCapturedEvent):
+            return
+
+        record = event.record
+        frame = None
+        if event.spool is not None:
+            try:
+                frame = int(event.payload.number)
+            except (AttributeError, TypeError, ValueError):
+                pass
+        entry = (record, event.spool if frame is not None else None, frame)
+
+        buffer = self._buffer
+        horizon = record.timestamp - self.pre_seconds
+        done: List[_PendingSnapshot] = []
+        with self._lock:
+            self._raw = frame is not None
+            buffer.append(entry)
+            while buffer[0][0].timestamp < horizon:
+                buffer.popleft()
+            if self._pending:
+                for pending in self._pending:
+                    if record.timestamp > pending.until:
+                        done.append(pending)
+                    elif len(pending.entries) < self.max_packets:
+                        pending.entries.append(entry)
+                for pending in done:
+                    self._pending.remove(pending)
+                    timer = self._timers.pop(pending.path, None)
+                    if timer is not None:
+                        timer.cancel()
+        for pending in done:
+            # reading the ring back may wait for tshark; keep it off the delivery thread
+            threading.Thread(target=self._write, args=(pending,), daemon=True).start()
+
+    def trigger(self, alert: AlertInfo) -> Optional[str]:
+        """
+        Start a snapshot for `alert` (see Alerts.link_snapshots).
+        :return: path the snapshot will be written to
+        """
+        now = time.time()
+        with self._lock:
+            if self._last is not None and now - self._last[0] < self.cooldown:
+                return self._last[1]
+
+            safe_type = re.sub(r"[^A-Za-z0-9]+", "-", alert.alert_type).strip("-").lower() or "alert"
+            suffix = ".pcapng" if self._raw else ".json"
+            self._sequence += 1
+            stamp = f"{alert.timestamp:%Y%m%d-%H%M%S}-{alert.timestamp.microsecond // 1000:03d}"
+            path = os.path.join(self.directory, f"{stamp}-{self._sequence}-{safe_type}{suffix}")
+            # the deadline is in capture time: the newest packet seen is where capture is now
+            start = self._buffer[-1][0].timestamp if self._buffer else alert.timestamp.timestamp()
+            pending = _PendingSnapshot(path, start + self.post_seconds, list(self._buffer)[-self.max_packets:])
+            self._pending.append(pending)
+            self._last = (now, path)
+
+            # fallback for when no later packet arrives to close the window
+            timer = threading.Timer(self.post_seconds + SnapshotConfig.IDLE_WAIT_SECONDS, self._finish, args=(pending,))
+            timer.daemon = True
+            self._timers[path] = timer
+        timer.start()
+        return path
+
+    def close(self) -> None:
+        """Write pending snapshots now, with what has been collected so far."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            timers, self._timers = list(self._timers.values()), {}
+        for timer in timers:
+            timer.cancel()
+        for snapshot in pending:
+            self._write(snapshot)
+
+    def _finish(self, pending: _PendingSnapshot) -> None:
+        with self._lock:
+            if pending not in self._pending:
+                return  # written by close()
+            self._pending.remove(pending)
+            timer = self._timers.pop(pending.path, None)
+        if timer is not None:
+            timer.cancel()
+        self._write(pending)
+
+    def _write(self, pending: _PendingSnapshot) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if pending.path.endswith(".pcapng"):
+                count = write_pcapng(pending.path, _raw_frames(pending.entries))
+            else:
+                count = _write_columns(pending.path, pending.entries)
+            print(f"Snapshotter: wrote {count} packets to {pending.path}")
+        except Exception as e:
+            print(f"Snapshotter: cannot write {pending.path}: {e}")
+
+
+def _raw_frames(entries: List[_Entry]) -> List[RawFrame]:
+    """Read the entries' packets back from the ring, in capture order."""
+    indexes: Dict[str, PcapngIndex] = {}
+
+    def read(entry: _Entry) -> Optional[RawFrame]:
+        record, series, frame = entry
+        if series is None or frame is None:
+            return None
+        located = RingRecorder.open(os.path.dirname(series)).locate(series, frame, record.timestamp)
+        if located is None:
+            return None
+        path, local = located
+        index = indexes.get(path)
+        if index is None:
+            index = indexes[path] = PcapngIndex(path)
+        return index.read(local)
+
+    frames = [read(entry) for entry in entries]
+    missing = [i for i, frame in enumerate(frames) if frame is None and entries[i][1] is not None]
+    if missing:
+        # the newest packets may still sit in tshark's write buffer
+        time.sleep(SnapshotConfig.FLUSH_WAIT_SECONDS)
+        for i in missing:
+            frames[i] = read(entries[i])
+
+    found = [frame for frame in frames if frame is not None]
+    found.sort(key=lambda frame: frame.timestamp)
+    return found
+
+
+def _write_columns(path: str, entries: List[_Entry]) -> int:
+    records = sorted((entry[0] for entry in entries), key=lambda record: record.timestamp)
+    columns = {
+        "timestamp": [record.timestamp for record in records],
+        "length": [record.length for record in records],
+        "protocol": [record.protocol_name for record in records],
+        "src_ip": [ADDRESSES.text(record.src) for record in records],
+        "dst_ip": [ADDRESSES.text(record.dst) for record in records],
+        "src_port": [record.src_port for record in records],
+        "dst_port": [record.dst_port for record in records],
+        "flags": [record.flags for record in records],
+    }
+    temp = path + ".tmp"
+    with open(temp, "w", encoding="utf-8") as handle:
+        json.dump(columns, handle)
+    os.replace(temp, path)
+    return len(records)
@@ -1,27 +1,105 @@
-import json
+import dataclasses
+import itertools
+import threading
 import time
-from dataclasses import dataclass, asdict
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from app.config import ColdConfig, LoadConfig
 from app.utils.interfaces import Observer
-from app.utils.models import Packet
+from app.utils.models import LoadProgress, Packet
+from app.utils.addresses import ADDRESSES
+from app.utils.record import PacketRecord, protocol_id
 from app.utils.events import Event, PacketCapturedEvent
+from app.utils.dissect import Dissector
+from app.utils.columnar import ColdBlock, DecodedBlock
+from app.utils.index import IndexView, PacketIndex
+from app.utils.packetfile import read_packets, write_packets
 
 
-@dataclass
 class StoredPacket:
-    timestamp: float
-    captured_length: int
-    highest_layer: str
-    summary: str
-    src_ip: Optional[str]
-    dst_ip: Optional[str]
-    src_port: Optional[int]
-    dst_port: Optional[int]
+    """
+    A stored packet: the shared PacketRecord plus where its raw bytes were spooled.
+    Full detail is dissected from the spool on demand (Storage.packet_detail).
+    """
+
+    __slots__ = ("record", "_summary", "spool", "frame")
+
+    def __init__(self, timestamp: float, captured_length: int, highest_layer: str, summary: Optional[str],
+                 src_ip: Optional[str], dst_ip: Optional[str], src_port: Optional[int], dst_port: Optional[int],
+                 spool: Optional[str] = None, frame: Optional[int] = None):
+        """
+        :param summary: one-line summary - default; derived from the other fields when read
+        :param spool: pcapng file holding the raw packet - default; no detail available
+        :param frame: 1-based frame number of the packet within `spool`
+        """
+        self.record = PacketRecord(
+            timestamp, captured_length, protocol_id(highest_layer),
+            ADDRESSES.intern(src_ip), ADDRESSES.intern(dst_ip), src_port, dst_port,
+        )
+        self._summary = summary or None
+        self.spool = spool
+        self.frame = frame
+
+    @property
+    def summary(self) -> str:
+        if self._summary is not None:
+            return self._summary
+        record = self.record
+        if record.src is None:
+            return f"{record.protocol_name} (Length: {record.length})"
+        src = record.src_ip if record.src_port is None else f"{record.src_ip}:{record.src_port}"
+        dst = record.dst_ip if record.dst_port is None else f"{record.dst_ip}:{record.dst_port}"
+        return f"{record.protocol_name} {src} -> {dst} (Length: {record.length})"
+
+    @summary.setter
+    def summary(self, value: Optional[str]) -> None:
+        self._summary = value or None
+
+    @property
+    def timestamp(self) -> float:
+        return self.record.timestamp
+
+    @property
+    def captured_length(self) -> int:
+        return self.record.length
+
+    @property
+    def highest_layer(self) -> str:
+        return self.record.protocol_name
+
+    @property
+    def src_ip(self) -> Optional[str]:
+        return self.record.src_ip
+
+    @property
+    def dst_ip(self) -> Optional[str]:
+        return self.record.dst_ip
+
+    @property
+    def src_port(self) -> Optional[int]:
+        return self.record.src_port
+
+    @property
+    def dst_port(self) -> Optional[int]:
+        return self.record.dst_port
 
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        data = {
+            "timestamp": self.timestamp,
+            "captured_length": self.captured_length,
+            "highest_layer": self.highest_layer,
+            "summary": self.summary,
+            "src_ip": self.src_ip,
+            "dst_ip": self.dst_ip,
+            "src_port": self.src_port,
+            "dst_port": self.dst_port,
+        }
+        if self.spool is not None:
+            data["spool"] = self.spool
+            data["frame"] = self.frame
+        return data
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "StoredPacket":
@@ -34,116 +112,214 @@ class StoredPacket:
             dst_ip=data.get("dst_ip"),
             src_port=data.get("src_port"),
             dst_port=data.get("dst_port"),
+            spool=data.get("spool"),
+            frame=data.get("frame"),
         )
 
     @classmethod
-    def from_packet(cls, packet: Packet) -> "StoredPacket":
-        timestamp = cls._extract_timestamp(packet)
-        captured_length = cls._extract_length(packet)
-        highest_layer = getattr(packet, "highest_layer", "") or ""
-        
-        raw_summary = str(packet)
-        summary_lines = raw_summary.splitlines()
-        clean_summary = summary_lines[0] if summary_lines else "No summary available"
-        
-        src_ip = cls._extract_ip(packet, "src")
-        dst_ip = cls._extract_ip(packet, "dst")
-        src_port, dst_port = cls._extract_ports(packet)
-        return cls(
-            timestamp=timestamp,
-            captured_length=captured_length,
-            highest_layer=highest_layer,
-            summary=clean_summary,
-            src_ip=src_ip,
-            dst_ip=dst_ip,
-            src_port=src_port,
-            dst_port=dst_port,
-        )
+    def from_record(cls, record: PacketRecord, summary: Optional[str] = None,
+                    spool: Optional[str] = None, frame: Optional[int] = None) -> "StoredPacket":
+        stored = cls.__new__(cls)
+        stored.record = record
+        stored._summary = summary or None
+        stored.spool = spool
+        stored.frame = frame
+        return stored
 
-    @staticmethod
-    def _extract_timestamp(packet: Packet) -> float:
-        for attr in ("sniff_timestamp", "sniff_time", "timestamp"):
-            value = getattr(packet, attr, None)
-            if value is None:
-                continue
-            try:
-                return float(value)
-            except (TypeError, ValueError):
-                continue
-        return 0.0
-
-    @staticmethod
-    def _extract_length(packet: Packet) -> int:
-        for attr in ("captured_length", "length"):
-            value = getattr(packet, attr, None)
-            if value is None:
-                continue
+    @classmethod
+    def from_packet(cls, packet: Packet, record: Optional[PacketRecord] = None,
+                    spool: Optional[str] = None) -> "StoredPacket":
+        """
+        :param record: already extracted fields (PacketCapturedEvent.record) - default; extract here
+        :param spool: pcapng file tshark spooled the packet to (PacketCapturedEvent.spool)
+        """
+        frame = None
+        if spool is not None:
             try:
-                return int(value)
-            except (TypeError, ValueError):
-                continue
-        frame = getattr(packet, "frame_info", None)
-        if frame is not None:
-            value = getattr(frame, "len", None)
-            if value is not None:
-                try:
-                    return int(value)
-                except (TypeError, ValueError):
-                    pass
-        return 0
-
-    @staticmethod
-    def _extract_ip(packet: Packet, direction: str) -> Optional[str]:
-        attr = "src" if direction == "src" else "dst"
-        for layer_name in ("ip", "ipv6"):
-            layer = getattr(packet, layer_name, None)
-            if layer is None:
-                continue
-            value = getattr(layer, attr, None)
-            if value:
-                return value
-        return None
-
-    @staticmethod
-    def _extract_ports(packet: Packet) -> Tuple[Optional[int], Optional[int]]:
-        for layer_name in ("tcp", "udp"):
-            layer = getattr(packet, layer_name, None)
-            if layer is None:
-                continue
-            src = StoredPacket._to_int(
-                getattr(layer, "srcport", None)
-                or getattr(layer, "sport", None)
-                or getattr(layer, "src_port", None)
-            )
-            dst = StoredPacket._to_int(
-                getattr(layer, "dstport", None)
-                or getattr(layer, "dport", None)
-                or getattr(layer, "dst_port", None)
-            )
-            return src, dst
-        return None, None
-
-    @staticmethod
-    def _to_int(value: Any) -> Optional[int]:
-        if value is None:
-            return None
-        try:
-            return int(value)
-        except (TypeError, ValueError):
-            return None
+                frame = int(packet.number)
+            except (AttributeError, TypeError, ValueError):
+                spool = None
+        return cls.from_record(record if record is not None else PacketRecord.from_packet(packet),
+                               spool=spool, frame=frame)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, StoredPacket):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"StoredPacket({self.to_dict()})"
+
+
+class StorageSnapshot:
+    """
+    Read-only view of Storage as published at one moment, taken by `Storage.snapshot()`.
+
+    The writer only appends past the published length, compaction only moves rows
+    from the hot list into cold blocks (same positions, same contents), and every
+    other change (clear, delete, a capacity cut) builds new tiers, so the packets a
+    snapshot sees never change underneath it and readers never wait for the writer.
+    """
+
+    def __init__(self, storage: "Storage", tiers: "_Tiers", epoch: int, size: int,
+                 index: Optional[PacketIndex] = None):
+        self._storage = storage
+        self._blocks, self._hot, self._base = tiers
+        self._epoch = epoch
+        self.size = min(size, self._base + len(self._hot))
+        self._index = IndexView(index, self.size) if index is not None else None
+        self._last: Optional[DecodedBlock] = None  # last cold block read
+
+    @property
+    def capacity(self) -> Optional[int]:
+        return self._storage.capacity
+
+    def snapshot(self) -> "StorageSnapshot":
+        return self
+
+    def index(self) -> IndexView:
+        if self._index is None:
+            index = self._storage._index_for(self._epoch, self.size)
+            if index is None:
+                # Storage was rewritten since; index this view on its own
+                index = PacketIndex()
+                index.extend(self.records(0, self.size))
+            self._index = IndexView(index, self.size)
+        return self._index
+
+    def record(self, position: int) -> PacketRecord:
+        if position >= self.size:
+            raise IndexError(position)
+        if position >= self._base:
+            return self._hot[position - self._base].record
+        decoded = self._decoded(position)
+        return decoded.record(position - decoded.block.start)
+
+    def records(self, start: int, stop: int) -> Iterator[PacketRecord]:
+        """Records at positions [start, stop), block by block across the cold tier."""
+        position = start
+        while position < min(stop, self._base):
+            decoded = self._decoded(position)
+            block = decoded.block
+            for row in range(position - block.start, min(stop, block.end) - block.start):
+                yield decoded.record(row)
+            position = min(stop, block.end)
+        for packet in itertools.islice(self._hot, max(position - self._base, 0), max(stop - self._base, 0)):
+            yield packet.record
+
+    def blocks(self) -> Tuple[ColdBlock, ...]:
+        """The cold blocks, for queries that skip blocks by their stats."""
+        return self._blocks
+
+    def column_blocks(self) -> Iterator[DecodedBlock]:
+        """
+        Every row as columns, one block at a time: cold blocks as decoded (shared, not
+        copied), hot rows columnized in blocks of the same size.
+        """
+        for block in self._blocks:
+            yield self._storage._decode(block)
+        rows = self._storage.block_rows
+        for start in range(self._base, self.size, rows):
+            hot = self._hot[start - self._base:min(start + rows, self.size) - self._base]
+            yield ColdBlock.columnize(start, hot)
+
+    @property
+    def block_rows(self) -> int:
+        return self._storage.block_rows
+
+    def watermark(self) -> Tuple[int, int]:
+        return self._epoch, self.size
+
+    def changed_since(self, mark: Tuple[int, int], start: float, end: float) -> bool:
+        epoch, size = mark
+        if epoch != self._epoch:
+            return True
+        if self.size == size:
+            return False
+        return self.index().span(start, end)[1] > size
+
+    def _decoded(self, position: int) -> DecodedBlock:
+        """The decoded cold block holding `position`."""
+        block = self._blocks[position // self._storage.block_rows]
+        decoded = self._last
+        if decoded is None or decoded.block is not block:
+            decoded = self._last = self._storage._decode(block)
+        return decoded
+
+    def __getitem__(self, position: int) -> StoredPacket:
+        if position < 0:
+            position += self.size
+        if not 0 <= position < self.size:
+            raise IndexError("storage index out of range")
+        if position >= self._base:
+            return self._hot[position - self._base]
+        decoded = self._decoded(position)
+        record, spool, frame, summary = decoded.row(position - decoded.block.start)
+        return StoredPacket.from_record(record, summary, spool, frame)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[StoredPacket]:
+        cold = min(self._base, self.size)
+        for block in self._blocks:
+            if block.start >= cold:
+                break
+            decoded = self._decoded(block.start)
+            for row in range(min(block.rows, cold - block.start)):
+                record, spool, frame, summary = decoded.row(row)
+                yield StoredPacket.from_record(record, summary, spool, frame)
+        yield from itertools.islice(self._hot, max(self.size - self._base, 0))
+
+
+# (cold blocks, hot list, position of the first hot row)
+_Tiers = Tuple[Tuple[ColdBlock, ...], List[StoredPacket], int]
+# (tiers, epoch, published length)
+_Published = Tuple[_Tiers, int, int]
 
 
 class Storage(Observer):
     """
-    NOT THREAD SAFE
+    Single writer, any number of readers, in two tiers.
+
+    Capture is the writer: it appends to the hot list and then publishes the new
+    length. Once more than `hot_rows` packets are hot, a background compactor packs
+    the oldest into compressed columnar ColdBlocks of `block_rows` (app.utils.columnar)
+    without changing any position. Anything that rewrites existing positions (clear,
+    delete, insert, assignment, a capacity cut) builds new tiers, swaps them in and
+    starts a new epoch. Writers serialize on a lock readers never take; readers use
+    `snapshot()` (or the published length) and only ever see whole, published packets.
     """
 
-    def __init__(self, file_path: Optional[str] = None, capacity: Optional[int] = None):
+    def __init__(self, file_path: Optional[str] = None, capacity: Optional[int] = None,
+                 cold: bool = ColdConfig.ENABLED):
         """
         :param file_path: provide a path to load packets from - default to empty list
         :param capacity: total capacity of the storage
+        :param cold: compress packets beyond the newest `ColdConfig.HOT_ROWS` in the background
         """
-        self._packets: List[StoredPacket] = []
+        self._packets: List[StoredPacket] = []  # hot tier, append-only within an epoch
+        # what readers see, replaced in one assignment so tiers, epoch and length always agree:
+        # the epoch is bumped by anything but appends (positions from another epoch are
+        # meaningless) and packets past the length are not visible yet
+        self._published: _Published = (((), self._packets, 0), 0, 0)
+        self._write_lock = threading.Lock()
+        self._dissector: Optional[Dissector] = None
+        self._index: Optional[PacketIndex] = None  # built on first query, reset with each epoch
+        self._index_lock = threading.RLock()  # query threads catch the index up concurrently
+
+        self.block_rows = ColdConfig.BLOCK_ROWS
+        self.hot_rows = ColdConfig.HOT_ROWS
+        self._compact_at = self.hot_rows + self.block_rows if cold else float("inf")  # hot length that wakes it
+        self._compactor: Optional[threading.Thread] = None
+        self._compact_wake = threading.Event()
+        self._closed = False
+        self._decoded_blocks: "OrderedDict[ColdBlock, DecodedBlock]" = OrderedDict()
+        self._decoded_lock = threading.Lock()
+        self._loading: Optional[threading.Thread] = None  # background Storage.load, if one is running
+        self._pending: List[StoredPacket] = []  # captured during a background load, appended after it
+        self._pending_dropped = 0  # captured during the load once `_pending` was full
+
         if capacity is not None and capacity < 0:
             raise ValueError("limit must be greater than 0")
         self._capacity: Optional[int] = capacity
@@ -155,11 +331,194 @@ class Storage(Observer):
         if not isinstance(event, PacketCapturedEvent):
             raise TypeError("Storage only accepts PacketCapturedEvent")
 
-        if self._capacity is not None and len(self._packets) >= self._capacity:
-            raise OverflowError("Packet storage capacity reached")
-
         packet: Packet = event.payload  # type: ignore
-        self._packets.append(StoredPacket.from_packet(packet))
+        stored = StoredPacket.from_packet(packet, event.record, event.spool)
+        with self._write_lock:
+            if self._loading is not None:
+                # keeps saved packets ahead of live ones, within bounds however long the load takes
+                if len(self._pending) < LoadConfig.PENDING_ROWS:
+                    self._pending.append(stored)
+                else:
+                    self._pending_dropped += 1
+                return
+            if self._capacity is not None and len(self) >= self._capacity:
+                raise OverflowError("Packet storage capacity reached")
+            self._append(stored)
+            if len(self._packets) >= self._compact_at:
+                self._wake_compactor()
+
+    def packet_detail(self, index: int) -> Optional[str]:
+        """
+        Full dissection (every layer and a hex dump) of a stored packet, read back from its spool.
+        :return: None when the packet was not recorded or retention already deleted its segment
+        """
+        packet = self[index]
+        if packet.spool is None or packet.frame is None:
+            return None
+        if self._dissector is None:
+            self._dissector = Dissector()
+        return self._dissector.describe(packet.spool, packet.frame, packet.timestamp)
+
+    @property
+    def capacity(self) -> Optional[int]:
+        return self._capacity
+
+    @property
+    def loading(self) -> bool:
+        return self._loading is not None
+
+    def load(self, file_path: str, progress: Optional[Callable[[LoadProgress], None]] = None) -> threading.Thread:
+        """
+        Append a saved session in the background. Packets become visible a batch at a time,
+        so queries and the GUI work from the start; packets captured meanwhile are held
+        back and appended after the saved ones.
+        :param progress: called on the loading thread every `LoadConfig.PROGRESS_SECONDS`, and once when done
+        """
+        target = Path(file_path)
+        if not target.exists():
+            raise FileNotFoundError(f"storage file not found: {file_path}")
+        with self._write_lock:
+            if self._loading is not None:
+                raise RuntimeError("a storage file is already loading")
+            thread = self._loading = threading.Thread(target=self._load_in_background, args=(target, progress),
+                                                      name="storage-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def index(self) -> PacketIndex:
+        """Secondary indexes over the published packets, caught up with appends since the last call."""
+        with self._index_lock:
+            index = self._index
+            if index is None:
+                index = self._index = PacketIndex()
+            view = self._view()
+            if index.size < view.size:
+                index.extend(view.records(index.size, view.size))
+            return index
+
+    def snapshot(self, indexed: bool = True) -> "StorageSnapshot":
+        """
+        The packets published right now, for a query running alongside capture.
+        :param indexed: catch the index up now - default; leave it to the snapshot's first `index()` call
+        """
+        if not indexed:
+            return self._view()
+        with self._index_lock:
+            index = self.index()
+            tiers, epoch, _ = self._published
+            return StorageSnapshot(self, tiers, epoch, index.size, index)
+
+    def record(self, position: int) -> PacketRecord:
+        return self._view().record(position)
+
+    def watermark(self) -> Tuple[int, int]:
+        """(epoch, length): identifies the stored packets, since appends only add positions."""
+        _, epoch, size = self._published
+        return epoch, size
+
+    def changed_since(self, mark: Tuple[int, int], start: float, end: float) -> bool:
+        """Whether packets captured in [start, end] may differ from when `mark` was taken."""
+        epoch, size = mark
+        _, current, published = self._published
+        if epoch != current:
+            return True
+        if published == size:
+            return False
+        return self.index().span(start, end)[1] > size
+
+    def tier_sizes(self) -> Dict[str, int]:
+        """Rows and compressed bytes per tier."""
+        blocks, hot, base = self._published[0]
+        return {"cold_rows": base, "cold_bytes": sum(block.nbytes for block in blocks),
+                "cold_blocks": len(blocks), "hot_rows": len(hot)}
+
+    def close(self) -> None:
+        """Stop the background compactor."""
+        self._closed = True
+        self._compact_wake.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5.0)
+
+    def _view(self) -> StorageSnapshot:
+        """A snapshot without the index catch-up, for point reads."""
+        tiers, epoch, size = self._published
+        return StorageSnapshot(self, tiers, epoch, size)
+
+    def _index_for(self, epoch: int, size: int) -> Optional[PacketIndex]:
+        with self._index_lock:
+            if epoch != self._published[1]:
+                return None
+            return self.index()
+
+    def _append(self, stored: StoredPacket) -> None:
+        """Writer only, holding the write lock (or before any reader exists)."""
+        self._packets.append(stored)
+        self._grow(1)  # publish only once the packet is in place
+
+    def _grow(self, count: int) -> None:
+        """Writer only: publish `count` more packets already appended to the hot list."""
+        tiers, epoch, size = self._published
+        self._published = (tiers, epoch, size + count)
+
+    def _rewrite(self, packets: List[StoredPacket]) -> None:
+        """Writer only, holding the write lock: swap in a new, all-hot list as a new epoch."""
+        with self._index_lock:
+            self._packets = packets
+            self._index = None
+            self._published = (((), packets, 0), self._published[1] + 1, len(packets))
+        if len(packets) >= self._compact_at:
+            self._wake_compactor()
+
+    def _all(self) -> List[StoredPacket]:
+        return list(self._view())
+
+    # cold tier
+
+    def _wake_compactor(self) -> None:
+        """Writer only: start or nudge the compactor, then wait a block before asking again."""
+        self._compact_at = len(self._packets) + self.block_rows
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_loop, name="storage-compactor", daemon=True)
+            self._compactor.start()
+        self._compact_wake.set()
+
+    def _compact_loop(self) -> None:
+        while not self._closed:
+            self._compact_wake.wait(ColdConfig.COMPACT_INTERVAL_SECONDS)
+            self._compact_wake.clear()
+            if not self._closed:
+                self._compact()
+
+    def _compact(self) -> None:
+        """Move whole blocks from the head of the hot list into the cold tier."""
+        while not self._closed:
+            (blocks, hot, base), epoch, _ = self._published
+            if len(hot) < self.hot_rows + self.block_rows:
+                break
+            # encoding reads rows the writer never touches again, so it runs unlocked
+            block = ColdBlock.encode(base, hot[:self.block_rows], ColdConfig.CODEC, ColdConfig.LEVEL)
+            with self._write_lock:
+                if self._published[1] != epoch:
+                    return  # rewritten meanwhile; the new tiers start hot
+                self._packets = self._packets[self.block_rows:]
+                self._published = ((blocks + (block,), self._packets, base + self.block_rows), epoch,
+                                   self._published[2])
+        with self._write_lock:
+            self._compact_at = self.hot_rows + self.block_rows
+
+    def _decode(self, block: ColdBlock) -> DecodedBlock:
+        """A decompressed cold block, from a small LRU shared by all readers."""
+        with self._decoded_lock:
+            decoded = self._decoded_blocks.get(block)
+            if decoded is not None:
+                self._decoded_blocks.move_to_end(block)
+                return decoded
+        decoded = block.decode()
+        with self._decoded_lock:
+            self._decoded_blocks[block] = decoded
+            while len(self._decoded_blocks) > ColdConfig.DECODED_BLOCKS:
+                self._decoded_blocks.popitem(last=False)
+        return decoded
 
     def update_limit(self, capacity: int):
         """
@@ -169,48 +528,107 @@ class Storage(Observer):
         if capacity < 0:
             raise ValueError("capacity must be greater than 0")
 
-        self._capacity = capacity
-        if capacity is None:
-            return
+        with self._write_lock:
+            self._capacity = capacity
+            if capacity is None:
+                return
 
-        if len(self._packets) > capacity:
-            self._packets = self._packets[:capacity]
+            if len(self) > capacity:
+                self._rewrite(self._all()[:capacity])
 
     def materialize(self, file_path: Optional[str] = None) -> None:
-        """Write stored packets to disk as JSON.
+        """Write stored packets to disk as a JSON array, one packet per line.
         :param file_path: file path to save the materialized storage to
         """
+        if self._loading is not None:
+            raise RuntimeError("storage is still loading a saved session")
         target = Path(file_path) if file_path else self._file_path
         if target is None:
             raise ValueError("materialize requires a file path")
         target.parent.mkdir(parents=True, exist_ok=True)
-        encoded = [packet.to_dict() for packet in self._packets]
-        target.write_text(json.dumps(encoded, indent=2), encoding="utf-8")
+        write_packets(target, (packet.to_dict() for packet in self._view()))
         self._file_path = target
 
     def _load_from_file(self, file_path: str) -> None:
         target = Path(file_path)
         if not target.exists():
             raise FileNotFoundError(f"storage file not found: {file_path}")
-        data = json.loads(target.read_text(encoding="utf-8"))
-        if not isinstance(data, list):
-            raise ValueError("storage file must contain a JSON array")
-        for record in data:
-            stored = StoredPacket.from_dict(record)
-            if self._capacity is not None and len(self._packets) >= self._capacity:
-                break
-            self._packets.append(stored)
+        self._load(target, LoadProgress(str(target), total_bytes=target.stat().st_size))
+
+    def _load_in_background(self, target: Path, progress: Optional[Callable[[LoadProgress], None]]) -> None:
+        report = LoadProgress(str(target))
+        try:
+            report.total_bytes = target.stat().st_size
+            self._load(target, report, progress)
+        except (OSError, ValueError) as e:
+            report.error = str(e)
+        finally:
+            with self._write_lock:
+                pending, self._pending = self._pending, []
+                report.dropped, self._pending_dropped = self._pending_dropped, 0
+                if self._capacity is not None:
+                    pending = pending[:max(self._capacity - len(self), 0)]
+                self._packets.extend(pending)
+                self._grow(len(pending))
+                self._loading = None
+                if len(self._packets) >= self._compact_at:
+                    self._wake_compactor()
+            report.done = True
+            if progress is not None:
+                progress(dataclasses.replace(report))
+
+    def _load(self, target: Path, report: LoadProgress,
+              progress: Optional[Callable[[LoadProgress], None]] = None) -> None:
+        """Parse a saved session incrementally, publishing every `LoadConfig.BATCH_ROWS` packets."""
+        epoch = self._published[1]
+        reported = time.monotonic()
+        batch: List[StoredPacket] = []
+        try:
+            for data, consumed in read_packets(target):
+                batch.append(StoredPacket.from_dict(data))
+                if len(batch) < LoadConfig.BATCH_ROWS:
+                    continue
+                report.bytes_read = consumed
+                if not self._publish(batch, epoch, report):
+                    return
+                batch = []
+                if progress is not None and time.monotonic() - reported >= LoadConfig.PROGRESS_SECONDS:
+                    progress(dataclasses.replace(report))
+                    reported = time.monotonic()
+            report.bytes_read = report.total_bytes
+        finally:
+            # a damaged file still yields the packets before the damage
+            self._publish(batch, epoch, report)
+
+    def _publish(self, batch: List[StoredPacket], epoch: int, report: LoadProgress) -> bool:
+        """Append loaded packets up to capacity; False once loading should stop."""
+        with self._write_lock:
+            if self._published[1] != epoch:
+                report.error = "storage was cleared or rewritten while loading"
+                return False
+            if self._capacity is not None:
+                batch = batch[:max(self._capacity - len(self), 0)]
+            self._packets.extend(batch)
+            self._grow(len(batch))  # publish only once the packets are in place
+            report.packets += len(batch)
+            if len(self._packets) >= self._compact_at:
+                self._wake_compactor()
+            return self._capacity is None or len(self) < self._capacity
 
     def clear(self):
         """
         Clears the storage, in-memory only, doesn't clear from disk
         """
-        self._packets.clear()
+        with self._write_lock:
+            self._rewrite([])
 
     def __getitem__(
         self, index: Union[int, slice]
     ) -> Union[StoredPacket, List[StoredPacket]]:
-        return self._packets[index]
+        view = self._view()
+        if isinstance(index, slice):
+            return [view[position] for position in range(*index.indices(view.size))]
+        return view[index]
 
     def __setitem__(
         self,
@@ -220,7 +638,10 @@ class Storage(Observer):
         if isinstance(index, int):
             if not isinstance(value, StoredPacket):
                 raise TypeError("Only Packet instances can be assigned to an int index")
-            self._packets[index] = value
+            with self._write_lock:
+                packets = self._all()
+                packets[index] = value
+                self._rewrite(packets)
             return
 
         if not isinstance(value, Iterable):
@@ -230,23 +651,32 @@ class Storage(Observer):
         for v in iterable_values:
             if not isinstance(v, StoredPacket):
                 raise TypeError("All items assigned to slice must be Packet instances")
-        self._packets[index] = iterable_values
+        with self._write_lock:
+            packets = self._all()
+            packets[index] = iterable_values
+            self._rewrite(packets)
 
     def __delitem__(self, index: Union[int, slice]) -> None:
-        del self._packets[index]
+        with self._write_lock:
+            packets = self._all()
+            del packets[index]
+            self._rewrite(packets)
 
     def __len__(self) -> int:
-        return len(self._packets)
+        return self._published[2]
 
     def insert(self, index: int, value: StoredPacket) -> None:
         if not isinstance(value, StoredPacket):
             raise TypeError("Only Packet instances can be inserted")
-        if self._capacity is not None and len(self._packets) >= self._capacity:
-            raise OverflowError("Packet storage capacity reached")
-        self._packets.insert(index, value)
+        with self._write_lock:
+            if self._capacity is not None and len(self) >= self._capacity:
+                raise OverflowError("Packet storage capacity reached")
+            packets = self._all()
+            packets.insert(index, value)
+            self._rewrite(packets)
 
     def __iter__(self) -> Iterator[StoredPacket]:
-        return iter(self._packets)
+        return iter(self._view())
 
     def __repr__(self):
-        return f"Storage(limit={self._capacity}, packets={self._packets})"
+        return f"Storage(limit={self._capacity}, packets={self._all()})"
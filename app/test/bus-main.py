@@ -0,0 +1,76 @@
+import time
+
+from app.utils.bus import EventBus
+from app.utils.events import Event, MetricsUpdatedEvent, PacketCapturedEvent
+from app.utils.interfaces import Observer
+
+EVENTS = 100_000
+
+
+class Counter(Observer):
+    def __init__(self):
+        self.seen = 0
+
+    def update(self, event: Event):
+        self.seen += 1
+
+
+class LegacySubject:
+    """What Metrics/Alerts/GUI did before the bus."""
+
+    def __init__(self, observers):
+        self.observers = observers
+
+    def notify_observers(self, event: Event):
+        for observer in list(self.observers):
+            observer.update(event)
+
+
+def legacy_fanout(subject, events):
+    for event in events:
+        subject.notify_observers(event)
+
+
+def publish_all(bus, events):
+    for event in events:
+        bus.publish(event)
+
+
+def bench(label, fn, repeat=5):
+    elapsed = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = min(elapsed, time.perf_counter() - started)
+    print(f"{label:<28} {elapsed * 1000:8.1f} ms  {EVENTS / elapsed / 1000:8.0f}k events/s")
+
+
+if __name__ == '__main__':
+    events = [PacketCapturedEvent(None) for _ in range(EVENTS)]
+
+    observers = [Counter() for _ in range(3)]
+    bench("legacy observer loop", lambda: legacy_fanout(LegacySubject(observers), events))
+
+    bus = EventBus()
+    inline = [Counter() for _ in range(3)]
+    for observer in inline:
+        bus.subscribe(PacketCapturedEvent, observer.update)
+    bus.subscribe(MetricsUpdatedEvent, Counter().update)  # other topics cost nothing
+    bench("bus inline", lambda: publish_all(bus, events))
+
+    batched = EventBus()
+    sink = Counter()
+    batched.subscribe(Event, lambda batch: setattr(sink, "seen", sink.seen + len(batch)), batch_size=256)
+    bench("bus inline, batch 256", lambda: (publish_all(batched, events), batched.flush()))
+
+    threaded = EventBus()
+    worker = Counter()
+    threaded.subscribe(Event, lambda batch: setattr(worker, "seen", worker.seen + len(batch)),
+                       executor="thread", batch_size=256)
+    bench("bus thread, batch 256", lambda: (publish_all(threaded, events), threaded.flush()))
+
+    assert all(o.seen == 5 * EVENTS for o in inline)
+    assert sink.seen == 5 * EVENTS and worker.seen == 5 * EVENTS
+    threaded.close()
+    batched.close()
+    bus.close()
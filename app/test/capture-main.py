@@ -16,4 +16,5 @@ if __name__ == '__main__':
     capture.subscribe(storage)
     capture.start_capture()
     capture.stop_capture(10)
+    capture.shutdown()
     storage.materialize('./output.json')
\ No newline at end of file
@@ -0,0 +1,54 @@
+import multiprocessing
+import random
+import time
+from types import SimpleNamespace
+
+from app.modules import Collector, Metrics, Sensor
+from app.utils.events import PacketCapturedEvent
+
+
+def fake_packet(sensor_id: int) -> SimpleNamespace:
+    """Stand-in for a pyshark packet with the attributes Metrics reads."""
+    return SimpleNamespace(
+        sniff_timestamp=time.time(),
+        length=random.randint(60, 1500),
+        highest_layer=random.choice(["TCP", "UDP", "DNS", "TLS"]),
+        ip=SimpleNamespace(src=f"10.0.{sensor_id}.{random.randint(1, 20)}", dst=f"192.168.1.{random.randint(1, 5)}"),
+        tcp=SimpleNamespace(srcport=random.randint(1024, 65535), dstport=random.choice([80, 443, 22]),
+                            flags_syn=random.choice(["0", "1"]), flags_rst="0"),
+    )
+
+
+def run_sensor(sensor_id: int, port: int, packets: int) -> None:
+    metrics = Metrics()
+    sensor = Sensor(metrics, "127.0.0.1", port, name=f"sensor-{sensor_id}", interval=0.2)
+    sensor.start()
+    for _ in range(packets):
+        metrics.update(PacketCapturedEvent(fake_packet(sensor_id)))
+    sensor.stop()
+
+
+if __name__ == '__main__':
+    sensor_count: int = 3
+    packets_per_sensor: int = 2000
+
+    collector = Collector(host="127.0.0.1", port=0)
+    collector.start()
+
+    processes = [
+        multiprocessing.Process(target=run_sensor, args=(i, collector.port, packets_per_sensor))
+        for i in range(sensor_count)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    time.sleep(0.5)
+
+    snapshot = collector.get()
+    print(f"sensors seen: {sorted(collector.sensors())}")
+    print(f"packets: {snapshot.total_packets_captured} (expected {sensor_count * packets_per_sensor})")
+    print(f"unique sources: {snapshot.unique_source_ips} (expected {sensor_count * 20})")
+    print(f"top sources: {snapshot.top_source_ips}")
+    print(f"protocols: {snapshot.protocol_breakdown}")
+    collector.stop()
@@ -0,0 +1,109 @@
+import random
+import sys
+import threading
+import time
+
+from app.modules.storage import Storage
+from app.utils.addresses import ADDRESSES
+from app.utils.events import PacketCapturedEvent
+from app.utils.record import PacketRecord, protocol_id
+
+PACKETS = 1_000_000
+READERS = 4
+
+PROTOCOLS = [protocol_id(name) for name in ("TCP", "UDP", "DNS", "TLS")]
+ADDRESS_IDS = [ADDRESSES.intern(f"10.1.{i // 250}.{i % 250}") for i in range(500)]
+
+
+def make_event(seq: int) -> PacketCapturedEvent:
+    """Every field is derived from `seq`, so a reader can tell a torn or misplaced record."""
+    record = PacketRecord(
+        float(seq), seq % 1500, PROTOCOLS[seq % 4], ADDRESS_IDS[seq % 500], ADDRESS_IDS[(seq * 7) % 500],
+        seq & 0xFFFF, seq >> 16,
+    )
+    event = PacketCapturedEvent(None)
+    event._record = record
+    return event
+
+
+def intact(seq: int, record: PacketRecord) -> bool:
+    return (record.timestamp == seq and record.length == seq % 1500 and record.protocol == PROTOCOLS[seq % 4]
+            and record.src == ADDRESS_IDS[seq % 500] and record.dst == ADDRESS_IDS[(seq * 7) % 500]
+            and record.src_port == seq & 0xFFFF and record.dst_port == seq >> 16)
+
+
+class Reader(threading.Thread):
+    def __init__(self, storage: Storage, done: threading.Event):
+        super().__init__(daemon=True)
+        self.storage = storage
+        self.done = done
+        self.snapshots = 0
+        self.checked = 0
+        self.slowest = 0.0
+        self.errors = []
+
+    def run(self):
+        last = 0
+        while not self.done.is_set():
+            started = time.perf_counter()
+            snapshot = self.storage.snapshot()
+            self.slowest = max(self.slowest, time.perf_counter() - started)
+            size = len(snapshot)
+            self.snapshots += 1
+            if size < last:
+                self.errors.append(f"published length went back from {last} to {size}")
+            last = size
+            if not size:
+                continue
+
+            # the newest rows, plus a random sample of older ones
+            positions = list(range(max(size - 64, 0), size)) + [random.randrange(size) for _ in range(64)]
+            for position in positions:
+                if not intact(position, snapshot.record(position)):
+                    self.errors.append(f"torn or misplaced record at {position}")
+            self.checked += len(positions)
+
+            # the index sees exactly the snapshot: every row once per protocol posting list
+            index = snapshot.index()
+            indexed = sum(len(index.postings("protocol", pid)) for pid in PROTOCOLS)
+            if indexed != size or index.span(0.0, float(size))[1] != size:
+                self.errors.append(f"index covers {indexed} rows of a {size} row snapshot")
+
+
+def append_all(storage: Storage, events) -> float:
+    started = time.perf_counter()
+    for event in events:
+        storage.update(event)
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    events = [make_event(seq) for seq in range(PACKETS)]
+
+    quiet = Storage()
+    elapsed = append_all(quiet, events)
+    print(f"writer alone            {PACKETS / elapsed / 1000:8.0f}k appends/s")
+
+    storage = Storage()
+    done = threading.Event()
+    readers = [Reader(storage, done) for _ in range(READERS)]
+    for reader in readers:
+        reader.start()
+    elapsed = append_all(storage, events)
+    done.set()
+    for reader in readers:
+        reader.join()
+    print(f"writer with {READERS} readers  {PACKETS / elapsed / 1000:8.0f}k appends/s")
+    print(f"snapshots {sum(r.snapshots for r in readers)}, records checked {sum(r.checked for r in readers)}, "
+          f"slowest snapshot {max(r.slowest for r in readers) * 1000:.1f} ms")
+
+    errors = [error for reader in readers for error in reader.errors]
+    lost = [seq for seq in range(0, PACKETS, 997) if not intact(seq, storage.record(seq))]
+    if len(storage) != PACKETS:
+        errors.append(f"stored {len(storage)} of {PACKETS} packets")
+    if lost:
+        errors.append(f"{len(lost)} sampled records lost or torn")
+    if errors:
+        print("FAILED:", *errors[:10], sep="\n  ")
+        sys.exit(1)
+    print("OK: no lost, torn or misplaced records")
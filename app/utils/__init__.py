@@ -1,4 +1,6 @@
 from app.utils.events import Event
 from app.utils.interfaces import Subject, Observer
 from app.utils.metrics import *
-from app.utils.models import PacketData, MetricsSnapshot, AlertInfo, QueryMessage, CaptureConfig
\ No newline at end of file
+from app.utils.models import PacketData, MetricsSnapshot, AlertInfo, QueryMessage, CaptureConfig, ProtocolFilter
+from app.utils.record import PacketRecord
+from app.utils.addresses import ADDRESSES, AddressTable
@@ -0,0 +1,131 @@
+import socket
+import threading
+from typing import Dict, List, Optional
+
+from app.config import AddressConfig
+
+# address keys: IPv4 as its 32-bit value, IPv6 as its 128-bit value with bit 128 set,
+# so both families share one int space without colliding
+_V6_TAG = 1 << 128
+_V4_MAPPED = 0xFFFF << 32
+
+
+def pack_address(text: Optional[str]) -> Optional[int]:
+    """
+    Address string -> int key; None for missing or unparsable input. Keys are portable across
+    processes. An IPv4-mapped IPv6 address ("::ffff:a.b.c.d") gets the key of its IPv4 address.
+    """
+    if not text:
+        return None
+    try:
+        if ":" in text:
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET6, text), "big")
+            if value >> 32 == 0xFFFF:
+                return value ^ _V4_MAPPED
+            return value | _V6_TAG
+        return int.from_bytes(socket.inet_aton(text), "big")
+    except (OSError, TypeError):
+        return None
+
+
+def format_address(key: Optional[int]) -> Optional[str]:
+    if key is None:
+        return None
+    if key >= _V6_TAG:
+        return socket.inet_ntop(socket.AF_INET6, (key ^ _V6_TAG).to_bytes(16, "big"))
+    return socket.inet_ntoa(key.to_bytes(4, "big"))
+
+
+class AddressTable:
+    """
+    Interns IP addresses to dense integer ids, once per distinct address.
+
+    The hot path is one dict lookup on the string tshark hands over; parsing and
+    normalisation only happen the first time an address is seen. Ids are process-local:
+    use `key()` for anything that leaves the process and `text()` only for display.
+
+    Ids are never reused, since records anywhere may hold them, so the table is capped
+    instead: past `capacity` distinct addresses, a new address gets an overflow id, its
+    key encoded as a negative number, and is counted in `overflow`. Overflow ids still
+    render and compare like any other, so stored packets keep their addresses; they are
+    just not interned, which costs a parse per packet.
+    """
+
+    def __init__(self, capacity: int = AddressConfig.MAX_ADDRESSES) -> None:
+        """
+        :param capacity: distinct addresses given a table id
+        """
+        self.capacity = capacity
+        self.overflow = 0  # packets given an overflow id once the table was full
+        self._ids: Dict[str, int] = {}
+        self._keys: List[int] = []
+        self._texts: List[str] = []
+        self._by_key: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def intern(self, text: Optional[str]) -> Optional[int]:
+        if not text:
+            return None
+        aid = self._ids.get(text)
+        if aid is not None:
+            return aid
+        key = pack_address(text)
+        if key is None:
+            return None
+        return self._insert(key, text)
+
+    def intern_key(self, key: Optional[int]) -> Optional[int]:
+        if key is None:
+            return None
+        aid = self._by_key.get(key)
+        if aid is not None:
+            return aid
+        return self._insert(key, None)
+
+    def find(self, text: Optional[str]) -> Optional[int]:
+        """Id of an address already seen, without registering it; None otherwise."""
+        if not text:
+            return None
+        aid = self._ids.get(text)
+        if aid is None:
+            key = pack_address(text)
+            aid = self._by_key.get(key) if key is not None else None
+            if aid is None and key is not None and len(self._keys) >= self.capacity:
+                aid = -key - 1  # may have been stored with an overflow id
+        return aid
+
+    def key(self, aid: Optional[int]) -> Optional[int]:
+        if aid is None:
+            return None
+        return self._keys[aid] if aid >= 0 else -aid - 1
+
+    def text(self, aid: Optional[int]) -> Optional[str]:
+        if aid is None:
+            return None
+        return self._texts[aid] if aid >= 0 else format_address(-aid - 1)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _insert(self, key: int, text: Optional[str]) -> int:
+        with self._lock:
+            # "::ffff:..." and its IPv4 address, and compressed/expanded IPv6 spellings, share one id
+            aid = self._by_key.get(key)
+            if aid is None:
+                if len(self._keys) >= self.capacity:
+                    if not self.overflow:
+                        print(f"[WARNING] AddressTable: {self.capacity} distinct addresses interned, "
+                              f"newer addresses get overflow ids")
+                    self.overflow += 1
+                    return -key - 1
+                aid = len(self._keys)
+                self._keys.append(key)
+                self._texts.append(format_address(key))
+                self._by_key[key] = aid
+            if text is not None:
+                self._ids[text] = aid
+            return aid
+
+
+# shared by Metrics, Storage and the indexes built on them
+ADDRESSES = AddressTable()
@@ -0,0 +1,184 @@
+import ipaddress
+import re
+from typing import Dict, FrozenSet, Iterable, List, Tuple, Union
+
+from app.utils.models import CaptureConfig, PortSpec, ProtocolFilter
+
+# protocols BPF can qualify with `port`/`portrange`
+_PORT_PROTOCOLS = {"tcp", "udp", "sctp"}
+# protocols that carry ports underneath, so `proto port N` is written as plain `port N`
+_PORT_CARRIERS = {"ip", "ip6"}
+_PROTOCOL_RE = re.compile(r"^[a-z][a-z0-9]*$")
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def compile_bpf(config: CaptureConfig) -> str:
+    """
+    Compile a CaptureConfig into one BPF expression for dumpcap's kernel filter.
+
+    - duplicate protocols are folded, and a protocol without ports absorbs the same
+      protocol with ports
+    - ports are merged into the fewest `port`/`portrange` primitives
+    - protocols sharing an identical port set are grouped: `(tcp or udp) and port 53`
+    - host/subnet lists are collapsed into the fewest CIDR blocks
+    - the VLAN clause comes first because libpcap's `vlan` shifts the offsets used
+      by every primitive after it. One id compiles to `vlan N`. Several ids compile to
+      a plain `vlan` and are checked after capture (see `vlan_post_filter`): `vlan 10 or
+      vlan 20` would look for 20 in an inner, QinQ tag, and testing the tag bytes at
+      ether[14:2] finds the ethertype instead on NICs that strip tags (VLAN offload)
+
+    :raises ValueError: on unknown protocol names, invalid ports, hosts or VLAN ids
+    """
+    clauses: List[str] = []
+
+    if config.vlans:
+        clauses.append(_vlan_clause(_validate_vlans(config.vlans)))
+
+    protocol_clause = _compile_protocols(config.filters or [ProtocolFilter(config.protocol, [config.port] if config.port else [])])
+    if protocol_clause:
+        clauses.append(protocol_clause)
+
+    if config.include_hosts:
+        clauses.append(_any_of(_host_primitives(config.include_hosts)))
+    if config.exclude_hosts:
+        clauses.append(f"not {_parenthesize(_any_of(_host_primitives(config.exclude_hosts)))}")
+
+    return " and ".join(_parenthesize(clause) for clause in clauses) if len(clauses) > 1 else "".join(clauses)
+
+
+def vlan_post_filter(config: CaptureConfig) -> FrozenSet[int]:
+    """VLAN ids the kernel filter cannot tell apart, to be checked per packet; empty when it can."""
+    vlans = _validate_vlans(config.vlans) if config.vlans else []
+    return frozenset(vlans) if len(vlans) > 1 else frozenset()
+
+
+def parse_ports(text: str) -> List[PortSpec]:
+    """Parse "53, 443, 8000-8080" into port specs; "" or "0" means any port."""
+    specs: List[PortSpec] = []
+    for token in text.replace(" ", "").split(","):
+        if not token or token == "0":
+            continue
+        if "-" in token:
+            low, high = token.split("-", 1)
+            specs.append((int(low), int(high)))
+        else:
+            specs.append(int(token))
+    return specs
+
+
+def merge_port_ranges(ports: Iterable[PortSpec]) -> List[Tuple[int, int]]:
+    """Normalize port specs into sorted, non-overlapping, non-adjacent inclusive ranges."""
+    ranges: List[Tuple[int, int]] = []
+    for spec in ports:
+        low, high = (spec, spec) if isinstance(spec, int) else spec
+        if not (0 <= low <= high <= 65535):
+            raise ValueError(f"invalid port spec: {spec}")
+        ranges.append((low, high))
+
+    merged: List[Tuple[int, int]] = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def _compile_protocols(filters: List[ProtocolFilter]) -> str:
+    # protocol -> merged ranges; an empty tuple means "any port" and wins over port lists
+    by_protocol: Dict[str, Tuple[Tuple[int, int], ...]] = {}
+    for rule in filters:
+        protocol = rule.protocol.strip().lower()
+        if not _PROTOCOL_RE.match(protocol):
+            raise ValueError(f"invalid protocol: {rule.protocol!r}")
+        ports = [p for p in rule.ports if p != 0]
+        if ports and protocol not in _PORT_PROTOCOLS | _PORT_CARRIERS:
+            raise ValueError(f"protocol {protocol} does not carry ports")
+
+        ranges = tuple(merge_port_ranges(ports))
+        if protocol in by_protocol:
+            existing = by_protocol[protocol]
+            ranges = () if not existing or not ranges else tuple(merge_port_ranges(existing + ranges))
+        by_protocol[protocol] = ranges
+
+    # group protocols with identical port sets
+    groups: Dict[Tuple[Tuple[int, int], ...], List[str]] = {}
+    for protocol, ranges in by_protocol.items():
+        groups.setdefault(ranges, []).append(protocol)
+
+    alternatives: List[str] = []
+    for ranges, protocols in groups.items():
+        port_clause = _any_of(_port_primitive(low, high) for low, high in ranges)
+        carriers: FrozenSet[str] = frozenset(protocols) & _PORT_CARRIERS
+        if port_clause and carriers:
+            # `port N` already implies ip/ip6; keep only the address family qualifiers that narrow it
+            protocols = [p for p in protocols if p not in carriers] + ([] if carriers == _PORT_CARRIERS else sorted(carriers))
+        protocol_clause = _any_of(sorted(protocols))
+        if protocol_clause and port_clause:
+            alternatives.append(f"{_parenthesize(protocol_clause)} and {_parenthesize(port_clause)}")
+        else:
+            alternatives.append(protocol_clause or port_clause)
+
+    return _any_of(alternatives)
+
+
+def _port_primitive(low: int, high: int) -> str:
+    return f"port {low}" if low == high else f"portrange {low}-{high}"
+
+
+def _host_primitives(hosts: Iterable[str]) -> List[str]:
+    networks: List[Network] = []
+    for host in hosts:
+        try:
+            networks.append(ipaddress.ip_network(host.strip(), strict=False))
+        except ValueError:
+            raise ValueError(f"invalid host or subnet: {host!r}")
+
+    primitives: List[str] = []
+    for version in (4, 6):
+        family = [n for n in networks if n.version == version]
+        for network in ipaddress.collapse_addresses(family):
+            if network.num_addresses == 1:
+                primitives.append(f"host {network.network_address}")
+            else:
+                primitives.append(f"net {network}")
+    return primitives
+
+
+def _validate_vlans(vlans: Iterable[int]) -> List[int]:
+    unique = sorted(set(vlans))
+    for vlan in unique:
+        if not 0 <= vlan <= 4095:
+            raise ValueError(f"invalid VLAN id: {vlan}")
+    return unique
+
+
+def _vlan_clause(vlans: List[int]) -> str:
+    # `vlan N` reads the tag from ancillary data when the NIC strips it; raw tag bytes do
+    # not, so several ids capture every tagged packet and vlan_post_filter picks them
+    return f"vlan {vlans[0]}" if len(vlans) == 1 else "vlan"
+
+
+def _any_of(primitives: Iterable[str]) -> str:
+    items = [p for p in primitives if p]
+    if len(items) == 1:
+        return items[0]
+    return " or ".join(_parenthesize(p) for p in items)
+
+
+def _parenthesize(expression: str) -> str:
+    if " or " in expression or " and " in expression:
+        if not (expression.startswith("(") and expression.endswith(")") and _balanced(expression[1:-1])):
+            return f"({expression})"
+    return expression
+
+
+def _balanced(expression: str) -> bool:
+    depth = 0
+    for char in expression:
+        depth += char == "("
+        depth -= char == ")"
+        if depth < 0:
+            return False
+    return depth == 0
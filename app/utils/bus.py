@@ -0,0 +1,346 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple, Type
+
+from app.config import BusConfig
+from app.utils.events import Event
+from app.utils.interfaces import Observer, Subject
+
+EXECUTORS = ("inline", "thread", "process", "asyncio")
+
+# a handler gets one Event, or a List[Event] when subscribed with batch_size > 1
+Handler = Callable[[Any], Any]
+
+
+class Subscription:
+    """One handler on one topic (an Event class, matching subclasses too)."""
+
+    __slots__ = ("bus", "topic", "handler", "executor", "batch_size", "batch_interval",
+                 "_buffer", "_first_buffered", "_lock", "_worker", "_loop", "_in_flight")
+
+    def __init__(self, bus: "EventBus", topic: Type[Event], handler: Handler, executor: str,
+                 batch_size: int, batch_interval: float, loop: Optional[asyncio.AbstractEventLoop]):
+        self.bus = bus
+        self.topic = topic
+        self.handler = handler
+        self.executor = executor
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+
+        self._buffer: List[Event] = []
+        self._first_buffered = 0.0
+        self._lock = threading.Lock()
+        self._worker: Optional[_Worker] = None
+        self._loop = loop
+        self._in_flight: Set[Future] = set()  # process and asyncio work handed over, not yet done
+
+    def deliver(self, event: Event) -> None:
+        if self._worker is not None:
+            self._worker.put(event)  # the worker batches by draining its queue
+            return
+        if self.batch_size == 1:
+            self._dispatch(event)  # thread-less executors without batching
+            return
+
+        with self._lock:  # the flusher thread may hand over the same buffer
+            buffer = self._buffer
+            if not buffer:
+                self._first_buffered = time.monotonic()
+            buffer.append(event)
+            if len(buffer) < self.batch_size:
+                return
+            self._buffer = []
+        self._dispatch(buffer)
+
+    def flush(self, due_only: bool = False) -> None:
+        """Hand over a partially filled batch; with `due_only`, only once it is `batch_interval` old."""
+        if self._worker is not None:
+            return
+        with self._lock:
+            if not self._buffer or (due_only and time.monotonic() - self._first_buffered < self.batch_interval):
+                return
+            batch, self._buffer = self._buffer, []
+        self._dispatch(batch)
+
+    def join(self, timeout: Optional[float]) -> None:
+        """Wait until everything handed over so far has been handled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self._worker is not None:
+            self._worker.join(timeout)
+        with self._lock:
+            in_flight = list(self._in_flight)
+        if in_flight:
+            wait(in_flight, None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def close(self) -> None:
+        self.flush()
+        if self._worker is not None:
+            self._worker.stop()
+            self._worker = None
+
+    def _dispatch(self, item: Any) -> None:
+        if self.executor == "inline":
+            _call(self.handler, item)
+        elif self.executor == "process":
+            future = self.bus.process_pool().submit(self.handler, item)
+            self._track(future)
+            future.add_done_callback(_report_failure)
+        else:  # asyncio
+            future = Future()
+            self._track(future)
+            self._loop.call_soon_threadsafe(self._invoke_in_loop, item, future)
+
+    def _track(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight.add(future)
+        future.add_done_callback(self._untrack)
+
+    def _untrack(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight.discard(future)
+
+    def _invoke_in_loop(self, item: Any, future: Future) -> None:
+        result = _call(self.handler, item)
+        if asyncio.iscoroutine(result):
+            task = self._loop.create_task(result)
+            task.add_done_callback(lambda _: future.set_result(None))
+        else:
+            future.set_result(None)
+
+
+class _Worker:
+    """Ordered delivery on a dedicated thread; drains up to `batch_size` events per call."""
+
+    def __init__(self, subscription: Subscription, capacity: int):
+        self._subscription = subscription
+        self._capacity = capacity
+        self._queue: Deque[Event] = deque()
+        self._cond = threading.Condition()
+        self._idle = False
+        self._busy = False  # a popped item is being handled
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"bus-{subscription.topic.__name__}")
+        self._thread.start()
+
+    def put(self, event: Event) -> None:
+        queue = self._queue
+        if len(queue) < self._capacity:
+            queue.append(event)  # deque appends are atomic, the worker only pops
+            if len(queue) == 1 or self._idle:
+                with self._cond:
+                    self._cond.notify_all()
+            return
+
+        with self._cond:
+            while len(queue) >= self._capacity and self._running:
+                self._cond.wait(BusConfig.BATCH_INTERVAL_SECONDS)  # backpressure instead of unbounded growth
+            queue.append(event)
+            self._cond.notify_all()
+
+    def join(self, timeout: Optional[float]) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while (self._queue or self._busy) and self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return
+                self._cond.wait(remaining)
+
+    def stop(self) -> None:
+        self.join(BusConfig.CLOSE_TIMEOUT_SECONDS)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=BusConfig.CLOSE_TIMEOUT_SECONDS)
+
+    def _run(self) -> None:
+        batch_size = self._subscription.batch_size
+        handler = self._subscription.handler
+        while True:
+            with self._cond:
+                while not self._queue and self._running:
+                    self._idle = True
+                    self._cond.wait(BusConfig.BATCH_INTERVAL_SECONDS)
+                self._idle = False
+                if not self._queue:
+                    return
+                if batch_size == 1:
+                    item: Any = self._queue.popleft()
+                else:
+                    item = [self._queue.popleft() for _ in range(min(batch_size, len(self._queue)))]
+                self._busy = True
+                self._cond.notify_all()  # room for a blocked producer
+            _call(handler, item)
+            with self._cond:
+                self._busy = False
+                if not self._queue:
+                    self._cond.notify_all()  # progress for join()
+
+
+class EventBus:
+    """
+    Typed publish/subscribe hub.
+
+    A topic is an Event class; subscribing to a base class also receives its subclasses
+    (`Event` receives everything). The subscriber list per concrete event type is
+    resolved once and cached as a tuple, so `publish` is a dict lookup plus one call
+    per inline subscriber: no lock, no list copy.
+
+    Executors:
+    - inline: on the publisher's thread; exceptions propagate to the publisher like a
+      direct call (batched inline handlers are isolated like the other executors)
+    - thread: a dedicated ordered worker thread with a bounded queue
+    - process: a shared ProcessPoolExecutor; handler and events must be picklable, order is not kept
+    - asyncio: scheduled on `loop`; coroutine handlers are run as tasks
+    """
+
+    def __init__(self) -> None:
+        self._subscriptions: Tuple[Subscription, ...] = ()
+        # concrete event type -> what publish calls: the handler itself for plain inline
+        # subscriptions, Subscription.deliver for everything else
+        self._routes: Dict[type, Tuple[Callable[[Event], Any], ...]] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def subscribe(self, topic: Type[Event], handler: Handler, executor: str = "inline",
+                  batch_size: int = 1, batch_interval: float = BusConfig.BATCH_INTERVAL_SECONDS,
+                  loop: Optional[asyncio.AbstractEventLoop] = None,
+                  capacity: int = BusConfig.QUEUE_CAPACITY) -> Subscription:
+        """
+        :param topic: Event class to receive, subclasses included
+        :param handler: called with an Event, or a list of Events when `batch_size` > 1
+        :param executor: inline, thread, process or asyncio
+        :param batch_size: events per handler call
+        :param batch_interval: a partial batch is delivered once it is this old (seconds)
+        :param loop: event loop for the asyncio executor
+        :param capacity: queue length for the thread executor
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"unknown executor: {executor!r}")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if executor == "asyncio" and loop is None:
+            raise ValueError("the asyncio executor needs an event loop")
+
+        subscription = Subscription(self, topic, handler, executor, batch_size, batch_interval, loop)
+        if executor == "thread":
+            subscription._worker = _Worker(subscription, capacity)
+
+        with self._lock:
+            self._subscriptions = self._subscriptions + (subscription,)
+            self._routes = {}
+        if batch_size > 1 and executor != "thread":
+            self._start_flusher()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not subscription)
+            self._routes = {}
+        subscription.close()
+
+    def publish(self, event: Event) -> None:
+        route = self._routes.get(type(event))
+        if route is None:
+            route = self._resolve(type(event))
+        for deliver in route:
+            deliver(event)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Deliver partial batches and wait until every executor has handled what it was given."""
+        for subscription in self._subscriptions:
+            subscription.flush()
+            subscription.join(timeout)
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            subscriptions, self._subscriptions, self._routes = self._subscriptions, (), {}
+        for subscription in subscriptions:
+            subscription.close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=BusConfig.PROCESS_WORKERS)
+            return self._pool
+
+    def _resolve(self, event_type: type) -> Tuple[Callable[[Event], Any], ...]:
+        with self._lock:
+            route = tuple(
+                s.handler if s.executor == "inline" and s.batch_size == 1 else s.deliver
+                for s in self._subscriptions if issubclass(event_type, s.topic)
+            )
+            self._routes[event_type] = route
+        return route
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name="bus-flush")
+        self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(BusConfig.BATCH_INTERVAL_SECONDS / 2):
+            for subscription in self._subscriptions:
+                if subscription.batch_size > 1:
+                    subscription.flush(due_only=True)
+
+
+class Publisher(Subject):
+    """
+    Subject backed by an EventBus. Observers are bus subscriptions on `Event`, inline
+    unless subscribed with another executor; modules publish with `notify_observers`.
+    """
+
+    def __init__(self, bus: Optional[EventBus] = None) -> None:
+        self.bus = bus if bus is not None else EventBus()
+        self._subscriptions: Dict[int, Tuple[Observer, Subscription]] = {}
+
+    @property
+    def observers(self) -> List[Observer]:
+        return [observer for observer, _ in self._subscriptions.values()]
+
+    def subscribe(self, observer: Observer, executor: str = "inline", **options: Any) -> None:
+        """
+        :param executor: inline, thread, process or asyncio (see EventBus.subscribe)
+        """
+        if not isinstance(observer, Observer):
+            raise TypeError("expected Observer, got", type(observer))
+        if id(observer) in self._subscriptions:
+            return
+        subscription = self.bus.subscribe(Event, observer.update, executor, **options)
+        self._subscriptions[id(observer)] = (observer, subscription)
+
+    def unsubscribe(self, observer: Observer) -> None:
+        entry = self._subscriptions.pop(id(observer), None)
+        if entry is not None:
+            self.bus.unsubscribe(entry[1])
+
+    def notify_observers(self, event: Event) -> None:
+        self.bus.publish(event)
+
+
+def _call(handler: Handler, item: Any) -> Any:
+    try:
+        return handler(item)
+    except Exception as e:
+        # a failing subscriber must not break delivery to the others
+        print(f"bus: {getattr(handler, '__qualname__', handler)}: {type(e).__name__}: {e}")
+        return None
+
+
+def _report_failure(future: Future) -> None:
+    error = future.exception()
+    if error is not None:
+        print(f"bus: process handler failed: {type(error).__name__}: {error}")
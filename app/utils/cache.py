@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional, Tuple
+
+from app.config import CacheConfig
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    start: float              # time range the value covers
+    end: float
+    mark: Tuple[int, int]     # Storage.watermark() the value was computed at
+    size: int = 1             # rows (or group keys) held, counted against the cache budget
+
+
+class QueryCache:
+    """
+    Least recently used query results, bounded by entry count and by total rows.
+
+    The cache only stores; callers own staleness. They keep one entry per normalized
+    query, compare its time range and Storage watermark with the current ones, and
+    either reuse, update in place (`put` again) or recompute.
+    """
+
+    def __init__(self, max_entries: int = CacheConfig.MAX_ENTRIES, max_rows: int = CacheConfig.MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: CacheEntry) -> None:
+        """Store or replace; entries larger than a quarter of the row budget are not kept."""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._rows -= previous.size
+            if entry.size > self.max_rows // 4:
+                return
+            self._entries[key] = entry
+            self._rows += entry.size
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                _, evicted = self._entries.popitem(last=False)
+                self._rows -= evicted.size
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._rows -= entry.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+CHECK_EVERY = 4096  # rows between cancellation checks inside query loops
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """
+    Cooperative cancellation for one query: long loops call `check()` (or iterate
+    through `guard()`) and stop with QueryCancelled once the token is cancelled or
+    its deadline passes.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        :param timeout: seconds from now until the query gives up - default; no deadline
+        """
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self._cancelled = threading.Event()
+
+    def extend(self, timeout: float) -> None:
+        """Move the deadline to `timeout` seconds from now, for work known to run long."""
+        self.deadline = time.monotonic() + timeout
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to `seconds`, waking as soon as the token is cancelled; True if it was."""
+        return self._cancelled.wait(seconds)
+
+    def check(self) -> None:
+        if self._cancelled.is_set():
+            raise QueryCancelled("cancelled")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise QueryCancelled("timed out")
+
+    def guard(self, items: Iterable[T]) -> Iterator[T]:
+        """Iterate `items`, checking the token every CHECK_EVERY items."""
+        self.check()
+        for count, item in enumerate(items, 1):
+            if not count % CHECK_EVERY:
+                self.check()
+            yield item
+
+
+def guarded(items: Iterable[T], token: Optional[CancelToken]) -> Iterable[T]:
+    return items if token is None else token.guard(items)
@@ -0,0 +1,223 @@
+import zlib
+from array import array
+from itertools import accumulate, islice
+from operator import sub
+from typing import Any, Dict, FrozenSet, Optional, Sequence, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always there
+    zstandard = None
+
+from app.utils.record import PacketRecord
+
+# column typecodes, in payload order
+_LAYOUT = (
+    ("time", "q"),        # microseconds (PacketRecord rounds to them), delta-encoded from the previous row (the first from 0)
+    ("length", "l"),
+    ("protocol", "B"),    # code into ColdBlock.protocols
+    ("src", "L"),         # code into ColdBlock.addresses, 0 = none
+    ("dst", "L"),
+    ("src_port", "l"),    # -1 = none
+    ("dst_port", "l"),
+    ("flags", "H"),
+    ("spool", "H"),       # code into ColdBlock.spools, 0 = none
+    ("frame", "q"),       # -1 = none
+)
+
+
+def available_codec(preferred: str) -> str:
+    """`preferred` when it can be used here, else zlib."""
+    return "zstd" if preferred == "zstd" and zstandard is not None else "zlib"
+
+
+class ColdBlock:
+    """
+    A run of stored packets in compressed columnar form, addressed by its first position.
+
+    Dictionaries (protocol ids, address ids, spool paths) stay uncompressed; together
+    with the min/max columns they are the block's stats, which let a query skip the
+    block without decompressing it.
+    """
+
+    __slots__ = (
+        "start", "rows", "codec", "payload",
+        "time_min", "time_max", "length_min", "length_max",
+        "src_port_min", "src_port_max", "dst_port_min", "dst_port_max",
+        "protocols", "addresses", "sources", "destinations", "spools", "summaries",
+    )
+
+    def __init__(self, start: int, rows: int):
+        self.start = start
+        self.rows = rows
+        self.codec = "zlib"
+        self.payload = b""
+        self.time_min = self.time_max = 0.0
+        self.length_min = self.length_max = 0
+        self.src_port_min = self.src_port_max = self.dst_port_min = self.dst_port_max = -1
+        self.protocols: Tuple[int, ...] = ()
+        self.addresses: Tuple[Optional[int], ...] = (None,)
+        self.sources: FrozenSet[int] = frozenset()
+        self.destinations: FrozenSet[int] = frozenset()
+        self.spools: Tuple[Optional[str], ...] = (None,)
+        self.summaries: Optional[Dict[int, str]] = None  # rows with a summary of their own
+
+    @property
+    def end(self) -> int:
+        return self.start + self.rows
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.payload)
+
+    @classmethod
+    def encode(cls, start: int, packets: Sequence[Any], codec: str = "zlib", level: int = 6) -> "ColdBlock":
+        """
+        :param packets: StoredPackets (anything with `record`, `spool`, `frame` and `_summary`)
+        :param codec: "zstd" or "zlib"; see `available_codec`
+        """
+        decoded = cls.columnize(start, packets)
+        block = decoded.block
+        times = decoded.column("time")
+        deltas = array("q", times[:1])
+        deltas.extend(map(sub, islice(times, 1, None), times))
+        raw = b"".join((deltas if name == "time" else decoded.column(name)).tobytes() for name, _ in _LAYOUT)
+        block.codec = available_codec(codec)
+        block.payload = zstandard.ZstdCompressor(level=level).compress(raw) if block.codec == "zstd" \
+            else zlib.compress(raw, level)
+        return block
+
+    @classmethod
+    def columnize(cls, start: int, packets: Sequence[Any]) -> "DecodedBlock":
+        """
+        `packets` as uncompressed columns, with the stats and dictionaries of a block
+        (but no payload). Used for the hot rows of a columnar export.
+        """
+        block = cls(start, len(packets))
+        columns = {name: array(code) for name, code in _LAYOUT}
+        protocols: Dict[int, int] = {}
+        addresses: Dict[Optional[int], int] = {None: 0}
+        spools: Dict[Optional[str], int] = {None: 0}
+        summaries: Dict[int, str] = {}
+
+        for row, packet in enumerate(packets):
+            record: PacketRecord = packet.record
+            columns["time"].append(round(record.timestamp * 1_000_000))
+            columns["length"].append(record.length)
+            columns["protocol"].append(protocols.setdefault(record.protocol, len(protocols)))
+            columns["src"].append(addresses.setdefault(record.src, len(addresses)))
+            columns["dst"].append(addresses.setdefault(record.dst, len(addresses)))
+            columns["src_port"].append(-1 if record.src_port is None else record.src_port)
+            columns["dst_port"].append(-1 if record.dst_port is None else record.dst_port)
+            columns["flags"].append(record.flags)
+            columns["spool"].append(spools.setdefault(packet.spool, len(spools)))
+            columns["frame"].append(-1 if packet.frame is None else packet.frame)
+            if packet._summary is not None:
+                summaries[row] = packet._summary
+
+        if len(protocols) > 255:
+            columns["protocol"] = array("H", columns["protocol"])
+        if packets:
+            timestamps = [packet.record.timestamp for packet in packets]
+            lengths = columns["length"]
+            block.time_min, block.time_max = min(timestamps), max(timestamps)
+            block.length_min, block.length_max = min(lengths), max(lengths)
+            block.src_port_min, block.src_port_max = min(columns["src_port"]), max(columns["src_port"])
+            block.dst_port_min, block.dst_port_max = min(columns["dst_port"]), max(columns["dst_port"])
+        block.protocols = tuple(protocols)
+        block.addresses = tuple(addresses)
+        block.sources = frozenset(address for address in (packet.record.src for packet in packets) if address is not None)
+        block.destinations = frozenset(address for address in (packet.record.dst for packet in packets) if address is not None)
+        block.spools = tuple(spools)
+        block.summaries = summaries or None
+        return DecodedBlock(block, columns)
+
+    def decode(self) -> "DecodedBlock":
+        raw = zstandard.ZstdDecompressor().decompress(self.payload) if self.codec == "zstd" \
+            else zlib.decompress(self.payload)
+        columns = {}
+        offset = 0
+        for name, code in _LAYOUT:
+            if name == "protocol" and len(self.protocols) > 255:
+                code = "H"
+            column = array(code)
+            size = column.itemsize * self.rows
+            column.frombytes(raw[offset:offset + size])
+            offset += size
+            columns[name] = column
+        columns["time"] = array("q", accumulate(columns["time"]))
+        return DecodedBlock(self, columns)
+
+    def excludes(self, field: str, op: str, values: Sequence[Any]) -> bool:
+        """
+        Whether no row can satisfy `field op values` (values already resolved to record
+        ids). Conservative: False whenever the stats cannot tell.
+        """
+        if field in ("protocol", "src", "dst", "host") and op in ("=", "in"):
+            present = {
+                "protocol": set(self.protocols), "src": self.sources, "dst": self.destinations,
+                "host": self.sources | self.destinations,
+            }[field]
+            return not any(value in present for value in values)
+
+        ranges = {
+            "time": [(self.time_min, self.time_max)],
+            "length": [(self.length_min, self.length_max)],
+            "src_port": [(self.src_port_min, self.src_port_max)],
+            "dst_port": [(self.dst_port_min, self.dst_port_max)],
+            "port": [(self.src_port_min, self.src_port_max), (self.dst_port_min, self.dst_port_max)],
+        }.get(field)
+        if ranges is None or not values or not all(isinstance(value, (int, float)) for value in values):
+            return False
+        return all(_outside(low, high, op, values) for low, high in ranges)
+
+
+class DecodedBlock:
+    """
+    A ColdBlock's columns, decompressed. Rows become objects only when read, so a
+    query touching a few rows of a block allocates a few records, not thousands.
+    """
+
+    __slots__ = ("block", "_time", "_length", "_protocol", "_src", "_dst", "_src_port", "_dst_port",
+                 "_flags", "_spool", "_frame")
+
+    def __init__(self, block: ColdBlock, columns: Dict[str, array]):
+        self.block = block
+        for name, _ in _LAYOUT:
+            setattr(self, "_" + name, columns[name])
+
+    def column(self, name: str) -> array:
+        """
+        One column as packed values, shared rather than copied (treat as read-only). Time
+        is in microseconds; protocol, src, dst and spool are codes into the block's
+        dictionaries; -1 stands for a missing port or frame.
+        """
+        return getattr(self, "_" + name)
+
+    def record(self, row: int) -> PacketRecord:
+        addresses = self.block.addresses
+        src_port, dst_port = self._src_port[row], self._dst_port[row]
+        return PacketRecord(
+            self._time[row] / 1_000_000, self._length[row], self.block.protocols[self._protocol[row]],
+            addresses[self._src[row]], addresses[self._dst[row]],
+            None if src_port < 0 else src_port, None if dst_port < 0 else dst_port, self._flags[row],
+        )
+
+    def row(self, row: int) -> Tuple[PacketRecord, Optional[str], Optional[int], Optional[str]]:
+        """(record, spool, frame, summary)"""
+        frame = self._frame[row]
+        summaries = self.block.summaries
+        return (self.record(row), self.block.spools[self._spool[row]], None if frame < 0 else frame,
+                summaries.get(row) if summaries else None)
+
+
+def _outside(low: float, high: float, op: str, values: Sequence[float]) -> bool:
+    if op in ("=", "in"):
+        return all(value < low or value > high for value in values)
+    if op == "between":
+        return values[1] < low or values[0] > high
+    bound = values[0]
+    return {
+        "<": low >= bound, "<=": low > bound,
+        ">": high <= bound, ">=": high < bound,
+    }.get(op, False)
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import DetailConfig, SystemConfig
+from app.utils.pcapng import PcapngIndex, RawFrame, write_pcap
+from app.utils.ring import RingRecorder
+
+
+class Dissector:
+    """
+    Full per-packet detail (every layer plus a hex dump), produced only when asked for.
+
+    The packet's bytes are read straight from the ring segment tshark recorded it to,
+    by frame number, and dissected with scapy when installed, otherwise by running
+    tshark on a one-packet pcap. Recently viewed dissections are kept in an LRU cache.
+    """
+
+    def __init__(self, cache_size: int = DetailConfig.CACHE_SIZE):
+        self._cache: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._cache_size = cache_size
+        self._indexes: Dict[str, PcapngIndex] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, spool: str, frame: int, timestamp: Optional[float] = None) -> Optional[str]:
+        """
+        :param spool: ring series (or plain pcapng file) the packet was recorded to
+        :param frame: tshark frame number (1-based)
+        :param timestamp: the packet's capture time, picks the segment within a ring
+        :return: dissection text, or None when the frame is not (or no longer) on disk
+        """
+        key = (spool, frame)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        if os.path.isfile(spool):
+            path, local = spool, frame
+        else:
+            located = RingRecorder.open(os.path.dirname(spool)).locate(spool, frame, timestamp)
+            if located is None:
+                return None
+            path, local = located
+
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is None:
+                index = self._indexes[path] = PcapngIndex(path)
+
+        raw = index.read(local)
+        if raw is None:
+            return None
+        text = self.dissect(raw)
+
+        with self._lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def forget(self, path: str) -> None:
+        """Drop the index of a segment that was deleted."""
+        with self._lock:
+            self._indexes.pop(path, None)
+
+    @staticmethod
+    def dissect(raw: RawFrame) -> str:
+        try:
+            return _dissect_scapy(raw)
+        except ImportError:
+            return _dissect_tshark(raw)
+
+
+def _dissect_scapy(raw: RawFrame) -> str:
+    from scapy.config import conf
+    from scapy.packet import Raw
+    from scapy.utils import hexdump
+
+    layer = conf.l2types.get(raw.linktype, Raw)
+    packet = layer(raw.data)
+    return f"{packet.show(dump=True)}\n{hexdump(packet, dump=True)}"
+
+
+def _dissect_tshark(raw: RawFrame) -> str:
+    handle, path = tempfile.mkstemp(suffix=".pcap")
+    try:
+        with os.fdopen(handle, "wb") as target:
+            write_pcap(target, [raw])
+        result = subprocess.run(
+            [SystemConfig.TSHARK_PATH, "-r", path, "-V", "-x"],
+            capture_output=True, text=True, timeout=DetailConfig.TSHARK_TIMEOUT_SECONDS,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"tshark failed: {result.stderr.strip()}")
+        return result.stdout
+    finally:
+        os.unlink(path)
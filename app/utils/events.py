@@ -1,6 +1,7 @@
-from app.utils.models import MetricsSnapshot, AlertInfo, QueryMessage
+from app.utils.models import MetricsSnapshot, AlertInfo, LoadProgress, QueryChunk, QueryMessage
+from app.utils.record import PacketRecord
 from pyshark.packet.packet import Packet
-from typing import Union
+from typing import Optional, Union
 
 class Event:
     def __init__(self, name: str, payload: Union[Packet, QueryMessage, MetricsSnapshot, AlertInfo]):
@@ -8,8 +9,22 @@ class Event:
         self.payload = payload
 
 class PacketCapturedEvent(Event):
-    def __init__(self, packet_data: Packet):
+    def __init__(self, packet_data: Packet, sample_rate: int = 1, interface: Optional[str] = None,
+                 spool: Optional[str] = None):
         super().__init__("packet_captured", packet_data)
+        # each delivered packet stands for `sample_rate` captured ones
+        self.sample_rate = sample_rate
+        self.interface = interface
+        self.spool = spool  # pcapng file holding the raw packet, under its frame number
+        self._record: Optional[PacketRecord] = None
+
+    @property
+    def record(self) -> PacketRecord:
+        """Fields extracted from the packet, computed once and shared by every consumer."""
+        record = self._record
+        if record is None:
+            record = self._record = PacketRecord.from_packet(self.payload)
+        return record
 
 class MetricsUpdatedEvent(Event):
     def __init__(self, metrics_snapshot: MetricsSnapshot):
@@ -23,6 +38,22 @@ class QueryRaised(Event):
     def __init__(self, query: QueryMessage):
         super().__init__("query_raised", query)
 
+class QueryResultEvent(Event):
+    def __init__(self, chunk: QueryChunk):
+        super().__init__("query_result", chunk)
+
+class ChatResponseEvent(Event):
+    def __init__(self, response: str):
+        super().__init__("chat_response", response)
+
+class CancelQueriesEvent(Event):
+    def __init__(self):
+        super().__init__("cancel_queries", None)
+
+class StorageLoadEvent(Event):
+    def __init__(self, progress: LoadProgress):
+        super().__init__("storage_load", progress)
+
 class StartCaptureEvent(Event):
     def __init__(self, config):
         super().__init__("start_capture", config)
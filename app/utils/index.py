@@ -0,0 +1,110 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from app.utils.record import PacketRecord
+
+# record attributes with a posting list per distinct value
+INDEXED = ("protocol", "src", "dst", "dst_port")
+
+_EMPTY = array("L")
+
+
+class PacketIndex:
+    """
+    Secondary indexes over an append-only run of PacketRecords, addressed by position.
+
+    - time: the running maximum of timestamps, so a time range maps to a contiguous
+      position span by bisection even when packets arrive slightly out of order
+      (rows inside the span still need their own timestamp checked)
+    - one posting list (ascending positions) per protocol, address and destination port
+
+    Built incrementally: `extend` only looks at records appended since the last call.
+    """
+
+    def __init__(self) -> None:
+        self.size = 0
+        self._time = array("d")
+        self._latest = float("-inf")
+        self._disorder = 0.0  # how far a timestamp ever fell behind the running maximum
+        self._postings: Dict[str, Dict[int, array]] = {name: {} for name in INDEXED}
+
+    def extend(self, records: Iterable[PacketRecord]) -> None:
+        time_column = self._time
+        protocol, src, dst, dst_port = (self._postings[name] for name in INDEXED)
+        position = self.size
+        latest = self._latest
+        for record in records:
+            timestamp = record.timestamp
+            if timestamp > latest:
+                latest = timestamp
+            elif latest - timestamp > self._disorder:
+                self._disorder = latest - timestamp
+            time_column.append(latest)
+
+            _post(protocol, record.protocol, position)
+            if record.src is not None:
+                _post(src, record.src, position)
+            if record.dst is not None:
+                _post(dst, record.dst, position)
+            if record.dst_port is not None:
+                _post(dst_port, record.dst_port, position)
+            position += 1
+        self.size = position
+        self._latest = latest
+
+    def span(self, start: float, end: float) -> Tuple[int, int]:
+        """Positions [lo, hi) that can hold packets captured in [start, end]."""
+        lo = bisect_left(self._time, start)
+        hi = bisect_right(self._time, end + self._disorder, lo)
+        return lo, hi
+
+    def postings(self, name: str, key: int) -> Sequence[int]:
+        return self._postings[name].get(key, _EMPTY)
+
+    def keys(self, name: str) -> int:
+        return len(self._postings[name])
+
+    @staticmethod
+    def within(postings: Sequence[int], lo: int, hi: int) -> Sequence[int]:
+        """The part of a posting list that falls in the position span [lo, hi)."""
+        return postings[bisect_left(postings, lo):bisect_left(postings, hi)]
+
+    def first_timestamp(self) -> Optional[float]:
+        return self._time[0] if self.size else None
+
+
+def _post(postings: Dict[int, array], key: int, position: int) -> None:
+    positions = postings.get(key)
+    if positions is None:
+        positions = postings[key] = array("L")
+    positions.append(position)
+
+
+class IndexView:
+    """
+    A PacketIndex as of its first `size` rows, for readers of a Storage snapshot while
+    capture keeps extending the index.
+    """
+
+    within = staticmethod(PacketIndex.within)
+
+    def __init__(self, index: PacketIndex, size: int):
+        self._index = index
+        self.size = min(size, index.size)
+
+    def span(self, start: float, end: float) -> Tuple[int, int]:
+        lo, hi = self._index.span(start, end)
+        return min(lo, self.size), min(hi, self.size)
+
+    def postings(self, name: str, key: int) -> Sequence[int]:
+        postings = self._index.postings(name, key)
+        if postings and postings[-1] >= self.size:
+            return postings[:bisect_left(postings, self.size)]
+        return postings
+
+    def keys(self, name: str) -> int:
+        return self._index.keys(name)
+
+    def first_timestamp(self) -> Optional[float]:
+        return self._index.first_timestamp() if self.size else None
@@ -0,0 +1,263 @@
+import base64
+import hashlib
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import MetricConfig, RemoteConfig
+from app.utils.models import MetricsSnapshot
+from app.utils.record import ERROR, RST, SYN, TCP_FLAGS
+
+__all__ = ["HyperLogLog", "TopK", "MetricsDelta", "cumulative_histogram", "anomaly_indicators"]
+
+
+def cumulative_histogram(bounds: Tuple, buckets: List[int]) -> Dict[str, int]:
+    """Turn per-bucket counts (last slot = overflow) into Prometheus-style cumulative counts."""
+    histogram: Dict[str, int] = {}
+    running = 0
+    for bound, count in zip(bounds, buckets):
+        running += count
+        histogram[str(bound)] = running
+    histogram["+Inf"] = running + buckets[-1]
+    return histogram
+
+
+def anomaly_indicators(snapshot: MetricsSnapshot) -> Dict[str, bool]:
+    return {
+        "high_packet_rate": snapshot.packet_rate > MetricConfig.HIGH_PACKET_RATE_THRESHOLD,
+        "high_throughput": snapshot.throughput_bps > MetricConfig.HIGH_THROUGHPUT_BPS,
+        "syn_flood_suspected": snapshot.syn_rate > MetricConfig.HIGH_SYN_RATE_THRESHOLD,
+        "rst_spike": snapshot.rst_rate > MetricConfig.HIGH_RST_RATE_THRESHOLD,
+    }
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch; 2**precision one-byte registers."""
+
+    def __init__(self, precision: int = RemoteConfig.HLL_PRECISION, registers: Optional[bytearray] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self._size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self._size)
+        if len(self.registers) != self._size:
+            raise ValueError("register count does not match precision")
+
+    def add(self, value: Any) -> None:
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        registers = self.registers
+        for i, rank in enumerate(other.registers):
+            if rank > registers[i]:
+                registers[i] = rank
+
+    def count(self) -> int:
+        m = self._size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"p": self.precision, "r": base64.b64encode(bytes(self.registers)).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        return cls(int(data["p"]), bytearray(base64.b64decode(data["r"])))
+
+
+class TopK:
+    """
+    Bounded heavy-hitter counter. Keeps up to 2 * capacity keys and prunes back to the
+    `capacity` largest, so merged counts for the true heavy hitters stay close to exact.
+    """
+
+    def __init__(self, capacity: int = RemoteConfig.TOP_K_CAPACITY, counts: Optional[Dict[Any, int]] = None):
+        self.capacity = capacity
+        self.counts: Dict[Any, int] = dict(counts) if counts else {}
+
+    def add(self, key: Any, amount: int = 1) -> None:
+        self.counts[key] = self.counts.get(key, 0) + amount
+        if len(self.counts) > 2 * self.capacity:
+            self._prune()
+
+    def merge(self, other: "TopK") -> None:
+        for key, amount in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + amount
+        if len(self.counts) > 2 * self.capacity:
+            self._prune()
+
+    def top(self, n: int) -> List[Tuple[Any, int]]:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def _prune(self) -> None:
+        self.counts = dict(self.top(self.capacity))
+
+    def to_pairs(self) -> List[List[Any]]:
+        return [[k, v] for k, v in self.top(self.capacity)]
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Iterable[Any]], capacity: int = RemoteConfig.TOP_K_CAPACITY) -> "TopK":
+        return cls(capacity, {k: int(v) for k, v in pairs})
+
+
+@dataclass
+class MetricsDelta:
+    """
+    Everything a sensor observed since its previous delta. All fields merge by
+    addition (counters, buckets), max/min (sizes) or sketch union (HLL, TopK).
+    """
+
+    source: str = ""
+    started: Optional[float] = None
+    ended: Optional[float] = None
+
+    packets: int = 0
+    bytes: int = 0
+    errors: int = 0
+    syn: int = 0
+    rst: int = 0
+    min_size: Optional[int] = None
+    max_size: int = 0
+    latency_sum_ms: float = 0.0
+    latency_count: int = 0
+    capture_lag: float = 0.0
+
+    protocol_counts: Dict[str, int] = field(default_factory=dict)
+    tcp_flag_counts: Dict[str, int] = field(default_factory=dict)
+    size_buckets: List[int] = field(default_factory=lambda: [0] * (len(MetricConfig.PACKET_SIZE_BUCKETS) + 1))
+    latency_buckets: List[int] = field(default_factory=lambda: [0] * (len(MetricConfig.LATENCY_BUCKETS_MS) + 1))
+
+    src_ip_bytes: TopK = field(default_factory=TopK)
+    dst_ip_bytes: TopK = field(default_factory=TopK)
+    dst_port_counts: TopK = field(default_factory=TopK)
+    src_ips: HyperLogLog = field(default_factory=HyperLogLog)
+    dst_ips: HyperLogLog = field(default_factory=HyperLogLog)
+
+    def record_packet(self, timestamp: float, length: int, size_bucket: int, protocol: str,
+                      src: Optional[int], dst: Optional[int], dst_port: Optional[int],
+                      flags: int, weight: int = 1) -> None:
+        """
+        :param src: portable address key (`AddressTable.key`); keys, not strings or ids,
+                    go into the sketches and on the wire
+        :param flags: PacketRecord flags bitmask
+        """
+        if self.started is None:
+            self.started = timestamp
+        self.ended = timestamp
+
+        self.packets += weight
+        self.bytes += length * weight
+        self.max_size = max(self.max_size, length)
+        if self.min_size is None or (length and length < self.min_size):
+            self.min_size = length
+        self.size_buckets[size_bucket] += weight
+
+        self.protocol_counts[protocol] = self.protocol_counts.get(protocol, 0) + weight
+        if dst_port is not None:
+            self.dst_port_counts.add(dst_port, weight)
+        if src is not None:
+            self.src_ip_bytes.add(src, length * weight)
+            self.src_ips.add(src)
+        if dst is not None:
+            self.dst_ip_bytes.add(dst, length * weight)
+            self.dst_ips.add(dst)
+
+        if flags:
+            for flag_name, bit in TCP_FLAGS:
+                if flags & bit:
+                    self.tcp_flag_counts[flag_name] = self.tcp_flag_counts.get(flag_name, 0) + weight
+            if flags & SYN:
+                self.syn += weight
+            if flags & RST:
+                self.rst += weight
+            if flags & ERROR:
+                self.errors += weight
+
+    def record_latency(self, delta_ms: float, bucket: int) -> None:
+        self.latency_sum_ms += delta_ms
+        self.latency_count += 1
+        self.latency_buckets[bucket] += 1
+
+    def merge(self, other: "MetricsDelta") -> None:
+        if other.started is not None and (self.started is None or other.started < self.started):
+            self.started = other.started
+        if other.ended is not None and (self.ended is None or other.ended > self.ended):
+            self.ended = other.ended
+
+        self.packets += other.packets
+        self.bytes += other.bytes
+        self.errors += other.errors
+        self.syn += other.syn
+        self.rst += other.rst
+        self.max_size = max(self.max_size, other.max_size)
+        if other.min_size is not None and (self.min_size is None or other.min_size < self.min_size):
+            self.min_size = other.min_size
+        self.latency_sum_ms += other.latency_sum_ms
+        self.latency_count += other.latency_count
+        self.capture_lag = max(self.capture_lag, other.capture_lag)
+
+        for name, count in other.protocol_counts.items():
+            self.protocol_counts[name] = self.protocol_counts.get(name, 0) + count
+        for name, count in other.tcp_flag_counts.items():
+            self.tcp_flag_counts[name] = self.tcp_flag_counts.get(name, 0) + count
+        self.size_buckets = [a + b for a, b in zip(self.size_buckets, other.size_buckets)]
+        self.latency_buckets = [a + b for a, b in zip(self.latency_buckets, other.latency_buckets)]
+
+        self.src_ip_bytes.merge(other.src_ip_bytes)
+        self.dst_ip_bytes.merge(other.dst_ip_bytes)
+        self.dst_port_counts.merge(other.dst_port_counts)
+        self.src_ips.merge(other.src_ips)
+        self.dst_ips.merge(other.dst_ips)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source, "started": self.started, "ended": self.ended,
+            "packets": self.packets, "bytes": self.bytes, "errors": self.errors,
+            "syn": self.syn, "rst": self.rst, "min_size": self.min_size, "max_size": self.max_size,
+            "latency_sum_ms": self.latency_sum_ms, "latency_count": self.latency_count,
+            "capture_lag": self.capture_lag,
+            "protocol_counts": self.protocol_counts, "tcp_flag_counts": self.tcp_flag_counts,
+            "size_buckets": self.size_buckets, "latency_buckets": self.latency_buckets,
+            "src_ip_bytes": self.src_ip_bytes.to_pairs(), "dst_ip_bytes": self.dst_ip_bytes.to_pairs(),
+            "dst_port_counts": self.dst_port_counts.to_pairs(),
+            "src_ips": self.src_ips.to_dict(), "dst_ips": self.dst_ips.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MetricsDelta":
+        return cls(
+            source=str(data.get("source", "")),
+            started=data.get("started"),
+            ended=data.get("ended"),
+            packets=int(data.get("packets", 0)),
+            bytes=int(data.get("bytes", 0)),
+            errors=int(data.get("errors", 0)),
+            syn=int(data.get("syn", 0)),
+            rst=int(data.get("rst", 0)),
+            min_size=data.get("min_size"),
+            max_size=int(data.get("max_size", 0)),
+            latency_sum_ms=float(data.get("latency_sum_ms", 0.0)),
+            latency_count=int(data.get("latency_count", 0)),
+            capture_lag=float(data.get("capture_lag", 0.0)),
+            protocol_counts={str(k): int(v) for k, v in data.get("protocol_counts", {}).items()},
+            tcp_flag_counts={str(k): int(v) for k, v in data.get("tcp_flag_counts", {}).items()},
+            size_buckets=[int(v) for v in data["size_buckets"]],
+            latency_buckets=[int(v) for v in data["latency_buckets"]],
+            src_ip_bytes=TopK.from_pairs(data.get("src_ip_bytes", [])),
+            dst_ip_bytes=TopK.from_pairs(data.get("dst_ip_bytes", [])),
+            dst_port_counts=TopK.from_pairs(data.get("dst_port_counts", [])),
+            src_ips=HyperLogLog.from_dict(data["src_ips"]),
+            dst_ips=HyperLogLog.from_dict(data["dst_ips"]),
+        )
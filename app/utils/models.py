@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, List, Tuple, Union
 from datetime import datetime
 
 from pyshark.packet.packet import Packet
@@ -9,6 +9,22 @@ class PacketData:
     # use pyshark.packet.packet
     pass
 @dataclass
+class InterfaceMetrics:
+    packets: int = 0
+    bytes: int = 0
+    packet_rate: float = 0.0
+    throughput_bps: float = 0.0
+
+@dataclass
+class ConsumerStats:
+    policy: str = "block"
+    capacity: int = 0
+    backlog: int = 0       # events queued, not yet handed to the consumer
+    delivered: int = 0
+    dropped: int = 0       # discarded by drop_oldest / drop_newest, or by sample when full
+    sampled_out: int = 0   # thinned by the sample policy; survivors carry the weight
+
+@dataclass
 class MetricsSnapshot:
     total_packets_captured: int = 0
     total_data_transfered: int = 0
@@ -39,19 +55,83 @@ class MetricsSnapshot:
     error_packets: int = 0
     anomaly_indicators: Dict[str, bool] = field(default_factory=dict)
 
+    # cumulative histograms keyed by bucket upper bound ("+Inf" holds the total)
+    packet_size_histogram: Dict[str, int] = field(default_factory=dict)
+    latency_histogram: Dict[str, int] = field(default_factory=dict)
+
+    # pipeline instrumentation
+    capture_lag: float = 0.0  # smoothed wall clock - sniff timestamp (milliseconds)
+    interface_breakdown: Dict[str, InterfaceMetrics] = field(default_factory=dict)
+
+    sample_rate: int = 1  # 1-in-N sampling applied to the latest packet, counters are scaled by it
+    ingest_time_avg_us: float = 0.0  # Metrics.update cost per packet (microseconds)
+    consumer_stats: Dict[str, ConsumerStats] = field(default_factory=dict)  # per capture subscriber queue
+
 @dataclass
 class AlertInfo:
     alert_type: str
     message: str
     severity: str
     timestamp: datetime
+    recordings: List[str] = field(default_factory=list)  # pcapng ring segments covering the lead-up
+    snapshot_path: Optional[str] = None  # per-alert capture of the packets around it
 
 @dataclass
 class QueryMessage:
     message: str
 
 @dataclass
-class CaptureConfig:
+class QueryChunk:
+    """A batch of query result rows; the last chunk of a query has `done` set."""
+    columns: List[str]
+    rows: List[Tuple]
+    done: bool = False
+    plan: str = ""            # access path chosen, e.g. "index src (42 rows)"
+    examined: int = 0         # stored packets the plan reads
+    elapsed_ms: float = 0.0
+    stream: int = 0           # chunks of one query share this id
+
+@dataclass
+class LoadProgress:
+    """How far Storage.load has read a saved session; the last report has `done` set."""
+    path: str
+    packets: int = 0          # loaded and visible so far
+    bytes_read: int = 0
+    total_bytes: int = 0
+    done: bool = False
+    error: Optional[str] = None
+    dropped: int = 0          # packets captured during the load past LoadConfig.PENDING_ROWS
+
+    @property
+    def fraction(self) -> float:
+        return self.bytes_read / self.total_bytes if self.total_bytes else 1.0
+
+# a single port or an inclusive (low, high) range
+PortSpec = Union[int, Tuple[int, int]]
+
+@dataclass
+class ProtocolFilter:
     protocol: str
-    port: int
-    interface: Optional[str] = None
\ No newline at end of file
+    ports: List[PortSpec] = field(default_factory=list)  # empty = any port
+
+@dataclass
+class CaptureConfig:
+    protocol: str = "ip"
+    port: int = 0
+    interface: Optional[str] = None
+    interfaces: List[str] = field(default_factory=list)  # several readers merged by timestamp; overrides `interface`
+
+    # richer kernel-side filtering, compiled together by app.utils.bpf.compile_bpf;
+    # when `filters` is empty, `protocol`/`port` act as the single filter
+    filters: List[ProtocolFilter] = field(default_factory=list)
+    include_hosts: List[str] = field(default_factory=list)  # IPs or CIDR subnets
+    exclude_hosts: List[str] = field(default_factory=list)
+    vlans: List[int] = field(default_factory=list)
+
+    # "none" | "count" (1-in-N) | "random" | "flow" (5-tuple hash); see app.utils.sampling
+    sampling: str = "none"
+    sample_rate: int = 1
+    adaptive_sampling: bool = False  # raise/lower sample_rate with pipeline lag
+
+    # tshark also writes raw packets to a pcapng spool so "show packet N" can dissect them later
+    spool: bool = True
@@ -0,0 +1,132 @@
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import InterfaceConfig
+
+_PROC_NET_DEV = Path("/proc/net/dev")
+
+# shared between Capture auto-detection and the GUI interface picker
+_cache_lock = threading.Lock()
+_labels_cache: Optional[Tuple[float, Dict[str, str]]] = None
+_busiest_cache: Optional[Tuple[float, List[str]]] = None
+
+
+def _read_byte_counters() -> Dict[str, int]:
+    """Total rx+tx bytes per interface from one kernel read (psutil, else /proc/net/dev)."""
+    try:
+        import psutil
+
+        return {
+            name: counters.bytes_recv + counters.bytes_sent
+            for name, counters in psutil.net_io_counters(pernic=True).items()
+        }
+    except Exception:
+        pass
+
+    counters: Dict[str, int] = {}
+    try:
+        lines = _PROC_NET_DEV.read_text().splitlines()[2:]
+    except OSError:
+        return counters
+
+    for line in lines:
+        name, _, data = line.partition(":")
+        fields = data.split()
+        if len(fields) >= 9:
+            counters[name.strip()] = int(fields[0]) + int(fields[8])
+    return counters
+
+
+def _up_interfaces() -> Optional[List[str]]:
+    try:
+        import psutil
+
+        return [name for name, stats in psutil.net_if_stats().items() if stats.isup]
+    except Exception:
+        return None
+
+
+def rank_interfaces(interval: float = InterfaceConfig.SAMPLE_SECONDS, use_cache: bool = True) -> List[str]:
+    """
+    Interfaces ordered by bytes moved during `interval`, busiest first.
+
+    All NICs are sampled together: two reads of the kernel counters `interval`
+    seconds apart, so cost does not grow with the number of interfaces. Loopback and
+    idle interfaces are dropped. Non-empty results are cached for `InterfaceConfig.CACHE_SECONDS`.
+    """
+    global _busiest_cache
+
+    now = time.time()
+    with _cache_lock:
+        if use_cache and _busiest_cache is not None and now - _busiest_cache[0] < InterfaceConfig.CACHE_SECONDS:
+            return list(_busiest_cache[1])
+
+    before = _read_byte_counters()
+    time.sleep(interval)
+    after = _read_byte_counters()
+
+    up = _up_interfaces()
+    deltas = {
+        name: after[name] - before.get(name, after[name])
+        for name in after
+        if (up is None or name in up) and not _is_loopback(name)
+    }
+    ranked = [name for name, delta in sorted(deltas.items(), key=lambda item: item[1], reverse=True) if delta > 0]
+
+    if ranked:  # an idle sample is not worth reusing
+        with _cache_lock:
+            _busiest_cache = (time.time(), ranked)
+    return list(ranked)
+
+
+def busiest_interface(interval: float = InterfaceConfig.SAMPLE_SECONDS) -> Optional[str]:
+    ranked = rank_interfaces(interval)
+    return ranked[0] if ranked else None
+
+
+def interface_labels(use_cache: bool = True) -> Dict[str, str]:
+    """Return mapping: human label -> real interface name (active only)."""
+    global _labels_cache
+
+    now = time.time()
+    with _cache_lock:
+        if use_cache and _labels_cache is not None and now - _labels_cache[0] < InterfaceConfig.CACHE_SECONDS:
+            return dict(_labels_cache[1])
+
+    labels: Dict[str, str] = {}
+    try:
+        import psutil
+
+        stats = psutil.net_if_stats()
+        addrs = psutil.net_if_addrs()
+    except Exception:
+        return labels
+
+    for name, st in stats.items():
+        if not st.isup:
+            continue
+
+        ip_list = [a.address for a in addrs.get(name, []) if a.family.name == "AF_INET"] if addrs else []
+        ip_part = f" ({', '.join(ip_list)})" if ip_list else ""
+
+        if "wi-fi" in name.lower() or "wlan" in name.lower():
+            pretty = f"Wi-Fi{name.replace('Wi-Fi', '').replace('wi-fi', '')}{ip_part}"
+        elif "ethernet" in name.lower() or "eth" in name.lower():
+            pretty = f"Ethernet{name.replace('Ethernet', '').replace('ethernet', '')}{ip_part}"
+        elif "loopback" in name.lower():
+            pretty = f"Loopback{ip_part}"
+        else:
+            pretty = f"{name}{ip_part}"
+
+        labels[pretty] = name
+
+    with _cache_lock:
+        _labels_cache = (time.time(), labels)
+    return dict(labels)
+
+
+def _is_loopback(name: str) -> bool:
+    lowered = name.lower()
+    return lowered == "lo" or lowered.startswith("lo0") or "loopback" in lowered
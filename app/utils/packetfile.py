@@ -0,0 +1,107 @@
+import codecs
+import json
+import mmap
+import os
+import re
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from app.config import LoadConfig
+
+# between elements of a JSON array
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def write_packets(target: Path, packets: Iterable[Dict[str, Any]]) -> int:
+    """
+    Write packet dicts as a JSON array with one element per line: still plain JSON for
+    anything that reads the file whole, and line by line for `read_packets`. Goes
+    through a staging file, so an interrupted write never leaves a truncated file.
+    :return: packets written
+    """
+    staging = target.with_name(target.name + ".tmp")
+    count = 0
+    with open(staging, "w", encoding="utf-8") as out:
+        out.write("[")
+        for data in packets:
+            out.write(",\n" if count else "\n")
+            out.write(json.dumps(data, separators=(",", ":")))
+            count += 1
+        out.write("\n]\n")
+    os.replace(staging, target)
+    return count
+
+
+def read_packets(target: Path) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Stream packet dicts from a file written by `write_packets`, from a JSON Lines file
+    or from an older indented JSON array, without reading it whole.
+    :return: (packet dict, bytes of the file consumed so far)
+    """
+    with open(target, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            raise ValueError("storage file is empty")
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            head = view[:LoadConfig.SNIFF_BYTES].lstrip()
+            if head[:1] not in (b"[", b"{"):
+                raise ValueError("storage file must contain a JSON array or JSON lines")
+            lines = head.split(b"\n", 2)
+            one_per_line = head[:1] == b"{" or (len(lines) > 1 and lines[1].strip()[:1] == b"{"
+                                                and lines[1].rstrip().rstrip(b",").endswith(b"}"))
+            yield from (_lines(view) if one_per_line else _elements(view))
+
+
+def _lines(view: mmap.mmap) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    One object per line; array brackets and trailing commas are skipped. Lines are
+    parsed a batch at a time, as one small array, which is far cheaper than per line;
+    a batch that fails is parsed again line by line up to the bad one.
+    """
+    lines = iter(view.readline, b"")
+    while True:
+        batch = [line for line in (line.strip().rstrip(b",") for line in islice(lines, LoadConfig.BATCH_ROWS))
+                 if line not in (b"", b"[", b"]")]
+        if not batch:
+            if view.tell() >= view.size():
+                return
+            continue
+        consumed = view.tell()
+        try:
+            parsed = json.loads(b"[" + b",".join(batch) + b"]")
+        except ValueError:
+            # a damaged or cut line: keep the lines before it, then fail on it
+            parsed = (json.loads(line) for line in batch)
+        for data in parsed:
+            if not isinstance(data, dict):
+                raise ValueError("storage file must contain packet objects")
+            yield data, consumed
+
+
+def _elements(view: mmap.mmap) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """Elements of a JSON array laid out any way, decoded a chunk at a time."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = text.decode(view.read(LoadConfig.CHUNK_BYTES)).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("storage file must contain a JSON array")
+    position = 1
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()
+        if buffer.startswith("]", position):
+            return
+        try:
+            data, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # the element runs past the buffer; read on (a real error fails again at end of file)
+            chunk = view.read(LoadConfig.CHUNK_BYTES)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + text.decode(chunk)
+            position = 0
+            continue
+        if not isinstance(data, dict):
+            raise ValueError("storage file must contain packet objects")
+        # approximate for a progress bar: what was read, less what is still buffered
+        yield data, view.tell() - len(buffer) + end
+        position = end
@@ -0,0 +1,206 @@
+import struct
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+_SHB = 0x0A0D0D0A
+_IDB = 0x00000001
+_OPB = 0x00000002  # obsolete packet block, still written by old tools
+_SPB = 0x00000003
+_EPB = 0x00000006
+_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+_IF_TSRESOL = 9
+
+_PCAP_MAGIC_US = 0xA1B2C3D4
+
+
+@dataclass
+class RawFrame:
+    timestamp: float
+    linktype: int
+    data: bytes
+    original_length: int = 0
+
+
+@dataclass
+class _Interface:
+    linktype: int
+    snaplen: int
+    ticks_per_second: int = 1_000_000
+
+
+class PcapngIndex:
+    """
+    Frame number -> file offset index over a pcapng file that may still be growing
+    (tshark spooling with `-w`). Only blocks appended since the last lookup are scanned,
+    and a partially written trailing block is left for the next call.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._offsets: List[Tuple[int, int]] = []  # frame number - 1 -> (block offset, section id)
+        self._sections: List[Tuple[str, List[_Interface]]] = []  # (struct byte order, interfaces)
+        self._scanned = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._scan()
+            return len(self._offsets)
+
+    def offset(self, frame: int) -> Optional[int]:
+        """File offset of the block holding `frame` (1-based, as tshark numbers frames)."""
+        with self._lock:
+            located = self._locate(frame)
+        return None if located is None else located[0]
+
+    def read(self, frame: int) -> Optional[RawFrame]:
+        with self._lock:
+            located = self._locate(frame)
+            if located is None:
+                return None
+            offset, section = located
+            order, interfaces = self._sections[section]
+            try:
+                with self.path.open("rb") as handle:
+                    handle.seek(offset)
+                    block_type, length = struct.unpack(order + "II", handle.read(8))
+                    return _decode_packet(order, block_type, handle.read(length - 12), interfaces)
+            except OSError:
+                return None  # deleted by retention
+
+    def _locate(self, frame: int) -> Optional[Tuple[int, int]]:
+        if frame < 1:
+            return None
+        if frame > len(self._offsets):
+            self._scan(frame)
+        return self._offsets[frame - 1] if frame <= len(self._offsets) else None
+
+    def _scan(self, until: Optional[int] = None) -> None:
+        """Index blocks appended since the last scan, stopping once `until` frames are known."""
+        try:
+            handle = self.path.open("rb")
+        except OSError:
+            return
+        with handle:
+            handle.seek(self._scanned)
+            while until is None or len(self._offsets) < until:
+                start = handle.tell()
+                header = handle.read(8)
+                if len(header) < 8:
+                    break
+                if header[:4] == b"\x0a\x0d\x0d\x0a":  # SHB, the same in either byte order
+                    magic = handle.read(4)
+                    if len(magic) < 4:
+                        break
+                    order = "<" if struct.unpack("<I", magic)[0] == _BYTE_ORDER_MAGIC else ">"
+                    handle.seek(start + 8)
+                else:
+                    order = self._sections[-1][0] if self._sections else "<"
+                block_type, length = struct.unpack(order + "II", header)
+
+                if length < 12:
+                    raise ValueError(f"{self.path}: corrupt block at offset {start}")
+                body = handle.read(length - 8)
+                if len(body) < length - 8:
+                    break  # block still being written
+
+                if block_type == _SHB:
+                    self._sections.append((order, []))
+                elif block_type == _IDB:
+                    self._sections[-1][1].append(_parse_interface(order, body[:-4]))
+                elif block_type in (_EPB, _SPB, _OPB):
+                    self._offsets.append((start, len(self._sections) - 1))
+                self._scanned = start + length
+
+
+def write_pcap(target: Union[str, Path, BinaryIO], frames: Iterable[RawFrame]) -> int:
+    """
+    Write frames as a classic (microsecond) pcap file; the first frame decides the link type.
+    :return: number of frames written
+    """
+    if isinstance(target, (str, Path)):
+        with open(target, "wb") as handle:
+            return write_pcap(handle, frames)
+
+    count = 0
+    for frame in frames:
+        if count == 0:
+            target.write(struct.pack("<IHHiIII", _PCAP_MAGIC_US, 2, 4, 0, 0, 262144, frame.linktype))
+        seconds = int(frame.timestamp)
+        micros = int(round((frame.timestamp - seconds) * 1_000_000))
+        target.write(struct.pack("<IIII", seconds, micros, len(frame.data), frame.original_length or len(frame.data)))
+        target.write(frame.data)
+        count += 1
+    return count
+
+
+def write_pcapng(target: Union[str, Path, BinaryIO], frames: Iterable[RawFrame]) -> int:
+    """
+    Write frames as a pcapng file with one interface block per link type, so frames
+    from interfaces of different link types keep their own.
+    :return: number of frames written
+    """
+    if isinstance(target, (str, Path)):
+        with open(target, "wb") as handle:
+            return write_pcapng(handle, frames)
+
+    target.write(struct.pack("<IIIHHqI", _SHB, 28, _BYTE_ORDER_MAGIC, 1, 0, -1, 28))
+    interfaces: Dict[int, int] = {}  # link type -> interface id
+    count = 0
+    for frame in frames:
+        interface = interfaces.get(frame.linktype)
+        if interface is None:
+            interface = interfaces[frame.linktype] = len(interfaces)
+            target.write(struct.pack("<IIHHII", _IDB, 20, frame.linktype, 0, 262144, 20))
+        ticks = int(round(frame.timestamp * 1_000_000))
+        padding = -len(frame.data) % 4
+        length = 32 + len(frame.data) + padding
+        target.write(struct.pack("<IIIIIII", _EPB, length, interface, ticks >> 32, ticks & 0xFFFFFFFF,
+                                 len(frame.data), frame.original_length or len(frame.data)))
+        target.write(frame.data + b"\0" * padding)
+        target.write(struct.pack("<I", length))
+        count += 1
+    return count
+
+
+def _parse_interface(order: str, body: bytes) -> _Interface:
+    linktype, _, snaplen = struct.unpack(order + "HHI", body[:8])
+    interface = _Interface(linktype, snaplen)
+    for code, value in _options(order, body[8:]):
+        if code == _IF_TSRESOL and value:
+            resolution = value[0]
+            # high bit set: negative power of two, otherwise negative power of ten
+            interface.ticks_per_second = 2 ** (resolution & 0x7F) if resolution & 0x80 else 10 ** resolution
+    return interface
+
+
+def _options(order: str, data: bytes) -> Iterable[Tuple[int, bytes]]:
+    position = 0
+    while position + 4 <= len(data):
+        code, length = struct.unpack(order + "HH", data[position:position + 4])
+        if code == 0:
+            return
+        yield code, data[position + 4:position + 4 + length]
+        position += 4 + ((length + 3) & ~3)
+
+
+def _decode_packet(order: str, block_type: int, body: bytes, interfaces: List[_Interface]) -> RawFrame:
+    if block_type == _SPB:
+        interface = interfaces[0]
+        original_length = struct.unpack(order + "I", body[:4])[0]
+        captured = min(original_length, interface.snaplen or original_length, len(body) - 4)
+        return RawFrame(0.0, interface.linktype, body[4:4 + captured], original_length)
+
+    if block_type == _EPB:
+        interface_id, ts_high, ts_low, captured, original_length = struct.unpack(order + "IIIII", body[:20])
+        data = body[20:20 + captured]
+    else:  # OPB: 16-bit interface id and drops counter
+        interface_id, _, ts_high, ts_low, captured, original_length = struct.unpack(order + "HHIIII", body[:20])
+        data = body[20:20 + captured]
+
+    interface = interfaces[interface_id]
+    timestamp = ((ts_high << 32) | ts_low) / interface.ticks_per_second
+    return RawFrame(timestamp, interface.linktype, data, original_length)
+
@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from app.config import PipelineConfig
+from app.utils.events import Event, PacketCapturedEvent
+from app.utils.interfaces import Observer
+from app.utils.models import ConsumerStats
+
+POLICIES = ("block", "drop_oldest", "drop_newest", "sample")
+
+
+class BoundedChannel(Observer):
+    """
+    Bounded queue plus delivery thread between a Subject and one slow observer.
+
+    The producer only pays for an enqueue. When the queue is full the policy decides:
+    - block: wait for room (lossless, backpressure reaches the producer)
+    - drop_oldest: discard the oldest queued event (consumer sees the freshest data)
+    - drop_newest: discard the incoming event (consumer sees a contiguous prefix)
+    - sample: above `SAMPLE_HIGH_WATERMARK` keep 1 in `SAMPLE_KEEP_EVERY` packets (and
+      1 in KEEP_EVERY**2, **3 ... as the queue keeps filling), raising their
+      `sample_rate` so weighted counters stay unbiased; drops only when completely full
+    """
+
+    def __init__(self, observer: Observer, name: Optional[str] = None,
+                 capacity: int = PipelineConfig.QUEUE_CAPACITY, policy: str = PipelineConfig.DEFAULT_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown queue policy: {policy!r}")
+        if capacity < 1:
+            raise ValueError("queue capacity must be at least 1")
+
+        self.observer = observer
+        self.name = name or type(observer).__name__.lower()
+        self.policy = policy
+        self.capacity = capacity
+
+        self._queue: Deque[Event] = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        self._delivered = 0
+        self._dropped = 0
+        self._sampled_out = 0
+        self._sample_skip = 0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"pipeline-{self.name}")
+        self._thread.start()
+
+    def stop(self, drain: bool = True, timeout: float = 2.0) -> None:
+        """
+        :param drain: deliver what is still queued before the thread exits
+        """
+        if drain:
+            self.join(timeout)
+        with self._cond:
+            self._running = False
+            self._queue.clear()
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued event has been handed to the observer."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                if not self._running:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def update(self, event: Event) -> None:
+        with self._cond:
+            if self.policy == "sample" and isinstance(event, PacketCapturedEvent):
+                event = self._thin(event)
+                if event is None:
+                    return
+
+            if len(self._queue) >= self.capacity:
+                if self.policy == "block":
+                    while len(self._queue) >= self.capacity and self._running:
+                        self._cond.wait()
+                elif self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self._dropped += 1
+                else:  # drop_newest, or sample with no room left
+                    self._dropped += 1
+                    return
+
+            self._queue.append(event)
+            self._cond.notify_all()
+
+    def stats(self) -> ConsumerStats:
+        with self._cond:
+            return ConsumerStats(
+                policy=self.policy,
+                capacity=self.capacity,
+                backlog=len(self._queue),
+                delivered=self._delivered,
+                dropped=self._dropped,
+                sampled_out=self._sampled_out,
+            )
+
+    def _thin(self, event: PacketCapturedEvent) -> Optional[PacketCapturedEvent]:
+        fill = len(self._queue) / self.capacity
+        if fill < PipelineConfig.SAMPLE_HIGH_WATERMARK:
+            self._sample_skip = 0
+            return event
+
+        # each halving of the remaining headroom multiplies the thinning factor again
+        level = 1
+        headroom = 1.0 - PipelineConfig.SAMPLE_HIGH_WATERMARK
+        while fill >= 1.0 - headroom / 2 and level < PipelineConfig.SAMPLE_MAX_LEVEL:
+            headroom /= 2
+            level += 1
+        keep_every = PipelineConfig.SAMPLE_KEEP_EVERY ** level
+
+        self._sample_skip += 1
+        if self._sample_skip < keep_every:
+            self._sampled_out += 1
+            return None
+        self._sample_skip = 0
+        # the event is shared with the other subscribers, so re-weight a copy
+        thinned = PacketCapturedEvent(event.payload, sample_rate=event.sample_rate * keep_every,
+                                      interface=event.interface, spool=event.spool)
+        thinned._record = event._record
+        return thinned
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                event = self._queue.popleft()
+                self._busy = True
+                self._cond.notify_all()  # room for a blocked producer
+
+            try:
+                self.observer.update(event)
+            except Exception as e:
+                # one failing consumer must not take the delivery thread down
+                print(f"pipeline[{self.name}]: {type(e).__name__}: {e}")
+
+            with self._cond:
+                self._busy = False
+                self._delivered += 1
+                if not self._queue:
+                    self._cond.notify_all()
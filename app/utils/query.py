@@ -0,0 +1,269 @@
+import re
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+from app.utils.timerange import parse_time_range
+
+SOURCES = ("packets", "flows")
+FIELDS = ("time", "length", "protocol", "src", "dst", "host", "src_port", "dst_port", "port", "flags")
+GROUPABLE = ("protocol", "src", "dst", "src_port", "dst_port")
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+_KEYWORDS = ("where", "during", "group", "order", "limit")
+
+Value = Union[int, float, str]
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+@dataclass
+class Comparison:
+    field: str
+    op: str                 # one of OPERATORS, "in" or "between" (two values)
+    values: Tuple[Value, ...]
+
+
+@dataclass
+class Not:
+    operand: "Expression"
+
+
+@dataclass
+class And:
+    operands: List["Expression"]
+
+
+@dataclass
+class Or:
+    operands: List["Expression"]
+
+
+Expression = Union[Comparison, Not, And, Or]
+
+
+@dataclass
+class Query:
+    """
+    packets|flows [where <expr>] [during <time phrase>] [group by f, ...]
+                  [order by column [asc|desc]] [limit n]
+
+    <expr> combines `field op value`, `field in (v, ...)` and `field between a and b`
+    with and/or/not and parentheses. Fields: time, length, protocol, src, dst, host
+    (either address), src_port, dst_port, port (either port) and flags (a TCP flag name).
+    """
+    source: str = "packets"
+    where: Optional[Expression] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
+    group_by: List[str] = field(default_factory=list)
+    order_by: Optional[str] = None
+    descending: bool = False
+    limit: Optional[int] = None
+    text: str = ""
+
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'[^']*'|"[^"]*")
+      | (?P<op><=|>=|!=|=|<|>|\(|\)|,)
+      | (?P<word>[^\s=<>!(),'"]+)
+    )""", re.VERBOSE)
+
+
+def parse_query(text: str) -> Query:
+    """Parse the query language; raises QuerySyntaxError with the offending position."""
+    return _Parser(text).parse()
+
+
+def looks_like_query(text: str) -> bool:
+    words = text.strip().lower().split(None, 1)
+    return bool(words) and words[0] in SOURCES and (len(words) == 1 or words[1].split(None, 1)[0] in _KEYWORDS)
+
+
+def format_row(columns: Sequence[str], row: Sequence[Any]) -> str:
+    """One result row as text: clock times for time columns, "-" for missing values."""
+    cells = []
+    for name, value in zip(columns, row):
+        if value is None:
+            cells.append("-")
+        elif name in ("time", "first", "last"):
+            cells.append(datetime.fromtimestamp(value).strftime("%H:%M:%S.%f")[:-3])
+        else:
+            cells.append(str(value))
+    return "  ".join(cells)
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens: List[Tuple[str, str, int]] = []  # (kind, text, offset)
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if match is None or match.end() == position:
+                raise QuerySyntaxError(f"unexpected character at {position}: {text[position:position + 10]!r}")
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind), match.start(kind)))
+            position = match.end()
+        self.position = 0
+
+    def parse(self) -> Query:
+        query = Query(text=self.text)
+        source = self._word()
+        if source not in SOURCES:
+            raise self._error(f"query must start with {' or '.join(SOURCES)}")
+        query.source = source
+
+        while not self._done():
+            keyword = self._word()
+            if keyword == "where":
+                query.where = self._or()
+            elif keyword == "during":
+                phrase = self._until_keyword()
+                window = parse_time_range(phrase)
+                if window is None:
+                    raise self._error(f"cannot understand time range {phrase!r}")
+                query.start, query.end = window[0], window[1]
+            elif keyword == "group":
+                self._expect_word("by")
+                query.group_by = [self._field(GROUPABLE)]
+                while self._accept(","):
+                    query.group_by.append(self._field(GROUPABLE))
+            elif keyword == "order":
+                self._expect_word("by")
+                query.order_by = self._word()
+                if self._peek_word() in ("asc", "desc"):
+                    query.descending = self._word() == "desc"
+            elif keyword == "limit":
+                limit = self._number()
+                if limit != int(limit) or limit < 1:
+                    raise self._error(f"limit must be a positive whole number, got {limit!r}", back=1)
+                query.limit = int(limit)
+            else:
+                raise self._error(f"unexpected {keyword!r}")
+        return query
+
+    # expressions
+
+    def _or(self) -> Expression:
+        operands = [self._and()]
+        while self._peek_word() == "or":
+            self._word()
+            operands.append(self._and())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def _and(self) -> Expression:
+        operands = [self._not()]
+        while self._peek_word() == "and":
+            self._word()
+            operands.append(self._not())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def _not(self) -> Expression:
+        if self._peek_word() == "not":
+            self._word()
+            return Not(self._not())
+        if self._accept("("):
+            expression = self._or()
+            self._expect(")")
+            return expression
+        return self._comparison()
+
+    def _comparison(self) -> Expression:
+        name = self._field(FIELDS)
+        if self._peek_word() == "in":
+            self._word()
+            self._expect("(")
+            values = [self._value()]
+            while self._accept(","):
+                values.append(self._value())
+            self._expect(")")
+            return Comparison(name, "in", tuple(values))
+        if self._peek_word() == "between":
+            self._word()
+            low = self._value()
+            self._expect_word("and")
+            high = self._value()
+            return Comparison(name, "between", (low, high))
+
+        kind, op, _ = self._next()
+        if kind != "op" or op not in OPERATORS:
+            raise self._error(f"expected a comparison after {name!r}", back=1)
+        return Comparison(name, op, (self._value(),))
+
+    # tokens
+
+    def _value(self) -> Value:
+        kind, text, _ = self._next()
+        if kind == "string":
+            return text[1:-1]
+        if kind != "word":
+            raise self._error(f"expected a value, got {text!r}", back=1)
+        for convert in (int, float):
+            try:
+                return convert(text)
+            except ValueError:
+                pass
+        return text
+
+    def _number(self) -> float:
+        value = self._value()
+        if not isinstance(value, (int, float)):
+            raise self._error(f"expected a number, got {value!r}", back=1)
+        return value
+
+    def _field(self, allowed: Tuple[str, ...]) -> str:
+        name = self._word()
+        if name not in allowed:
+            raise self._error(f"unknown field {name!r}, expected one of {', '.join(allowed)}", back=1)
+        return name
+
+    def _until_keyword(self) -> str:
+        words = []
+        while not self._done() and self._peek_word() not in _KEYWORDS:
+            words.append(self._next()[1])
+        return " ".join(words)
+
+    def _word(self) -> str:
+        kind, text, _ = self._next()
+        if kind != "word":
+            raise self._error(f"expected a word, got {text!r}", back=1)
+        return text.lower()
+
+    def _expect_word(self, word: str) -> None:
+        if self._word() != word:
+            raise self._error(f"expected {word!r}", back=1)
+
+    def _peek_word(self) -> Optional[str]:
+        if self._done():
+            return None
+        kind, text, _ = self.tokens[self.position]
+        return text.lower() if kind == "word" else None
+
+    def _accept(self, op: str) -> bool:
+        if not self._done() and self.tokens[self.position][:2] == ("op", op):
+            self.position += 1
+            return True
+        return False
+
+    def _expect(self, op: str) -> None:
+        if not self._accept(op):
+            raise self._error(f"expected {op!r}")
+
+    def _next(self) -> Tuple[str, str, int]:
+        if self._done():
+            raise QuerySyntaxError("unexpected end of query")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _done(self) -> bool:
+        return self.position >= len(self.tokens)
+
+    def _error(self, message: str, back: int = 0) -> QuerySyntaxError:
+        index = max(self.position - back, 0)
+        offset = self.tokens[index][2] if index < len(self.tokens) else len(self.text)
+        return QuerySyntaxError(f"{message} (at {offset})")
@@ -0,0 +1,173 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.utils.addresses import ADDRESSES
+from app.utils.models import Packet
+
+# TCP flag bits in header order; the remaining bits of PacketRecord.flags are ours
+FIN, SYN, RST, PSH, ACK, URG = 0x01, 0x02, 0x04, 0x08, 0x10, 0x20
+ERROR = 0x100  # malformed or expert-flagged packet
+
+TCP_FLAGS = (("SYN", SYN), ("ACK", ACK), ("FIN", FIN), ("RST", RST), ("PSH", PSH), ("URG", URG))
+
+# protocol ids are process-local; names go on the wire and to disk
+_PROTOCOL_NAMES: List[str] = [
+    "UNKNOWN", "TCP", "UDP", "ICMP", "ICMPV6", "ARP", "DNS", "TLS", "HTTP", "DATA",
+    "QUIC", "SSDP", "MDNS", "DHCP", "NTP", "IGMP", "SSH", "MALFORMED",
+]
+_PROTOCOL_IDS: Dict[str, int] = {name: i for i, name in enumerate(_PROTOCOL_NAMES)}
+_protocol_lock = threading.Lock()
+
+
+def protocol_id(name: str) -> int:
+    """Small integer id for a protocol name, registering unseen names."""
+    pid = _PROTOCOL_IDS.get(name)
+    if pid is None:
+        with _protocol_lock:
+            pid = _PROTOCOL_IDS.get(name)
+            if pid is None:
+                pid = len(_PROTOCOL_NAMES)
+                _PROTOCOL_NAMES.append(name)
+                _PROTOCOL_IDS[name] = pid
+    return pid
+
+
+def protocol_name(pid: int) -> str:
+    return _PROTOCOL_NAMES[pid]
+
+
+def find_protocol(name: str) -> Optional[int]:
+    """Id of a known protocol name (case-insensitive), without registering it."""
+    return _PROTOCOL_IDS.get(name.upper())
+
+
+def protocol_names() -> List[str]:
+    return list(_PROTOCOL_NAMES)
+
+
+def flag_names(flags: int) -> Dict[str, bool]:
+    return {name: bool(flags & bit) for name, bit in TCP_FLAGS}
+
+
+class PacketRecord:
+    """
+    The fields Metrics and Storage need from a pyshark packet, extracted once.
+    Addresses are ids in the shared AddressTable, the protocol a small id and TCP
+    flags a bitmask. The timestamp is rounded to whole microseconds, the precision
+    ColdBlock stores, so a packet compares the same before and after compaction.
+    """
+
+    __slots__ = ("timestamp", "length", "protocol", "src", "dst", "src_port", "dst_port", "flags")
+
+    def __init__(self, timestamp: float, length: int, protocol: int, src: Optional[int], dst: Optional[int],
+                 src_port: Optional[int], dst_port: Optional[int], flags: int = 0):
+        self.timestamp = round(timestamp * 1_000_000) / 1_000_000
+        self.length = length
+        self.protocol = protocol
+        self.src = src
+        self.dst = dst
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.flags = flags
+
+    @property
+    def protocol_name(self) -> str:
+        return _PROTOCOL_NAMES[self.protocol]
+
+    @property
+    def src_ip(self) -> Optional[str]:
+        return ADDRESSES.text(self.src)
+
+    @property
+    def dst_ip(self) -> Optional[str]:
+        return ADDRESSES.text(self.dst)
+
+    @classmethod
+    def from_packet(cls, packet: Packet) -> "PacketRecord":
+        protocol = (
+            getattr(packet, "highest_layer", None)
+            or getattr(packet, "transport_layer", None)
+            or "UNKNOWN"
+        ).upper()
+
+        src = dst = None
+        for layer_name in ("ip", "ipv6"):
+            layer = getattr(packet, layer_name, None)
+            if layer is not None:
+                src = ADDRESSES.intern(getattr(layer, "src", None))
+                dst = ADDRESSES.intern(getattr(layer, "dst", None))
+                break
+
+        src_port = dst_port = None
+        flags = 0
+        for layer_name in ("tcp", "udp"):
+            layer = getattr(packet, layer_name, None)
+            if layer is None:
+                continue
+            src_port = _to_int(
+                getattr(layer, "srcport", None) or getattr(layer, "sport", None) or getattr(layer, "src_port", None)
+            )
+            dst_port = _to_int(
+                getattr(layer, "dstport", None) or getattr(layer, "dport", None) or getattr(layer, "dst_port", None)
+            )
+            if layer_name == "tcp":
+                flags = _tcp_flags(layer)
+            break
+
+        if protocol == "MALFORMED" or getattr(packet, "malformed", None) is not None \
+                or getattr(packet, "expert_message", None):
+            flags |= ERROR
+
+        return cls(_timestamp(packet), _length(packet), protocol_id(protocol), src, dst, src_port, dst_port, flags)
+
+    def __repr__(self) -> str:
+        return (f"PacketRecord({self.timestamp}, {self.length}, {self.protocol_name}, "
+                f"{self.src_ip}:{self.src_port} -> {self.dst_ip}:{self.dst_port}, flags={self.flags:#x})")
+
+
+def _tcp_flags(layer: Any) -> int:
+    # one hex field when tshark provides it, the per-flag fields otherwise
+    raw = getattr(layer, "flags", None)
+    if raw is not None:
+        try:
+            return int(str(raw), 16) & 0x3F
+        except ValueError:
+            pass
+    flags = 0
+    for name, bit in TCP_FLAGS:
+        if str(getattr(layer, f"flags_{name.lower()}", None)) == "1":
+            flags |= bit
+    return flags
+
+
+def _timestamp(packet: Packet) -> float:
+    for attr in ("sniff_timestamp", "sniff_time", "timestamp"):
+        value = getattr(packet, attr, None)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            continue
+    return time.time()
+
+
+def _length(packet: Packet) -> int:
+    for attr in ("captured_length", "length"):
+        value = _to_int(getattr(packet, attr, None))
+        if value:
+            return value
+    frame = getattr(packet, "frame_info", None)
+    if frame is not None:
+        return _to_int(getattr(frame, "len", None)) or 0
+    return 0
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,331 @@
+import bisect
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, ClassVar, Dict, List, Optional, Tuple
+
+from app.config import RecordingConfig
+from app.utils.pcapng import PcapngIndex
+
+# tshark names ring files <stem>_<5-digit sequence>_<YYYYMMDDHHMMSS><suffix>
+_SEGMENT_NAME = re.compile(r"^(?P<stem>.+)_(?P<seq>\d{5,})_(?P<stamp>\d{14})(?P<suffix>\.\w+)?$")
+_INDEX_FILE = "segments.json"
+_TIMESTAMP_SLACK = 1e-3  # tolerance when confirming a frame by its capture time
+
+
+@dataclass
+class Segment:
+    path: str
+    series: str                        # ring base path handed to tshark with -w
+    seq: int
+    start: float                       # first packet's capture time
+    end: Optional[float] = None        # last packet's capture time; None while tshark still writes it
+    first_frame: Optional[int] = None  # tshark frame number of the first packet
+    frames: Optional[int] = None
+    size: int = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.end is not None
+
+    def covers(self, start: float, end: float) -> bool:
+        return self.start <= end and (self.end is None or self.end >= start)
+
+
+class RingRecorder:
+    """
+    Continuous raw-packet recording into a ring of size/time-bounded pcapng segments.
+
+    tshark writes the segments itself (`-w <series> -b filesize:.. -b duration:..`), so
+    packet bytes never pass through Python. The recorder only watches the directory:
+    segments tshark has moved on from are indexed once (time range, frame numbers),
+    retention deletes the oldest closed segments, and the index is kept in
+    `segments.json` next to them so lookups survive a restart.
+
+    One recorder per directory (`RingRecorder.open`); every reader generation of every
+    interface is its own series inside it.
+    """
+
+    _instances: ClassVar[Dict[str, "RingRecorder"]] = {}
+    _instances_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, directory: str,
+                 max_bytes: int = RecordingConfig.MAX_TOTAL_MB * 1024 * 1024,
+                 max_age: float = RecordingConfig.MAX_AGE_SECONDS,
+                 max_files: int = RecordingConfig.MAX_FILES):
+        """
+        :param max_bytes: delete the oldest closed segments beyond this total size - 0; unbounded
+        :param max_age: delete closed segments whose last packet is older - 0; unbounded
+        :param max_files: keep at most this many segments - 0; unbounded
+        """
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_files = max_files
+
+        self._segments: List[Segment] = []  # sorted by start
+        self._starts: List[float] = []
+        self._by_path: Dict[str, Segment] = {}
+        self._longest = 0.0                 # longest closed segment, bounds the lookup scan
+        self._active: set = set()           # series tshark may still be writing
+        self._indexes: Dict[str, PcapngIndex] = {}  # frame lookups into segments
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._on_remove: List[Callable[[str], None]] = []
+        self._load()
+
+    @classmethod
+    def open(cls, directory: str = RecordingConfig.DIRECTORY) -> "RingRecorder":
+        """Shared recorder for `directory`, so capture and detail lookups see one index."""
+        key = os.path.abspath(directory)
+        with cls._instances_lock:
+            recorder = cls._instances.get(key)
+            if recorder is None:
+                recorder = cls._instances[key] = cls(key)
+            return recorder
+
+    @staticmethod
+    def tshark_parameters() -> List[str]:
+        parameters = []
+        if RecordingConfig.SEGMENT_MAX_MB:
+            parameters += ["-b", f"filesize:{RecordingConfig.SEGMENT_MAX_MB * 1000}"]  # tshark counts kB
+        if RecordingConfig.SEGMENT_MAX_SECONDS:
+            parameters += ["-b", f"duration:{int(RecordingConfig.SEGMENT_MAX_SECONDS)}"]
+        return parameters
+
+    def new_series(self, name: str) -> str:
+        """
+        :param name: interface name, sanitized into the file names
+        :return: base path to hand tshark with -w
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9.-]", "-", name)
+        series = os.path.join(self.directory, f"{safe_name}-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{next(self._seq)}.pcapng")
+        with self._lock:
+            self._active.add(series)
+        return series
+
+    def finish(self, series: str) -> None:
+        """tshark stopped writing `series`; its last segment can be indexed."""
+        with self._lock:
+            self._active.discard(series)
+        self.refresh()
+
+    def on_remove(self, callback: Callable[[str], None]) -> None:
+        """Call `callback(path)` for every segment retention deletes."""
+        self._on_remove.append(callback)
+
+    def start(self, interval: float = RecordingConfig.REFRESH_SECONDS) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True, name="ring-recorder")
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.refresh()
+
+    def segments(self, start: float, end: float) -> List[Segment]:
+        """Segments holding packets captured between `start` and `end` (epoch seconds), oldest first."""
+        with self._lock:
+            self._observe()
+            high = bisect.bisect_right(self._starts, end)
+            low = bisect.bisect_left(self._starts, start - self._longest, 0, high)
+            found = [segment for segment in self._segments[low:high] if segment.covers(start, end)]
+            # open segments can be arbitrarily old if their series went quiet
+            found += [segment for segment in self._segments[:low] if not segment.closed and segment.covers(start, end)]
+        found.sort(key=lambda segment: segment.start)
+        return found
+
+    def locate(self, series: str, frame: int, timestamp: Optional[float] = None) -> Optional[Tuple[str, int]]:
+        """
+        Map tshark's frame number in a series to (segment path, frame number within that file).
+        :param timestamp: the packet's capture time, used to pick and confirm the segment
+        """
+        with self._lock:
+            self._observe()
+            candidates = [segment for segment in self._segments if segment.series == series]
+        if timestamp is not None:
+            candidates = [segment for segment in candidates if segment.covers(timestamp, timestamp)] or candidates
+
+        for segment in candidates:
+            local_frames = []
+            if segment.first_frame is not None and frame >= segment.first_frame:
+                local_frames.append(frame - segment.first_frame + 1)  # numbering continues across files
+            if frame not in local_frames:
+                local_frames.append(frame)  # numbering restarts per file
+            for local in local_frames:
+                if segment.frames is not None and local > segment.frames:
+                    continue
+                if timestamp is None or self._frame_time_matches(segment.path, local, timestamp):
+                    return segment.path, local
+        return None
+
+    def _frame_time_matches(self, path: str, frame: int, timestamp: float) -> bool:
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is None:
+                index = self._indexes[path] = PcapngIndex(path)
+        raw = index.read(frame)
+        return raw is not None and abs(raw.timestamp - timestamp) <= _TIMESTAMP_SLACK
+
+    def refresh(self) -> List[str]:
+        """
+        Index newly closed segments and apply retention.
+        :return: paths deleted by retention
+        """
+        with self._lock:
+            self._observe()
+            removed = self._apply_retention()
+            self._save()
+        for path in removed:
+            for callback in self._on_remove:
+                callback(path)
+        return removed
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"RingRecorder: refresh failed: {e}")
+
+    def _observe(self) -> None:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+
+        latest: Dict[str, int] = {}
+        found: List[Tuple[str, str, int, str]] = []
+        for name in names:
+            match = _SEGMENT_NAME.match(name)
+            if match is None:
+                continue
+            series = os.path.join(self.directory, match["stem"] + (match["suffix"] or ""))
+            seq = int(match["seq"])
+            found.append((os.path.join(self.directory, name), series, seq, match["stamp"]))
+            latest[series] = max(seq, latest.get(series, 0))
+
+        changed = False
+        for path, series, seq, stamp in sorted(found, key=lambda item: (item[1], item[2])):
+            segment = self._by_path.get(path)
+            if segment is None:
+                segment = Segment(path, series, seq, time.mktime(time.strptime(stamp, "%Y%m%d%H%M%S")))
+                self._add(segment)
+                changed = True
+            if segment.closed:
+                continue
+            writing = series in self._active and seq == latest[series]
+            if not writing:
+                self._close(segment)
+                changed = True
+            else:
+                self._peek(segment)
+
+        if changed:
+            self._resort()
+
+    def _peek(self, segment: Segment) -> None:
+        """Refine an open segment's start from its first packet once one is on disk."""
+        first = PcapngIndex(segment.path).read(1)
+        if first is not None and first.timestamp:
+            segment.start = first.timestamp
+        self._number(segment)
+
+    def _number(self, segment: Segment) -> None:
+        if segment.first_frame is not None:
+            return
+        if segment.seq == 1:
+            segment.first_frame = 1
+            return
+        previous = next((other for other in self._segments
+                         if other.series == segment.series and other.seq == segment.seq - 1), None)
+        if previous is not None and previous.first_frame is not None and previous.frames is not None:
+            segment.first_frame = previous.first_frame + previous.frames
+
+    def _close(self, segment: Segment) -> None:
+        index = PcapngIndex(segment.path)
+        frames = len(index)
+        first, last = index.read(1), index.read(frames)
+        if first is not None and first.timestamp:
+            segment.start = first.timestamp
+        segment.end = last.timestamp if last is not None and last.timestamp else segment.start
+        segment.frames = frames
+        try:
+            segment.size = os.path.getsize(segment.path)
+        except OSError:
+            pass
+        self._number(segment)
+        self._longest = max(self._longest, segment.end - segment.start)
+
+    def _apply_retention(self) -> List[str]:
+        closed = sorted((segment for segment in self._segments if segment.closed), key=lambda segment: segment.end)
+        total = sum(segment.size for segment in self._segments)
+        count = len(self._segments)
+        cutoff = time.time() - self.max_age if self.max_age else None
+
+        removed = []
+        for segment in closed:
+            if not ((self.max_bytes and total > self.max_bytes)
+                    or (self.max_files and count > self.max_files)
+                    or (cutoff is not None and segment.end < cutoff)):
+                break
+            try:
+                os.remove(segment.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"RingRecorder: cannot delete {segment.path}: {e}")
+                continue
+            total -= segment.size
+            count -= 1
+            del self._by_path[segment.path]
+            self._indexes.pop(segment.path, None)
+            removed.append(segment.path)
+
+        if removed:
+            self._segments = [segment for segment in self._segments if segment.path in self._by_path]
+            self._resort()
+        return removed
+
+    def _add(self, segment: Segment) -> None:
+        self._by_path[segment.path] = segment
+        self._segments.append(segment)
+
+    def _resort(self) -> None:
+        self._segments.sort(key=lambda segment: segment.start)
+        self._starts = [segment.start for segment in self._segments]
+
+    def _load(self) -> None:
+        try:
+            with open(os.path.join(self.directory, _INDEX_FILE), "r", encoding="utf-8") as handle:
+                entries = json.load(handle)
+        except (OSError, ValueError):
+            return
+        for entry in entries:
+            segment = Segment(**entry)
+            if segment.closed and os.path.exists(segment.path):
+                self._add(segment)
+                self._longest = max(self._longest, segment.end - segment.start)
+        self._resort()
+
+    def _save(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        target = os.path.join(self.directory, _INDEX_FILE)
+        temp = target + ".tmp"
+        with open(temp, "w", encoding="utf-8") as handle:
+            json.dump([asdict(segment) for segment in self._segments if segment.closed], handle)
+        os.replace(temp, target)
@@ -0,0 +1,214 @@
+import bisect
+import heapq
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.config import HistoryConfig
+from app.utils.record import PacketRecord
+
+MINUTE = 60
+HOUR = 3600
+
+# dimensions kept per bucket, each as packets and bytes per key
+DIMENSIONS = ("protocol", "src", "dst", "dst_port")
+
+
+class RollupBucket:
+    """Traffic aggregated over [start, start + width): totals plus per-key packets and bytes."""
+
+    __slots__ = (
+        "start", "width", "packets", "bytes",
+        "protocol_packets", "protocol_bytes", "src_packets", "src_bytes",
+        "dst_packets", "dst_bytes", "dst_port_packets", "dst_port_bytes",
+        "truncated",
+    )
+
+    def __init__(self, start: int, width: int):
+        self.start = start
+        self.width = width
+        self.packets = 0
+        self.bytes = 0
+        self.protocol_packets: Dict[int, int] = defaultdict(int)
+        self.protocol_bytes: Dict[int, int] = defaultdict(int)
+        self.src_packets: Dict[int, int] = defaultdict(int)
+        self.src_bytes: Dict[int, int] = defaultdict(int)
+        self.dst_packets: Dict[int, int] = defaultdict(int)
+        self.dst_bytes: Dict[int, int] = defaultdict(int)
+        self.dst_port_packets: Dict[int, int] = defaultdict(int)
+        self.dst_port_bytes: Dict[int, int] = defaultdict(int)
+        self.truncated = False  # lightest keys were dropped; absent keys are unknown, not zero
+
+    @property
+    def end(self) -> int:
+        return self.start + self.width
+
+    def add(self, record: PacketRecord, weight: int) -> None:
+        volume = max(record.length, 0) * weight
+        self.packets += weight
+        self.bytes += volume
+        self.protocol_packets[record.protocol] += weight
+        self.protocol_bytes[record.protocol] += volume
+        if record.src is not None:
+            self.src_packets[record.src] += weight
+            self.src_bytes[record.src] += volume
+        if record.dst is not None:
+            self.dst_packets[record.dst] += weight
+            self.dst_bytes[record.dst] += volume
+        if record.dst_port is not None:
+            self.dst_port_packets[record.dst_port] += weight
+            self.dst_port_bytes[record.dst_port] += volume
+
+    def fold(self, other: "RollupBucket") -> None:
+        self.packets += other.packets
+        self.bytes += other.bytes
+        for dimension in DIMENSIONS:
+            for suffix in ("_packets", "_bytes"):
+                target = getattr(self, dimension + suffix)
+                for key, value in getattr(other, dimension + suffix).items():
+                    target[key] += value
+
+    def prune(self, max_keys: int) -> None:
+        for dimension in DIMENSIONS:
+            packets: Dict[int, int] = getattr(self, dimension + "_packets")
+            if len(packets) <= max_keys:
+                continue
+            volumes: Dict[int, int] = getattr(self, dimension + "_bytes")
+            keep = set(heapq.nlargest(max_keys, volumes, key=volumes.__getitem__))
+            setattr(self, dimension + "_packets", defaultdict(int, {k: v for k, v in packets.items() if k in keep}))
+            setattr(self, dimension + "_bytes", defaultdict(int, {k: v for k, v in volumes.items() if k in keep}))
+            self.truncated = True
+
+    def count(self, dimension: str, key: int, measure: str = "packets") -> Optional[int]:
+        """Packets (or bytes) for one key; None when the key may have been pruned."""
+        values = getattr(self, f"{dimension}_{measure}")
+        value = values.get(key)
+        if value is None:
+            return None if self.truncated else 0
+        return value
+
+
+class Rollups:
+    """
+    Pre-aggregated traffic history: one bucket per minute, folded into one bucket per
+    hour as minutes close. Fed by Metrics with the same sampling weights as its counters,
+    so sums over buckets are estimates of the captured traffic.
+
+    `cover()` answers a time range with the fewest buckets: whole hours where they
+    are complete, minutes at the edges.
+    """
+
+    def __init__(self, minute_retention: float = HistoryConfig.MINUTE_RETENTION_SECONDS,
+                 hour_retention: float = HistoryConfig.HOUR_RETENTION_SECONDS,
+                 max_keys: int = HistoryConfig.MAX_KEYS_PER_BUCKET):
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        self.max_keys = max_keys
+
+        self._minutes: Dict[int, RollupBucket] = {}
+        self._hours: Dict[int, RollupBucket] = {}
+        self._minute_order: Deque[int] = deque()
+        self._hour_order: Deque[int] = deque()
+        self._current: Optional[RollupBucket] = None  # open minute, not folded yet
+        self._lock = threading.Lock()
+
+    def add(self, record: PacketRecord, weight: int = 1) -> None:
+        timestamp = int(record.timestamp)
+        start = timestamp - timestamp % MINUTE
+        with self._lock:
+            current = self._current
+            if current is not None and current.start == start:
+                current.add(record, weight)
+            elif current is None or start > current.start:
+                if current is not None:
+                    self._close(current)
+                current = self._current = RollupBucket(start, MINUTE)
+                self._minutes[start] = current
+                self._minute_order.append(start)
+                current.add(record, weight)
+                self._expire(start)
+            else:
+                self._add_late(start, record, weight)
+
+    def bounds(self) -> Optional[Tuple[int, int]]:
+        """(oldest bucket start, end of the open minute), None before the first packet."""
+        with self._lock:
+            if self._current is None:
+                return None
+            oldest = self._minute_order[0]
+            if self._hour_order:
+                oldest = min(oldest, self._hour_order[0])
+            return oldest, self._current.end
+
+    def buckets(self, hours: bool = False) -> List[RollupBucket]:
+        """Every retained minute (or hour) bucket, oldest first; the last minute is still open."""
+        with self._lock:
+            if hours:
+                return [self._hours[start] for start in self._hour_order]
+            return [self._minutes[start] for start in self._minute_order]
+
+    def cover(self, start: float, end: float) -> List[RollupBucket]:
+        """Buckets covering [start, end) at minute resolution, whole hours where possible."""
+        first = int(start) - int(start) % MINUTE
+        buckets: List[RollupBucket] = []
+        with self._lock:
+            if self._current is None:
+                return buckets
+            sealed = self._current.start - self._current.start % HOUR  # hours before this are complete
+            moment = first
+            while moment < end:
+                if moment % HOUR == 0 and moment + HOUR <= end and moment < sealed:
+                    hour = self._hours.get(moment)
+                    if hour is not None:
+                        buckets.append(hour)
+                    moment += HOUR
+                    continue
+                minute = self._minutes.get(moment)
+                if minute is not None:
+                    buckets.append(minute)
+                elif self._minute_order and moment < self._minute_order[0]:
+                    # minutes this old have expired; their hour stands in for the rest of it
+                    hour = self._hours.get(moment - moment % HOUR)
+                    if hour is not None:
+                        buckets.append(hour)
+                        moment = hour.end
+                    else:
+                        moment = min(moment - moment % HOUR + HOUR, self._minute_order[0])
+                    continue
+                moment += MINUTE
+        return buckets
+
+    def _close(self, minute: RollupBucket) -> None:
+        hour_start = minute.start - minute.start % HOUR
+        hour = self._hours.get(hour_start)
+        if hour is None:
+            # the previous hour is complete now; bound its key sets
+            if self._hour_order:
+                self._hours[self._hour_order[-1]].prune(self.max_keys)
+            hour = self._hours[hour_start] = RollupBucket(hour_start, HOUR)
+            self._hour_order.append(hour_start)
+        hour.fold(minute)
+
+    def _add_late(self, start: int, record: PacketRecord, weight: int) -> None:
+        if start < self._minute_order[0]:
+            return  # older than retention
+        minute = self._minutes.get(start)
+        if minute is None:
+            minute = self._minutes[start] = RollupBucket(start, MINUTE)
+            self._minute_order.insert(bisect.bisect_left(self._minute_order, start), start)
+        minute.add(record, weight)
+
+        # closed minutes are already folded into their hour
+        hour_start = start - start % HOUR
+        hour = self._hours.get(hour_start)
+        if hour is None:
+            hour = self._hours[hour_start] = RollupBucket(hour_start, HOUR)
+            self._hour_order.insert(bisect.bisect_left(self._hour_order, hour_start), hour_start)
+        hour.add(record, weight)
+
+    def _expire(self, now: int) -> None:
+        while self._minute_order and self._minute_order[0] < now - self.minute_retention:
+            del self._minutes[self._minute_order.popleft()]
+        while self._hour_order and self._hour_order[0] < now - self.hour_retention:
+            del self._hours[self._hour_order.popleft()]
+
@@ -0,0 +1,140 @@
+import random
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from app.config import SamplingConfig
+from app.utils.models import CaptureConfig, Packet
+
+SAMPLING_MODES = ("none", "count", "random", "flow")
+
+
+class Sampler(ABC):
+    """Decides which captured packets reach observers; keeps roughly 1 in `rate`."""
+
+    def __init__(self, rate: int = 1):
+        if rate < 1:
+            raise ValueError("sample rate must be at least 1")
+        self.rate = rate
+
+    @abstractmethod
+    def accept(self, packet: Packet) -> bool:
+        pass
+
+
+class CountSampler(Sampler):
+    """Deterministic 1-in-N."""
+
+    def __init__(self, rate: int = 1):
+        super().__init__(rate)
+        self._seen = 0
+
+    def accept(self, packet: Packet) -> bool:
+        self._seen += 1
+        if self._seen >= self.rate:
+            self._seen = 0
+            return True
+        return False
+
+
+class RandomSampler(Sampler):
+    """Each packet kept independently with probability 1/N."""
+
+    def __init__(self, rate: int = 1, seed: Optional[int] = None):
+        super().__init__(rate)
+        self._random = random.Random(seed)
+
+    def accept(self, packet: Packet) -> bool:
+        return self.rate == 1 or self._random.random() * self.rate < 1.0
+
+
+class FlowHashSampler(Sampler):
+    """
+    Keeps whole flows: a packet is kept when the hash of its direction-independent
+    5-tuple is divisible by N. With power-of-two rates the flows kept at 2N are a
+    subset of those kept at N, so adaptive rate changes never resurrect dropped flows.
+    """
+
+    def accept(self, packet: Packet) -> bool:
+        if self.rate == 1:
+            return True
+        return self.flow_hash(packet) % self.rate == 0
+
+    @staticmethod
+    def flow_hash(packet: Packet) -> int:
+        src = dst = ""
+        for layer_name in ("ip", "ipv6"):
+            layer = getattr(packet, layer_name, None)
+            if layer is not None:
+                src, dst = str(getattr(layer, "src", "")), str(getattr(layer, "dst", ""))
+                break
+
+        transport = getattr(packet, "transport_layer", None) or ""
+        sport = dport = ""
+        layer = getattr(packet, transport.lower(), None) if transport else None
+        if layer is not None:
+            sport, dport = str(getattr(layer, "srcport", "")), str(getattr(layer, "dstport", ""))
+
+        a, b = sorted(((src, sport), (dst, dport)))
+        return zlib.crc32(f"{transport}|{a[0]}|{a[1]}|{b[0]}|{b[1]}".encode("utf-8"))
+
+
+class AdaptiveSampler(Sampler):
+    """
+    Wraps another sampler and doubles its rate while capture lag (wall clock minus
+    sniff timestamp) stays above `SamplingConfig.LAG_HIGH_MS`, halving it back down to
+    the configured floor once lag falls below `LAG_LOW_MS`.
+    """
+
+    def __init__(self, inner: Sampler):
+        super().__init__(inner.rate)
+        self.inner = inner
+        self.min_rate = inner.rate
+        self._next_adjust = time.time() + SamplingConfig.ADJUST_INTERVAL_SECONDS
+
+    def accept(self, packet: Packet) -> bool:
+        now = time.time()
+        if now >= self._next_adjust:
+            self._next_adjust = now + SamplingConfig.ADJUST_INTERVAL_SECONDS
+            self._adjust(now, packet)
+        return self.inner.accept(packet)
+
+    def _adjust(self, now: float, packet: Packet) -> None:
+        try:
+            lag_ms = (now - float(getattr(packet, "sniff_timestamp"))) * 1000.0
+        except (AttributeError, TypeError, ValueError):
+            return
+
+        if lag_ms > SamplingConfig.LAG_HIGH_MS:
+            self.inner.rate = min(self.inner.rate * 2, SamplingConfig.MAX_RATE)
+        elif lag_ms < SamplingConfig.LAG_LOW_MS:
+            self.inner.rate = max(self.inner.rate // 2, self.min_rate)
+        self.rate = self.inner.rate
+
+
+def make_sampler(config: CaptureConfig) -> Optional[Sampler]:
+    """
+    Build the sampler described by `config`, or None when every packet is kept.
+    A `sample_rate` above 1 without a mode means 1-in-N counting.
+    """
+    mode = (config.sampling or "none").lower()
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"unknown sampling mode: {config.sampling!r}")
+    if not 1 <= config.sample_rate <= SamplingConfig.MAX_RATE:
+        raise ValueError(f"sample rate must be between 1 and {SamplingConfig.MAX_RATE}")
+
+    if mode == "none" and config.sample_rate > 1:
+        mode = "count"
+    if mode == "none" and not config.adaptive_sampling:
+        return None
+
+    if mode == "random":
+        sampler: Sampler = RandomSampler(config.sample_rate)
+    elif mode == "flow":
+        sampler = FlowHashSampler(config.sample_rate)
+    else:
+        # adaptive without an explicit mode starts from 1-in-1 counting
+        sampler = CountSampler(config.sample_rate if mode == "count" else 1)
+
+    return AdaptiveSampler(sampler) if config.adaptive_sampling else sampler
@@ -0,0 +1,112 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
+
+# (pixel column, lowest value, highest value)
+Column = Tuple[int, float, float]
+
+
+class _Level:
+    """Min/max of runs of 2**k samples: start time of each run, plus the run still filling."""
+
+    __slots__ = ("times", "lows", "highs", "open")
+
+    def __init__(self):
+        self.times = array("d")
+        self.lows = array("d")
+        self.highs = array("d")
+        self.open: Optional[List[float]] = None  # [start, low, high] of a half-built run
+
+    def trim(self, keep: int) -> None:
+        """Drop the oldest runs once twice `keep` have piled up (amortized O(1) per append)."""
+        if len(self.times) > 2 * keep:
+            cut = len(self.times) - keep
+            del self.times[:cut]
+            del self.lows[:cut]
+            del self.highs[:cut]
+
+
+class TimeSeries:
+    """
+    Samples of one metric over time, with a min/max pyramid for drawing.
+
+    Level 0 holds the samples, level k the min and max of each run of 2**k of them,
+    built as samples arrive. `decimate` reads the coarsest level that still has at
+    least one run per pixel, so the cost of a redraw depends on the chart width and
+    not on how many hours of history it shows, and spikes survive any zoom.
+    """
+
+    def __init__(self, capacity: int, levels: int = 12):
+        """
+        :param capacity: samples kept at level 0; coarser levels keep the same time span
+        :param levels: pyramid height, level `levels - 1` merges 2**(levels - 1) samples
+        """
+        self.capacity = capacity
+        self.version = 0  # bumped by every append, so a chart can tell it has nothing new to draw
+        self._levels = [_Level() for _ in range(levels)]
+
+    def __len__(self) -> int:
+        level = self._levels[0]
+        return min(len(level.times), self.capacity)
+
+    @property
+    def last(self) -> Optional[Tuple[float, float]]:
+        level = self._levels[0]
+        if not level.times:
+            return None
+        return level.times[-1], level.highs[-1]
+
+    def append(self, timestamp: float, value: float) -> None:
+        self.version += 1
+        levels = self._levels
+        self._close(levels[0], 0, timestamp, value, value)
+        start, low, high = timestamp, value, value
+        for k in range(1, len(levels)):
+            level = levels[k]
+            current = level.open
+            if current is None:
+                level.open = [start, low, high]
+                return
+            # the second run of the level below completes one here; carry it up
+            level.open = None
+            start, low, high = current[0], min(current[1], low), max(current[2], high)
+            self._close(level, k, start, low, high)
+
+    def decimate(self, start: float, end: float, width: int, interval: float) -> List[Column]:
+        """
+        Min and max per pixel column of the samples in [start, end], for a chart `width`
+        pixels wide; empty columns are left out.
+        :param interval: seconds between samples, to pick the pyramid level
+        """
+        if width <= 0 or end <= start:
+            return []
+        per_pixel = (end - start) / interval / width
+        k = min(max(int(math.log2(per_pixel)), 0) if per_pixel >= 1 else 0, len(self._levels) - 1)
+        level = self._levels[k]
+        times, lows, highs = level.times, level.lows, level.highs
+        scale = width / (end - start)
+
+        columns: List[Column] = []
+        for i in range(bisect_left(times, start), bisect_right(times, end)):
+            _merge(columns, min(int((times[i] - start) * scale), width - 1), lows[i], highs[i])
+        # samples not yet in a closed run of this level
+        for fine in range(k, 0, -1):
+            current = self._levels[fine].open
+            if current is not None and start <= current[0] <= end:
+                _merge(columns, min(int((current[0] - start) * scale), width - 1), current[1], current[2])
+        return columns
+
+    def _close(self, level: _Level, k: int, start: float, low: float, high: float) -> None:
+        level.times.append(start)
+        level.lows.append(low)
+        level.highs.append(high)
+        level.trim(max(self.capacity >> k, 1))
+
+
+def _merge(columns: List[Column], x: int, low: float, high: float) -> None:
+    if columns and columns[-1][0] == x:
+        _, previous_low, previous_high = columns[-1]
+        columns[-1] = (x, min(previous_low, low), max(previous_high, high))
+    else:
+        columns.append((x, low, high))
@@ -0,0 +1,278 @@
+import os
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional; only Arrow/Parquet export needs it
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:  # optional; only numpy_columns needs it
+    numpy = None
+
+from app.config import TableConfig
+from app.utils.addresses import ADDRESSES
+from app.utils.cancel import CancelToken
+from app.utils.columnar import DecodedBlock
+from app.utils.record import protocol_name
+from app.utils.rollup import DIMENSIONS, RollupBucket
+
+# DecodedBlock columns, in export order
+_PACKET_COLUMNS = ("time", "length", "protocol", "src", "dst", "src_port", "dst_port", "flags", "spool", "frame")
+
+# file suffix -> writer
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+
+# query-language result columns with a fixed type, so every batch of an export agrees
+_ROW_TYPES = {
+    "no": "int64", "length": "int64", "packets": "int64", "bytes": "int64",
+    "src_port": "int64", "dst_port": "int64",
+    "protocol": "string", "src": "string", "dst": "string",
+    "time": "timestamp", "first": "timestamp", "last": "timestamp",
+}
+
+
+def table_format(path: Any) -> str:
+    """"parquet" or "arrow", from the file suffix."""
+    suffix = Path(path).suffix.lower()
+    if suffix not in FORMATS:
+        raise ValueError(f"cannot tell the export format of {path}; use .parquet or .arrow")
+    return FORMATS[suffix]
+
+
+def require_pyarrow() -> None:
+    if pyarrow is None:
+        raise ImportError("Arrow/Parquet export requires pyarrow (pip install pyarrow)")
+
+
+def numpy_columns(block: DecodedBlock) -> Dict[str, "numpy.ndarray"]:
+    """
+    NumPy arrays over the block's columns without copying them (read-only). Codes
+    and -1 sentinels are as in `DecodedBlock.column`.
+    """
+    if numpy is None:
+        raise ImportError("numpy_columns requires numpy")
+    views = {}
+    for name in _PACKET_COLUMNS:
+        column = block.column(name)
+        view = numpy.frombuffer(column, dtype=numpy.dtype(column.typecode))
+        view.flags.writeable = False
+        views[name] = view
+    return views
+
+
+def record_batch(block: DecodedBlock) -> "pyarrow.RecordBatch":
+    """
+    One block of packets as an Arrow record batch. Time, length and flags share the
+    block's memory; codes are resolved to strings and -1 sentinels to nulls.
+    """
+    require_pyarrow()
+    info = block.block
+    rows = info.rows
+    addresses = pyarrow.array([ADDRESSES.text(aid) for aid in info.addresses], pyarrow.string())
+    summaries = info.summaries
+    arrays = [
+        _shared(block.column("time"), pyarrow.timestamp("us", tz="UTC")),
+        _shared(block.column("length")),
+        pyarrow.array([protocol_name(pid) for pid in info.protocols], pyarrow.string())
+        .take(_shared(block.column("protocol"))),
+        addresses.take(_shared(block.column("src"))),
+        addresses.take(_shared(block.column("dst"))),
+        _nullable(block.column("src_port")),
+        _nullable(block.column("dst_port")),
+        _shared(block.column("flags")),
+        pyarrow.array(info.spools, pyarrow.string()).take(_shared(block.column("spool"))),
+        _nullable(block.column("frame")),
+        pyarrow.array([summaries.get(row) for row in range(rows)], pyarrow.string()) if summaries
+        else pyarrow.nulls(rows, pyarrow.string()),
+    ]
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=packet_schema())
+
+
+def packet_schema() -> "pyarrow.Schema":
+    require_pyarrow()
+    return pyarrow.schema([
+        ("time", pyarrow.timestamp("us", tz="UTC")),
+        ("length", _int_type(array("l"))),
+        ("protocol", pyarrow.string()),
+        ("src", pyarrow.string()),
+        ("dst", pyarrow.string()),
+        ("src_port", pyarrow.int32()),
+        ("dst_port", pyarrow.int32()),
+        ("flags", pyarrow.uint16()),
+        ("spool", pyarrow.string()),
+        ("frame", pyarrow.int64()),
+        ("summary", pyarrow.string()),
+    ])
+
+
+def packet_table(blocks: Iterable[DecodedBlock]) -> "pyarrow.Table":
+    """
+    An in-memory Arrow table over `StorageSnapshot.column_blocks()`, e.g. for
+    `packet_table(storage.snapshot().column_blocks()).to_pandas()`.
+    """
+    return pyarrow.Table.from_batches([record_batch(block) for block in blocks], schema=packet_schema())
+
+
+def export_packets(blocks: Iterable[DecodedBlock], path: Any, token: Optional[CancelToken] = None) -> int:
+    """
+    Write stored packets to `path` (.parquet or .arrow), one block in memory at a time.
+    :param blocks: `StorageSnapshot.column_blocks()`
+    :param token: checked between blocks
+    :return: rows written
+    """
+    require_pyarrow()
+
+    def batches() -> Iterator["pyarrow.RecordBatch"]:
+        for block in blocks:
+            if token is not None:
+                token.check()
+            yield record_batch(block)
+
+    return _write(path, packet_schema(), batches())
+
+
+def export_rows(columns: Sequence[str], chunks: Iterable[Sequence[Tuple[Any, ...]]], path: Any,
+                token: Optional[CancelToken] = None) -> int:
+    """
+    Write query-language results (QueryChunk rows: flows, groups or packets) to `path`.
+    :param columns: result column names, as in QueryChunk.columns
+    :param chunks: row lists, written as they arrive
+    :return: rows written
+    """
+    require_pyarrow()
+    schema = pyarrow.schema([(name, _row_type(name)) for name in columns])
+
+    def batches() -> Iterator["pyarrow.RecordBatch"]:
+        for rows in chunks:
+            if token is not None:
+                token.check()
+            if rows:
+                yield _rows_batch(schema, rows)
+
+    return _write(path, schema, batches())
+
+
+def export_rollups(buckets: Iterable[RollupBucket], path: Any) -> int:
+    """
+    Write metric history to `path`, one row per bucket, dimension and key, plus a
+    "total" row per bucket.
+    :param buckets: `Rollups.buckets()`, or `Rollups.buckets(hours=True)`
+    :return: rows written
+    """
+    require_pyarrow()
+    schema = pyarrow.schema([
+        ("start", pyarrow.timestamp("s", tz="UTC")), ("width", pyarrow.int32()), ("dimension", pyarrow.string()),
+        ("key", pyarrow.string()), ("packets", pyarrow.int64()), ("bytes", pyarrow.int64()),
+        ("truncated", pyarrow.bool_()),
+    ])
+
+    def rows() -> Iterator[Tuple[Any, ...]]:
+        for bucket in buckets:
+            yield bucket.start, bucket.width, "total", None, bucket.packets, bucket.bytes, bucket.truncated
+            for dimension in DIMENSIONS:
+                volumes = getattr(bucket, dimension + "_bytes")
+                # the open minute keeps counting underneath; list its keys in one step
+                for key, packets in list(getattr(bucket, dimension + "_packets").items()):
+                    yield (bucket.start, bucket.width, dimension, _key_text(dimension, key), packets,
+                           volumes.get(key, 0), bucket.truncated)
+
+    def batches() -> Iterator["pyarrow.RecordBatch"]:
+        pending: List[Tuple[Any, ...]] = []
+        for row in rows():
+            pending.append(row)
+            if len(pending) >= TableConfig.BATCH_ROWS:
+                yield _rows_batch(schema, pending)
+                pending = []
+        if pending:
+            yield _rows_batch(schema, pending)
+
+    return _write(path, schema, batches())
+
+
+# writers
+
+def _write(path: Any, schema: "pyarrow.Schema", batches: Iterator["pyarrow.RecordBatch"]) -> int:
+    """Stream batches into `path` through a staging file, so an interrupted export leaves no partial file."""
+    target = Path(path)
+    kind = table_format(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    staging = target.with_name(target.name + ".tmp")
+    written = 0
+    try:
+        if kind == "parquet":
+            compression = TableConfig.PARQUET_COMPRESSION
+            with pyarrow.parquet.ParquetWriter(str(staging), schema, compression=compression) as writer:
+                # group small batches (a cold block is a few thousand rows) into full row groups
+                pending: List["pyarrow.RecordBatch"] = []
+                for batch in batches:
+                    pending.append(batch)
+                    written += batch.num_rows
+                    if sum(part.num_rows for part in pending) >= TableConfig.BATCH_ROWS:
+                        writer.write_table(pyarrow.Table.from_batches(pending, schema=schema))
+                        pending = []
+                if pending:
+                    writer.write_table(pyarrow.Table.from_batches(pending, schema=schema))
+        else:
+            with pyarrow.ipc.new_file(str(staging), schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    written += batch.num_rows
+    except BaseException:
+        staging.unlink(missing_ok=True)
+        raise
+    os.replace(staging, target)
+    return written
+
+
+# conversions
+
+def _int_type(column: array) -> "pyarrow.DataType":
+    """The Arrow integer type laid out like `column`'s items ("l" is 4 or 8 bytes by platform)."""
+    bits = column.itemsize * 8
+    return getattr(pyarrow, f"{'uint' if column.typecode.isupper() else 'int'}{bits}")()
+
+
+def _shared(column: array, arrow_type: Optional["pyarrow.DataType"] = None) -> "pyarrow.Array":
+    """An Arrow array over `column`'s buffer, without copying it."""
+    return pyarrow.Array.from_buffers(arrow_type or _int_type(column), len(column),
+                                      [None, pyarrow.py_buffer(column)])
+
+
+def _nullable(column: array) -> "pyarrow.Array":
+    """-1 sentinels as nulls; ports narrow to int32, frames stay int64."""
+    values = _shared(column)
+    values = pyarrow.compute.if_else(pyarrow.compute.less(values, 0), pyarrow.scalar(None, values.type), values)
+    return values.cast(pyarrow.int64() if column.typecode == "q" else pyarrow.int32())
+
+
+def _row_type(name: str) -> "pyarrow.DataType":
+    kind = _ROW_TYPES.get(name, "string")
+    if kind == "timestamp":
+        return pyarrow.timestamp("us", tz="UTC")
+    return pyarrow.int64() if kind == "int64" else pyarrow.string()
+
+
+def _rows_batch(schema: "pyarrow.Schema", rows: Sequence[Tuple[Any, ...]]) -> "pyarrow.RecordBatch":
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pyarrow.types.is_timestamp(field.type) and field.type.unit == "us":
+            values = [None if value is None else round(value * 1_000_000) for value in values]
+        elif pyarrow.types.is_string(field.type):
+            values = [None if value is None else str(value) for value in values]
+        arrays.append(pyarrow.array(values, field.type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _key_text(dimension: str, key: int) -> str:
+    if dimension == "protocol":
+        return protocol_name(key)
+    if dimension in ("src", "dst"):
+        return ADDRESSES.text(key)
+    return str(key)
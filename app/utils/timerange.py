@@ -0,0 +1,85 @@
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+_UNITS = {
+    "second": 1, "sec": 1, "s": 1,
+    "minute": 60, "min": 60, "m": 60,
+    "hour": 3600, "hr": 3600, "h": 3600,
+    "day": 86400, "d": 86400,
+    "week": 604800,
+}
+_UNIT = r"(seconds?|secs?|minutes?|mins?|hours?|hrs?|days?|weeks?|[smhd])"
+_CLOCK = r"(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(am|pm)?"
+
+_LAST_N = re.compile(rf"\b(?:last|past|previous)\s+(\d+)\s*{_UNIT}\b")
+_LAST_ONE = re.compile(r"\b(?:last|past|previous)\s+(second|minute|hour|day|week)\b")
+_BETWEEN = re.compile(rf"\b(?:between|from)\s+{_CLOCK}\s+(?:and|to|-)\s+{_CLOCK}")
+_SINCE = re.compile(rf"\bsince\s+{_CLOCK}")
+_AT = re.compile(rf"\b(?:at|around)\s+{_CLOCK}")
+
+
+def parse_time_range(text: str, now: Optional[float] = None) -> Optional[Tuple[float, float, str]]:
+    """
+    Find a time phrase in a question.
+
+    Understands "last 15 minutes", "past hour", "today", "yesterday", "since 09:00",
+    "between 09:00 and 10:30" and "at 09:30" (that minute). Clock times are local and
+    refer to today, or to yesterday when they are still in the future.
+
+    :return: (start, end, the phrase as matched) in epoch seconds, or None
+    """
+    now = time.time() if now is None else now
+    text = text.lower()
+    today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    match = _LAST_N.search(text)
+    if match:
+        seconds = int(match.group(1)) * _unit_seconds(match.group(2))
+        return now - seconds, now, match.group(0)
+
+    match = _LAST_ONE.search(text)
+    if match:
+        return now - _UNITS[match.group(1)], now, match.group(0)
+
+    match = _BETWEEN.search(text)
+    if match:
+        start = _clock(match.groups()[:4], today, now)
+        end = _clock(match.groups()[4:], today, now)
+        if end <= start:
+            start -= 86400  # "between 23:00 and 01:00"
+        return start, end, match.group(0)
+
+    match = _SINCE.search(text)
+    if match:
+        return _clock(match.groups(), today, now), now, match.group(0)
+
+    match = _AT.search(text)
+    if match:
+        start = _clock(match.groups(), today, now)
+        return start, start + 60, match.group(0)
+
+    if "yesterday" in text:
+        return (today - timedelta(days=1)).timestamp(), today.timestamp(), "yesterday"
+    if "today" in text:
+        return today.timestamp(), now, "today"
+    return None
+
+
+def _unit_seconds(unit: str) -> int:
+    unit = unit.rstrip("s") if len(unit) > 1 else unit
+    return _UNITS[unit]
+
+
+def _clock(groups: Tuple, today: datetime, now: float) -> float:
+    hour, minute, second, meridiem = groups
+    hour, minute, second = int(hour), int(minute), int(second or 0)
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    moment = today.replace(hour=hour % 24, minute=minute % 60, second=second % 60).timestamp()
+    if moment > now:
+        moment -= 86400
+    return moment
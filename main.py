@@ -1,27 +1,162 @@
-from app.controller import Controller
-from app.modules import Alerts, Capture, Chatbot, GUI, Metrics, Storage
+import argparse
+from typing import Tuple
 
-if __name__=="__main__":
-    alerts, capturer, gui, metrics, storage = Alerts(), Capture(), GUI(), Metrics(), Storage()
-    chatbot = Chatbot(metrics, alerts, gui, storage)
-
-    capturer.subscribe(metrics)
-    capturer.subscribe(gui)
-    capturer.subscribe(storage)
-    metrics.subscribe(alerts)
-    metrics.subscribe(gui)
+from app.config import DaemonConfig, ExportConfig, RemoteConfig
+from app.utils.bpf import parse_ports
+from app.utils.models import CaptureConfig, ProtocolFilter
+from app.utils.sampling import SAMPLING_MODES
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Packet Watch - Network Traffic Monitor")
+    parser.add_argument("--headless", action="store_true", help="run as a service without the GUI")
+    parser.add_argument("--interface", action="append", default=[],
+                        help="capture interface, repeat to merge several - default; auto-detect")
+    parser.add_argument("--protocol", default=DaemonConfig.DEFAULT_PROTOCOL, help="BPF protocol (headless only)")
+    parser.add_argument("--port", default="0", help="ports to capture, e.g. 53,8000-8080, 0 = all (headless only)")
+    parser.add_argument("--rule", action="append", default=[], metavar="PROTO[:PORTS]",
+                        help="per-protocol filter, repeatable, e.g. --rule tcp:443 --rule udp:53 (headless only)")
+    parser.add_argument("--host", action="append", default=[], help="only capture these hosts/subnets (headless only)")
+    parser.add_argument("--exclude-host", action="append", default=[], help="drop these hosts/subnets (headless only)")
+    parser.add_argument("--vlan", action="append", type=int, default=[], help="only capture these VLAN ids (headless only)")
+    parser.add_argument("--output", default=DaemonConfig.OUTPUT_PATH, help="storage flush path (headless only)")
+    parser.add_argument("--load", default=None, metavar="PATH",
+                        help="open a saved session (a storage file written by --output) in the background")
+    parser.add_argument("--flush-interval", type=float, default=DaemonConfig.FLUSH_INTERVAL_SECONDS,
+                        help="seconds between storage flushes (headless only)")
+    parser.add_argument("--export-port", type=int, default=None,
+                        help=f"serve /metrics and /metrics.json on this port (e.g. {ExportConfig.PORT})")
+    parser.add_argument("--sampling", default="none", choices=SAMPLING_MODES,
+                        help="packet sampling mode under overload (headless only)")
+    parser.add_argument("--sample-rate", type=int, default=1, help="keep 1 in N packets; count mode unless --sampling says otherwise (headless only)")
+    parser.add_argument("--adaptive-sampling", action="store_true",
+                        help="raise the sample rate while the pipeline lags (headless only)")
+    parser.add_argument("--sensor", default=None, metavar="HOST:PORT",
+                        help="stream metric deltas to a collector (headless only)")
+    parser.add_argument("--collector", type=int, default=None, metavar="PORT",
+                        help=f"merge deltas from remote sensors (e.g. {RemoteConfig.COLLECTOR_PORT})")
+    parser.add_argument("--no-capture", action="store_true", help="collector only, no local capture (headless only)")
+    args = parser.parse_args()
+    if args.rule and parse_ports(args.port):
+        # rules carry their own ports; --port would be silently ignored
+        parser.error("--port cannot be combined with --rule, give the ports per rule (e.g. --rule tcp:443)")
+    return args
+
+
+def parse_target(target: str) -> Tuple[str, int]:
+    host, _, port = target.rpartition(":")
+    return host or RemoteConfig.COLLECTOR_HOST, int(port)
+
+
+def build_capture_config(args: argparse.Namespace) -> CaptureConfig:
+    filters = []
+    for rule in args.rule:
+        protocol, _, ports = rule.partition(":")
+        filters.append(ProtocolFilter(protocol.lower(), parse_ports(ports)))
+
+    ports = parse_ports(args.port)
+    if not filters and not (len(ports) <= 1 and all(isinstance(p, int) for p in ports)):
+        filters.append(ProtocolFilter(args.protocol.lower(), ports))
+
+    return CaptureConfig(
+        protocol=args.protocol.lower(),
+        port=ports[0] if len(ports) == 1 and isinstance(ports[0], int) else 0,
+        interface=args.interface[0] if len(args.interface) == 1 else None,
+        interfaces=args.interface if len(args.interface) > 1 else [],
+        filters=filters,
+        include_hosts=args.host,
+        exclude_hosts=args.exclude_host,
+        vlans=args.vlan,
+        sampling=args.sampling,
+        sample_rate=args.sample_rate,
+        adaptive_sampling=args.adaptive_sampling,
+    )
+
+
+def run_headless(args: argparse.Namespace) -> None:
+    from app.daemon import Daemon
+
+    config = None
+    if not args.no_capture:
+        config = build_capture_config(args)
+    daemon = Daemon(config, output_path=args.output, flush_interval=args.flush_interval,
+                    export_port=args.export_port,
+                    sensor_target=parse_target(args.sensor) if args.sensor else None,
+                    collector_port=args.collector, load_path=args.load)
+    daemon.install_signal_handlers()
+    daemon.run()
+
+
+def run_gui(args: argparse.Namespace) -> None:
+    from app.controller import Controller
+    from app.modules import Alerts, Capture, Chatbot, Collector, GUI, Metrics, MetricsExporter, Sensor, Snapshotter, Storage
+    from app.utils.events import StorageLoadEvent
+
+    alerts, capturer, metrics, storage = Alerts(), Capture(), Metrics(), Storage()
+    gui = GUI(storage)
+
+    # with --collector the dashboard follows the merged view of all sensors, local capture included
+    collector, local_sensor = None, None
+    source = metrics
+    if args.collector is not None:
+        collector = Collector(port=args.collector)
+        local_sensor = Sensor(metrics, "127.0.0.1", args.collector)
+        source = collector
+        collector.start()
+        local_sensor.start()
+
+    chatbot = Chatbot(source, alerts, gui, storage, rollups=metrics.rollups)
+
+    # weighted sampling keeps metrics unbiased, the packet list wants the freshest packets,
+    # storage keeps a contiguous record, alert snapshots only need the recent past
+    capturer.subscribe(metrics, policy="sample")
+    capturer.subscribe(gui, policy="drop_oldest")
+    capturer.subscribe(storage, policy="drop_newest")
+    snapshots = Snapshotter()
+    capturer.subscribe(snapshots, policy="drop_oldest")
+    metrics.watch_pipeline(capturer.pipeline_stats)
+    source.subscribe(alerts)
+    source.subscribe(gui)
     alerts.subscribe(gui)
+    alerts.link_recordings(capturer.recordings)
+    alerts.link_snapshots(snapshots.trigger)
+
+    exporter = None
+    if args.export_port is not None:
+        exporter = MetricsExporter(port=args.export_port)
+        source.subscribe(exporter)
+        exporter.start()
 
     controller = Controller(capturer, chatbot, gui)
-    
+
     # Subscribe Controller to GUI events (User Actions)
     gui.subscribe(controller)
-    
+
     # Start Controller (Background Thread)
     controller.start()
-    
+
+    # a saved session fills Storage in the background; the window comes up right away
+    if args.load:
+        storage.load(args.load, progress=lambda progress: gui.update(StorageLoadEvent(progress)))
+
     # Start GUI (Main Thread - Blocking)
     gui.run()
 
     # Stop Controller when GUI closes
-    controller.stop()
\ No newline at end of file
+    controller.stop()
+    snapshots.close()
+    storage.close()
+    if exporter is not None:
+        exporter.stop()
+    if local_sensor is not None:
+        local_sensor.stop()
+    if collector is not None:
+        collector.stop()
+
+
+if __name__=="__main__":
+    args = parse_args()
+    if args.headless:
+        run_headless(args)
+    else:
+        run_gui(args)